@@ -0,0 +1,714 @@
+// Copyright: Wieger Wesselink 2022
+// Distributed under the Distributed under the GPL-3.0 Software License.
+// (See accompanying file license.txt or copy at https://www.gnu.org/licenses/gpl-3.0.txt)
+//
+/// \file draughts/batch.h
+/// \brief Operations on batches of positions that run without Python objects.
+
+#ifndef DRAUGHTS_BATCH_H
+#define DRAUGHTS_BATCH_H
+
+#include <algorithm>
+#include <array>
+#include <atomic>
+#include <cstddef>
+#include <cstdint>
+#include <exception>
+#include <memory>
+#include <mutex>
+#include <stdexcept>
+#include <string>
+#include <thread>
+#include <vector>
+#include "scan/bit.hpp"
+#include "scan/common.hpp"
+#include "scan/eval.hpp"
+#include "scan/gen.hpp"
+#include "scan/hash.hpp"
+#include "scan/list.hpp"
+#include "scan/move.hpp"
+#include "scan/pos.hpp"
+#include "scan/score.hpp"
+#include "scan/search.hpp"
+#include "scan/tt.hpp"
+#include "scan/var.hpp"
+
+namespace draughts {
+
+// Returns the number of threads that is used for a requested thread count.
+// A thread count of 0 means that all available hardware threads are used.
+inline
+int thread_count(int threads, std::size_t n)
+{
+  if (threads <= 0)
+  {
+    threads = std::max(1U, std::thread::hardware_concurrency());
+  }
+  return int(std::max<std::size_t>(1, std::min<std::size_t>(threads, n)));
+}
+
+// Calls f(first, last) for consecutive ranges that together cover [0, n).
+// The ranges are processed by at most 'threads' threads.
+template <typename Function>
+void parallel_for(std::size_t n, int threads, Function f)
+{
+  threads = thread_count(threads, n);
+  if (threads == 1)
+  {
+    f(std::size_t(0), n);
+    return;
+  }
+
+  std::vector<std::thread> workers;
+  std::size_t chunk = (n + threads - 1) / threads;
+  for (std::size_t first = 0; first < n; first += chunk)
+  {
+    std::size_t last = std::min(n, first + chunk);
+    workers.emplace_back(f, first, last);
+  }
+  for (std::thread& t: workers)
+  {
+    t.join();
+  }
+}
+
+// The fields of a position, in the same order as the pickle state of Pos.
+struct position_record
+{
+  std::uint64_t turn;
+  std::uint64_t wm;
+  std::uint64_t bm;
+  std::uint64_t wk;
+  std::uint64_t bk;
+};
+
+inline
+position_record make_position_record(const Pos& pos)
+{
+  return { std::uint64_t(pos.turn()), uint64(pos.wm()), uint64(pos.bm()), uint64(pos.wk()), uint64(pos.bk()) };
+}
+
+inline
+Pos make_position(const position_record& r)
+{
+  return Pos(r.turn == 0 ? White : Black, Bit(r.wm), Bit(r.bm), Bit(r.wk), Bit(r.bk));
+}
+
+// Returns true if r contains a position that can be used by Scan.
+inline
+bool is_valid(const position_record& r)
+{
+  if (r.turn > 1 || !bit::is_ok(r.wm | r.bm | r.wk | r.bk))
+  {
+    return false;
+  }
+  if ((r.wm & r.bm) || (r.wm & r.wk) || (r.wm & r.bk) || (r.bm & r.wk) || (r.bm & r.bk) || (r.wk & r.bk))
+  {
+    return false;
+  }
+  return bit::is_incl(Bit(r.wm), bit::WM_Squares) && bit::is_incl(Bit(r.bm), bit::BM_Squares);
+}
+
+// A read-only view on a strided array of position records.
+class position_span
+{
+  private:
+    const char* m_data = nullptr;
+    std::size_t m_size = 0;
+    std::ptrdiff_t m_stride = sizeof(position_record);
+
+  public:
+    position_span() = default;
+
+    position_span(const void* data, std::size_t size, std::ptrdiff_t stride = sizeof(position_record))
+      : m_data(reinterpret_cast<const char*>(data)), m_size(size), m_stride(stride)
+    {}
+
+    std::size_t size() const
+    {
+      return m_size;
+    }
+
+    const position_record& record(std::size_t i) const
+    {
+      return *reinterpret_cast<const position_record*>(m_data + std::ptrdiff_t(i) * m_stride);
+    }
+
+    Pos operator[](std::size_t i) const
+    {
+      return make_position(record(i));
+    }
+};
+
+// Computes the hash keys of the given positions.
+template <typename Positions>
+void hash_keys(const Positions& positions, std::uint64_t* out, int threads = 1)
+{
+  parallel_for(positions.size(), threads, [&](std::size_t first, std::size_t last)
+  {
+    for (std::size_t i = first; i < last; i++)
+    {
+      out[i] = hash::key(positions[i]);
+    }
+  });
+}
+
+// The layouts that are supported by encode_position.
+// - board:   4 planes of 10x10 squares, the same as pos_to_numpy1
+// - squares: 4 planes of 50 squares, the same as pos_to_numpy2
+// The planes are player men, opponent men, player kings and opponent kings,
+// where the player is the side to move.
+enum class board_layout
+{
+  board,
+  squares
+};
+
+inline
+board_layout parse_board_layout(const std::string& text)
+{
+  if (text == "board")
+  {
+    return board_layout::board;
+  }
+  else if (text == "squares")
+  {
+    return board_layout::squares;
+  }
+  throw std::runtime_error("unknown board layout '" + text + "'");
+}
+
+// Returns the number of values that is used for the encoding of one plane.
+inline
+constexpr int plane_size(board_layout layout)
+{
+  return layout == board_layout::board ? 100 : 50;
+}
+
+// Maps a square to its index in a plane.
+inline
+const std::array<int, 64>& plane_index_table(board_layout layout)
+{
+  auto make_table = [](board_layout layout)
+  {
+    std::array<int, 64> result;
+    result.fill(-1);
+    for (Square sq: bit::Squares)
+    {
+      int dense = square_dense(sq);
+      if (layout == board_layout::board)
+      {
+        int shift = (dense / 5) % 2;
+        result[sq] = 2 * (dense + 1) - 1 - shift;
+      }
+      else
+      {
+        result[sq] = dense;
+      }
+    }
+    return result;
+  };
+
+  static const std::array<int, 64> board_table = make_table(board_layout::board);
+  static const std::array<int, 64> squares_table = make_table(board_layout::squares);
+  return layout == board_layout::board ? board_table : squares_table;
+}
+
+// Writes the encoding of pos into out, which must have room for 4 * plane_size(layout) values.
+template <typename T>
+void encode_position(const Pos& pos, board_layout layout, T* out)
+{
+  const std::array<int, 64>& index = plane_index_table(layout);
+  int size = plane_size(layout);
+  std::fill(out, out + 4 * size, T(0));
+
+  Side player = pos.turn();
+  Side opponent = side_opp(player);
+  Bit planes[4] = { pos.man(player), pos.man(opponent), pos.king(player), pos.king(opponent) };
+  for (int p = 0; p < 4; p++)
+  {
+    T* plane = out + p * size;
+    for (Square sq: planes[p])
+    {
+      plane[index[sq]] = T(1);
+    }
+  }
+}
+
+// Encodes the positions [0, positions.size()) into out, using the given number of threads.
+// Positions must provide size() and an operator[] that returns a Pos.
+template <typename Positions, typename T>
+void encode_positions(const Positions& positions, board_layout layout, T* out, int threads = 1)
+{
+  std::size_t stride = 4 * plane_size(layout);
+  parallel_for(positions.size(), threads, [&](std::size_t first, std::size_t last)
+  {
+    for (std::size_t i = first; i < last; i++)
+    {
+      encode_position(positions[i], layout, out + i * stride);
+    }
+  });
+}
+
+// The kinds of moves that are supported by generate_moves_csr.
+enum class move_kind
+{
+  moves,
+  captures,
+  promotions
+};
+
+inline
+move_kind parse_move_kind(const std::string& text)
+{
+  if (text == "moves")
+  {
+    return move_kind::moves;
+  }
+  else if (text == "captures")
+  {
+    return move_kind::captures;
+  }
+  else if (text == "promotions")
+  {
+    return move_kind::promotions;
+  }
+  throw std::runtime_error("unknown move kind '" + text + "'");
+}
+
+inline
+void generate(List& list, const Pos& pos, move_kind kind)
+{
+  switch (kind)
+  {
+    case move_kind::moves: gen_moves(list, pos); break;
+    case move_kind::captures: gen_captures(list, pos); break;
+    case move_kind::promotions: gen_promotions(list, pos); break;
+  }
+}
+
+// The moves of a batch of positions in compressed sparse row (CSR) format: the moves of
+// position i are moves[offsets[i]], ..., moves[offsets[i + 1] - 1].
+struct move_table
+{
+  std::vector<Move> moves;
+  std::vector<std::int64_t> offsets;
+
+  std::size_t size() const
+  {
+    return offsets.empty() ? 0 : offsets.size() - 1;
+  }
+};
+
+// Generates the moves of the given positions. The moves of each position appear in
+// the order of the corresponding List.
+template <typename Positions>
+move_table generate_moves_csr(const Positions& positions, move_kind kind = move_kind::moves, int threads = 1)
+{
+  std::size_t n = positions.size();
+  move_table result;
+  result.offsets.assign(n + 1, 0);
+
+  // Each chunk of parallel_for writes its moves to a separate buffer, and stores the move
+  // counts in offsets.
+  std::vector<std::vector<Move>> buffers(thread_count(threads, n));
+  std::size_t chunk = std::max<std::size_t>(1, (n + buffers.size() - 1) / buffers.size());
+  parallel_for(n, threads, [&](std::size_t first, std::size_t last)
+  {
+    std::size_t k = first / chunk;
+    List list;
+    for (std::size_t i = first; i < last; i++)
+    {
+      list.clear();
+      generate(list, positions[i], kind);
+      buffers[k].insert(buffers[k].end(), list.begin(), list.end());
+      result.offsets[i + 1] = list.size();
+    }
+  });
+
+  for (std::size_t i = 0; i < n; i++)
+  {
+    result.offsets[i + 1] += result.offsets[i];
+  }
+  result.moves.reserve(result.offsets[n]);
+  for (const std::vector<Move>& buffer: buffers)
+  {
+    result.moves.insert(result.moves.end(), buffer.begin(), buffer.end());
+  }
+  return result;
+}
+
+// Computes the details of the moves in a move table. The squares are in standard
+// numbering (1 to 50). Each of the output pointers may be nullptr.
+template <typename Positions>
+void move_details(const Positions& positions, const move_table& moves, std::int32_t* from, std::int32_t* to, std::uint64_t* captured, std::int32_t* index, int threads = 1)
+{
+  parallel_for(moves.size(), threads, [&](std::size_t first, std::size_t last)
+  {
+    for (std::size_t i = first; i < last; i++)
+    {
+      Pos pos = positions[i];
+      for (std::int64_t j = moves.offsets[i]; j < moves.offsets[i + 1]; j++)
+      {
+        Move mv = moves.moves[j];
+        if (from)
+        {
+          from[j] = square_to_std(move::from(mv, pos));
+        }
+        if (to)
+        {
+          to[j] = square_to_std(move::to(mv, pos));
+        }
+        if (captured)
+        {
+          captured[j] = uint64(move::captured(mv, pos));
+        }
+        if (index)
+        {
+          index[j] = move::index(mv, pos);
+        }
+      }
+    }
+  });
+}
+
+// Returns the smallest index i such that moves[i] is not legal in positions[i], or -1
+// if all moves are legal.
+template <typename Positions>
+std::int64_t find_illegal_move(const Positions& positions, const Move* moves, int threads = 1)
+{
+  std::size_t n = positions.size();
+
+  // Each chunk of parallel_for stores the first illegal move it finds.
+  std::vector<std::int64_t> illegal(thread_count(threads, n), -1);
+  std::size_t chunk = std::max<std::size_t>(1, (n + illegal.size() - 1) / illegal.size());
+  parallel_for(n, threads, [&](std::size_t first, std::size_t last)
+  {
+    std::size_t k = first / chunk;
+    for (std::size_t i = first; i < last; i++)
+    {
+      if (!move::is_legal(moves[i], positions[i]))
+      {
+        illegal[k] = i;
+        break;
+      }
+    }
+  });
+
+  for (std::int64_t i: illegal)
+  {
+    if (i != -1)
+    {
+      return i;
+    }
+  }
+  return -1;
+}
+
+// Writes the positions that result from playing moves[i] in positions[i] to out[i].
+// The moves must be legal, see find_illegal_move.
+template <typename Positions>
+void succ_positions(const Positions& positions, const Move* moves, position_record* out, int threads = 1)
+{
+  parallel_for(positions.size(), threads, [&](std::size_t first, std::size_t last)
+  {
+    for (std::size_t i = first; i < last; i++)
+    {
+      out[i] = make_position_record(positions[i].succ(moves[i]));
+    }
+  });
+}
+
+// Writes the children of all positions to out, in the order of moves, which must be
+// the move table of positions. Out must have room for moves.moves.size() positions.
+template <typename Positions>
+void expand_positions(const Positions& positions, const move_table& moves, position_record* out, int threads = 1)
+{
+  parallel_for(moves.size(), threads, [&](std::size_t first, std::size_t last)
+  {
+    for (std::size_t i = first; i < last; i++)
+    {
+      Pos pos = positions[i];
+      for (std::int64_t j = moves.offsets[i]; j < moves.offsets[i + 1]; j++)
+      {
+        out[j] = make_position_record(pos.succ(moves.moves[j]));
+      }
+    }
+  });
+}
+
+// The point of view of an evaluation: the side to move, or white.
+enum class eval_perspective
+{
+  side,
+  white
+};
+
+inline
+eval_perspective parse_eval_perspective(const std::string& text)
+{
+  if (text == "side")
+  {
+    return eval_perspective::side;
+  }
+  else if (text == "white")
+  {
+    return eval_perspective::white;
+  }
+  throw std::runtime_error("unknown evaluation perspective '" + text + "'");
+}
+
+// Writes the Scan evaluations of the given positions to scores. If mg, eg and stage are
+// not nullptr, the components of the evaluations are written to them as well.
+// N.B. eval_init must have been called.
+template <typename Positions>
+void eval_positions(const Positions& positions, eval_perspective perspective, std::int16_t* scores, std::int32_t* mg = nullptr, std::int32_t* eg = nullptr, std::int32_t* stage = nullptr, int threads = 1)
+{
+  parallel_for(positions.size(), threads, [&](std::size_t first, std::size_t last)
+  {
+    for (std::size_t i = first; i < last; i++)
+    {
+      Pos pos = positions[i];
+      Side sd = perspective == eval_perspective::side ? pos.turn() : White;
+      if (mg)
+      {
+        Eval_Components c = eval_components(pos);
+        scores[i] = std::int16_t(score::side(c.score, pos.turn() == sd ? White : Black));
+        mg[i] = score::side(c.mg, sd);
+        eg[i] = score::side(c.eg, sd);
+        stage[i] = c.stage;
+      }
+      else
+      {
+        scores[i] = std::int16_t(score::side(eval(pos), pos.turn() == sd ? White : Black));
+      }
+    }
+  });
+}
+
+// A fixed action space for moves. Quiet moves are identified by their start and end
+// square, but different captures can have the same start and end square, so the captures
+// are numbered as follows. With from and to the dense square indices (0 to 49):
+// - the action of a quiet move, or of the capture with the smallest captured bitboard
+//   (as an unsigned integer) among the captures with the same from and to, is 50 * from + to;
+// - the other captures from the same start square are ordered by (to, captured bitboard),
+//   and the j-th one of them has action 2500 + action_extra_captures * from + j.
+// Every legal move has a unique action, unless a position has more than
+// action_extra_captures such extra captures from one square, in which case a
+// std::runtime_error is thrown. This does not happen in practice.
+constexpr int action_extra_captures = 16;
+constexpr int action_size = 50 * 50 + 50 * action_extra_captures;
+
+constexpr int max_list_size = 128; // the capacity of a List
+
+// Writes the actions of the legal moves in list to actions, in the same order.
+inline
+void list_actions(const List& list, const Pos& pos, int* actions)
+{
+  int n = list.size();
+  std::array<int, max_list_size> from;
+  std::array<int, max_list_size> to;
+  std::array<uint64, max_list_size> captured;
+  std::array<bool, max_list_size> primary;
+  for (int i = 0; i < n; i++)
+  {
+    from[i] = square_dense(move::from(list[i], pos));
+    to[i] = square_dense(move::to(list[i], pos));
+    captured[i] = uint64(move::captured(list[i], pos));
+    primary[i] = true;
+    for (int j = 0; j < i; j++)
+    {
+      if (from[j] == from[i] && to[j] == to[i])
+      {
+        if (captured[j] < captured[i])
+        {
+          primary[i] = false;
+        }
+        else
+        {
+          primary[j] = false;
+        }
+      }
+    }
+  }
+  for (int i = 0; i < n; i++)
+  {
+    if (primary[i])
+    {
+      actions[i] = 50 * from[i] + to[i];
+      continue;
+    }
+    int ordinal = 0;
+    for (int j = 0; j < n; j++)
+    {
+      if (!primary[j] && from[j] == from[i] && (to[j] < to[i] || (to[j] == to[i] && captured[j] < captured[i])))
+      {
+        ordinal++;
+      }
+    }
+    if (ordinal >= action_extra_captures)
+    {
+      throw std::runtime_error("move_to_action: too many captures from the same square");
+    }
+    actions[i] = 50 * 50 + action_extra_captures * from[i] + ordinal;
+  }
+}
+
+// Returns the action of the legal move mv in pos. Throws if mv is not legal in pos.
+inline
+int move_to_action(Move mv, const Pos& pos)
+{
+  List list;
+  gen_moves(list, pos);
+  if (!move::is_capture(mv, pos) && list::has(list, mv))
+  {
+    return 50 * square_dense(move::from(mv, pos)) + square_dense(move::to(mv, pos));
+  }
+  std::array<int, max_list_size> actions;
+  list_actions(list, pos, actions.data());
+  for (int i = 0; i < list.size(); i++)
+  {
+    if (list[i] == mv)
+    {
+      return actions[i];
+    }
+  }
+  throw std::runtime_error("move_to_action: the move is not legal");
+}
+
+// Returns the move that corresponds to action in pos, or move::None if there is no such legal move.
+inline
+Move action_to_move(int action, const Pos& pos)
+{
+  List list;
+  gen_moves(list, pos);
+  std::array<int, max_list_size> actions;
+  list_actions(list, pos, actions.data());
+  for (int i = 0; i < list.size(); i++)
+  {
+    if (actions[i] == action)
+    {
+      return list[i];
+    }
+  }
+  return move::None;
+}
+
+// Writes the legal action masks of the positions to out, which must have room for
+// positions.size() * action_size values.
+template <typename Positions>
+void legal_action_masks(const Positions& positions, bool* out, int threads = 1)
+{
+  parallel_for(positions.size(), threads, [&](std::size_t first, std::size_t last)
+  {
+    List list;
+    std::array<int, max_list_size> actions;
+    for (std::size_t i = first; i < last; i++)
+    {
+      Pos pos = positions[i];
+      bool* mask = out + i * action_size;
+      std::fill(mask, mask + action_size, false);
+      gen_moves(list, pos);
+      list_actions(list, pos, actions.data());
+      for (int j = 0; j < list.size(); j++)
+      {
+        mask[actions[j]] = true;
+      }
+    }
+  });
+}
+
+// Searches each of the positions with the limits in si, using a pool of 'workers' threads
+// that take the positions one by one. Each worker has its own search engine. If shared_tt
+// is false, every worker has a private transposition table of tt_size entries that is
+// cleared before each search, so the results do not depend on the number of workers.
+// Otherwise all workers use one table of tt_size entries, which is not cleared.
+// The callback on_result(i, so) is called by the worker as soon as position i is done,
+// with at most one call at the same time. If it throws, the remaining positions are
+// skipped and the exception is rethrown.
+template <typename Positions, typename Callback>
+void search_positions(const Positions& positions, const Search_Input& si, int workers, int64 tt_size, bool shared_tt, Callback on_result)
+{
+  std::size_t n = positions.size();
+  workers = thread_count(workers, n);
+
+  std::unique_ptr<TT> tt;
+  if (shared_tt)
+  {
+    tt.reset(new TT);
+    tt->set_size(tt_size);
+  }
+
+  std::atomic<std::size_t> next(0);
+  std::mutex mutex;
+  std::exception_ptr error;
+
+  auto work = [&]()
+  {
+    std::unique_ptr<Search_Engine> engine(shared_tt ? new Search_Engine(*tt, 1) : new Search_Engine(tt_size, 1));
+    bool clear = false; // a new table is already empty
+    for (std::size_t i = next++; i < n; i = next++)
+    {
+      Node node(positions[i]);
+      Search_Output so;
+      List list;
+      gen_moves(list, node);
+      if (list.size() == 0)
+      {
+        so.init(si, node);
+        so.score = (var::Variant == var::Losing) ? score::win(Ply_Root) : score::loss(Ply_Root);
+        so.end();
+      }
+      else
+      {
+        if (clear)
+        {
+          engine->tt().clear();
+        }
+        engine->search(so, node, si);
+        clear = !shared_tt;
+      }
+
+      std::lock_guard<std::mutex> lock(mutex);
+      if (error)
+      {
+        break;
+      }
+      try
+      {
+        on_result(i, so);
+      }
+      catch (...)
+      {
+        error = std::current_exception();
+        next = n;
+      }
+    }
+  };
+
+  if (workers == 1)
+  {
+    work();
+  }
+  else
+  {
+    std::vector<std::thread> threads;
+    for (int k = 0; k < workers; k++)
+    {
+      threads.emplace_back(work);
+    }
+    for (std::thread& t: threads)
+    {
+      t.join();
+    }
+  }
+
+  if (error)
+  {
+    std::rethrow_exception(error);
+  }
+}
+
+} // namespace draughts
+
+#endif // DRAUGHTS_BATCH_H
@@ -0,0 +1,214 @@
+// Copyright: Wieger Wesselink 2022
+// Distributed under the Distributed under the GPL-3.0 Software License.
+// (See accompanying file license.txt or copy at https://www.gnu.org/licenses/gpl-3.0.txt)
+//
+/// \file draughts/codec.h
+/// \brief A compact binary encoding of positions and games.
+///
+/// A position is encoded in 26 bytes: the boards wm, bm, wk and bk with one bit
+/// per square (4 x 50 bits, least significant bit first), followed by the turn.
+/// A game is encoded as its start position, followed by the number of plies and
+/// the index of each move in the move list of gen_moves, both as varints. Since a
+/// move list contains at most 128 moves, a ply takes 1 byte (and never more than 2).
+
+#ifndef DRAUGHTS_CODEC_H
+#define DRAUGHTS_CODEC_H
+
+#include <cstddef>
+#include <cstdint>
+#include <stdexcept>
+#include <vector>
+#include "draughts/batch.h"
+#include "scan/bit.hpp"
+#include "scan/common.hpp"
+#include "scan/game.hpp"
+#include "scan/gen.hpp"
+#include "scan/list.hpp"
+#include "scan/pos.hpp"
+
+namespace draughts {
+
+// The number of bytes of an encoded position.
+constexpr std::size_t packed_position_size = 26;
+
+inline
+void pack_position(const position_record& r, std::uint8_t* out)
+{
+  std::fill(out, out + packed_position_size, std::uint8_t(0));
+  const std::uint64_t boards[4] = { r.wm, r.bm, r.wk, r.bk };
+  for (int b = 0; b < 4; b++)
+  {
+    for (Square sq: Bit(boards[b]))
+    {
+      int i = b * 50 + square_dense(sq);
+      out[i / 8] |= std::uint8_t(1 << (i % 8));
+    }
+  }
+  out[25] = std::uint8_t(r.turn);
+}
+
+inline
+void pack_position(const Pos& pos, std::uint8_t* out)
+{
+  pack_position(make_position_record(pos), out);
+}
+
+// Decodes a position. Throws std::runtime_error if the data does not contain a valid position.
+inline
+position_record unpack_position_record(const std::uint8_t* in)
+{
+  std::uint64_t boards[4] = { 0, 0, 0, 0 };
+  for (int i = 0; i < 200; i++)
+  {
+    if (in[i / 8] & (1 << (i % 8)))
+    {
+      boards[i / 50] |= std::uint64_t(1) << square_sparse(i % 50);
+    }
+  }
+  position_record result = { in[25], boards[0], boards[1], boards[2], boards[3] };
+  if (!is_valid(result))
+  {
+    throw std::runtime_error("unpack_position: invalid position");
+  }
+  return result;
+}
+
+inline
+Pos unpack_position(const std::uint8_t* in)
+{
+  return make_position(unpack_position_record(in));
+}
+
+// Encodes the positions into out, which must have room for positions.size() * packed_position_size bytes.
+template <typename Positions>
+void pack_positions(const Positions& positions, std::uint8_t* out, int threads = 1)
+{
+  parallel_for(positions.size(), threads, [&](std::size_t first, std::size_t last)
+  {
+    for (std::size_t i = first; i < last; i++)
+    {
+      pack_position(positions.record(i), out + i * packed_position_size);
+    }
+  });
+}
+
+// Decodes n positions from in. Throws std::runtime_error if one of them is invalid.
+inline
+void unpack_positions(const std::uint8_t* in, std::size_t n, position_record* out)
+{
+  for (std::size_t i = 0; i < n; i++)
+  {
+    out[i] = unpack_position_record(in + i * packed_position_size);
+  }
+}
+
+inline
+void pack_varint(std::uint64_t value, std::vector<std::uint8_t>& out)
+{
+  while (value >= 0x80)
+  {
+    out.push_back(std::uint8_t(value | 0x80));
+    value >>= 7;
+  }
+  out.push_back(std::uint8_t(value));
+}
+
+// Decodes a varint from [first, last), and advances first.
+inline
+std::uint64_t unpack_varint(const std::uint8_t*& first, const std::uint8_t* last)
+{
+  std::uint64_t result = 0;
+  for (int shift = 0; shift < 64; shift += 7)
+  {
+    if (first == last)
+    {
+      throw std::runtime_error("unpack_varint: unexpected end of data");
+    }
+    std::uint8_t byte = *first++;
+    result |= std::uint64_t(byte & 0x7f) << shift;
+    if ((byte & 0x80) == 0)
+    {
+      return result;
+    }
+  }
+  throw std::runtime_error("unpack_varint: invalid varint");
+}
+
+// Appends the encoding of a sequence of moves that is played from pos to out.
+// Throws std::runtime_error if one of the moves is illegal.
+template <typename Moves>
+void pack_moves(Pos pos, const Moves& moves, std::vector<std::uint8_t>& out)
+{
+  pack_varint(moves.size(), out);
+  List list;
+  for (Move mv: moves)
+  {
+    gen_moves(list, pos);
+    if (!list::has(list, mv))
+    {
+      throw std::runtime_error("pack_moves: illegal move");
+    }
+    pack_varint(list::find(list, mv), out);
+    pos = pos.succ(mv);
+  }
+}
+
+// Decodes a sequence of moves that is played from pos from [first, last), and advances first.
+inline
+std::vector<Move> unpack_moves(Pos pos, const std::uint8_t*& first, const std::uint8_t* last)
+{
+  std::uint64_t n = unpack_varint(first, last);
+  std::vector<Move> result;
+  List list;
+  for (std::uint64_t i = 0; i < n; i++)
+  {
+    gen_moves(list, pos);
+    std::uint64_t index = unpack_varint(first, last);
+    if (index >= std::uint64_t(list.size()))
+    {
+      throw std::runtime_error("unpack_moves: invalid move index");
+    }
+    Move mv = list.move(int(index));
+    result.push_back(mv);
+    pos = pos.succ(mv);
+  }
+  return result;
+}
+
+// Appends the encoding of game to out.
+inline
+void pack_game(const Game& game, std::vector<std::uint8_t>& out)
+{
+  std::size_t size = out.size();
+  out.resize(size + packed_position_size);
+  pack_position(game.start_pos(), out.data() + size);
+  std::vector<Move> moves;
+  for (int i = 0; i < game.size(); i++)
+  {
+    moves.push_back(game.move(i));
+  }
+  pack_moves(game.start_pos(), moves, out);
+}
+
+// Decodes a game from [first, last), and advances first.
+inline
+Game unpack_game(const std::uint8_t*& first, const std::uint8_t* last)
+{
+  if (std::size_t(last - first) < packed_position_size)
+  {
+    throw std::runtime_error("unpack_game: unexpected end of data");
+  }
+  Pos pos = unpack_position(first);
+  first += packed_position_size;
+  Game result;
+  result.init(pos);
+  for (Move mv: unpack_moves(pos, first, last))
+  {
+    result.add_move(mv);
+  }
+  return result;
+}
+
+} // namespace draughts
+
+#endif // DRAUGHTS_CODEC_H
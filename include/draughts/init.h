@@ -0,0 +1,240 @@
+// Copyright: Wieger Wesselink 2022
+// Distributed under the Distributed under the GPL-3.0 Software License.
+// (See accompanying file license.txt or copy at https://www.gnu.org/licenses/gpl-3.0.txt)
+//
+/// \file draughts/init.h
+/// \brief Lazy initialization of the Scan subsystems.
+///
+/// Each subsystem is initialized by the first function that needs it. The time and
+/// memory used by each initialization phase are recorded, see init_report().
+
+#ifndef DRAUGHTS_INIT_H
+#define DRAUGHTS_INIT_H
+
+#include <array>
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <fstream>
+#include <mutex>
+#include <string>
+#include <vector>
+#ifdef __linux__
+#include <unistd.h>
+#endif
+#include "scan/bb_base.hpp"
+#include "scan/bb_comp.hpp"
+#include "scan/bb_index.hpp"
+#include "scan/bit.hpp"
+#include "scan/book.hpp"
+#include "scan/eval.hpp"
+#include "scan/hash.hpp"
+#include "scan/libmy.hpp"
+#include "scan/pos.hpp"
+#include "scan/tt.hpp"
+#include "scan/var.hpp"
+
+namespace draughts {
+
+enum class init_phase
+{
+  bit,
+  var,
+  hash,
+  pos,
+  bb_index,
+  eval,
+  book,
+  bitbases,
+  tt,
+  count
+};
+
+inline
+std::string init_phase_name(init_phase phase)
+{
+  static const char* names[] = { "bit", "var", "hash", "pos", "bb_index", "eval", "book", "bitbases", "tt" };
+  return names[static_cast<int>(phase)];
+}
+
+// Returns the resident memory of the process in bytes, or 0 if it is unknown.
+inline
+std::int64_t resident_memory()
+{
+#ifdef __linux__
+  std::ifstream in("/proc/self/statm");
+  std::int64_t size = 0;
+  std::int64_t resident = 0;
+  if (in >> size >> resident)
+  {
+    return resident * sysconf(_SC_PAGESIZE);
+  }
+#endif
+  return 0;
+}
+
+struct init_record
+{
+  std::string name;
+  double seconds;
+  std::int64_t memory; // the increase of the resident memory in bytes
+};
+
+// Runs each initialization phase at most once, and records the time and memory it used.
+class init_registry
+{
+  private:
+    static constexpr int phase_count = static_cast<int>(init_phase::count);
+
+    std::recursive_mutex m_mutex;
+    std::array<std::atomic<bool>, phase_count> m_done {};
+    std::vector<init_record> m_records;
+
+  public:
+    static init_registry& instance()
+    {
+      static init_registry registry;
+      return registry;
+    }
+
+    bool is_done(init_phase phase) const
+    {
+      return m_done[static_cast<int>(phase)].load(std::memory_order_acquire);
+    }
+
+    template <typename Function>
+    void run(init_phase phase, Function f)
+    {
+      if (is_done(phase))
+      {
+        return;
+      }
+      std::lock_guard<std::recursive_mutex> lock(m_mutex);
+      if (is_done(phase))
+      {
+        return;
+      }
+      std::int64_t memory = resident_memory();
+      auto start = std::chrono::steady_clock::now();
+      f();
+      std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+      m_records.push_back({ init_phase_name(phase), elapsed.count(), resident_memory() - memory });
+      m_done[static_cast<int>(phase)].store(true, std::memory_order_release);
+    }
+
+    // Marks a phase as not done, such that it runs again when it is needed.
+    void reset(init_phase phase)
+    {
+      std::lock_guard<std::recursive_mutex> lock(m_mutex);
+      m_done[static_cast<int>(phase)].store(false, std::memory_order_release);
+    }
+
+    std::vector<init_record> records()
+    {
+      std::lock_guard<std::recursive_mutex> lock(m_mutex);
+      return m_records;
+    }
+};
+
+// Initializes what is needed by positions and move generation, including the start
+// position and the tempo/skew tables used by Pos.tempo, skew, stage and phase.
+inline
+void init_core()
+{
+  init_registry& registry = init_registry::instance();
+  registry.run(init_phase::bit, bit::init);
+  registry.run(init_phase::var, [] { var::init(); ml::rand_init(); });
+  registry.run(init_phase::hash, hash::init); // positions carry their hash key
+  registry.run(init_phase::pos, pos::init);
+}
+
+inline
+void init_hash()
+{
+  init_registry::instance().run(init_phase::hash, hash::init);
+}
+
+inline
+void init_pos()
+{
+  init_registry::instance().run(init_phase::pos, pos::init);
+}
+
+inline
+void init_bb_index()
+{
+  init_registry::instance().run(init_phase::bb_index, [] { bb::index_init(); bb::comp_init(); });
+}
+
+inline
+void init_eval()
+{
+  init_pos();
+  init_registry::instance().run(init_phase::eval, eval_init);
+}
+
+inline
+void init_book()
+{
+  init_hash();
+  init_pos();
+  init_registry::instance().run(init_phase::book, [] { if (var::Book) book::init(); });
+}
+
+inline
+void init_bitbases()
+{
+  init_bb_index();
+  init_registry::instance().run(init_phase::bitbases, [] { if (var::BB) bb::init(); });
+}
+
+inline
+void init_tt()
+{
+  init_registry::instance().run(init_phase::tt, []
+  {
+    if (var::TT_Shared.empty())
+    {
+      G_TT.set_size(var::TT_Size);
+    }
+    else
+    {
+      G_TT.open_shared(var::TT_Shared, var::TT_Size);
+    }
+  });
+}
+
+// Initializes everything that is needed by the Scan search, except for the global transposition table.
+inline
+void init_search()
+{
+  init_hash();
+  init_eval();
+  init_book();
+  init_bitbases();
+}
+
+// Initializes everything that is needed by the global Scan search.
+inline
+void init_engine()
+{
+  init_search();
+  init_tt();
+}
+
+// Applies the current settings. The phases that depend on the settings are run again
+// when they are needed.
+inline
+void init_settings()
+{
+  init_registry& registry = init_registry::instance();
+  for (init_phase phase: { init_phase::bit, init_phase::eval, init_phase::book, init_phase::bitbases, init_phase::tt })
+  {
+    registry.reset(phase);
+  }
+  registry.run(init_phase::bit, bit::init); // depends on the variant
+}
+
+} // namespace draughts
+
+#endif // DRAUGHTS_INIT_H
@@ -12,6 +12,7 @@
 #include <cassert>
 #include <random>
 #include <sstream>
+#include "draughts/init.h"
 #include "scan/bb_base.hpp"
 #include "scan/bb_index.hpp"
 #include "scan/bit.hpp"
@@ -182,11 +183,11 @@ struct egdb_index
 // bb_base.hpp
 struct egdb
 {
-  static void init() { bb::init(); }
+  static void init() { init_bb_index(); bb::init(); }
   static bool pos_is_load(const Pos& pos) { return bb::pos_is_load(pos); }
   static bool pos_is_search(const Pos& pos, int bb_size) { return bb::pos_is_search(pos, bb_size); }
-  static int probe(const Pos& pos) { return bb::probe(pos); } // QS
-  static int probe_raw(const Pos& pos) { return bb::probe_raw(pos); } // quiet position
+  static int probe(const Pos& pos) { init_bitbases(); return bb::probe(pos); } // QS
+  static int probe_raw(const Pos& pos) { init_bitbases(); return bb::probe_raw(pos); } // quiet position
   static int value_update(int node, int child) { return bb::value_update(node, child); }
   static int value_age(int val) { return bb::value_age(val); }
   static int value_max(int v0, int v1) { return bb::value_max(v0, v1); }
@@ -198,7 +199,16 @@ struct egdb
 // var.hpp
 struct scan_settings
 {
-  static void init() { init_high(); }
+  // Applies the settings. The engine components are loaded when they are first needed,
+  // unless lazy is false.
+  static void init(bool lazy = true)
+  {
+    init_settings();
+    if (!lazy)
+    {
+      init_engine();
+    }
+  }
   static void load(const std::string& file_name) { var::load(file_name); }
   static void update() { var::update(); }
   static std::string get(const std::string& name) { return var::get(name); }
@@ -212,6 +222,7 @@ inline
 int egdb_lookup(const Pos& pos)
 {
   assert(bb::pos_is_load(pos));
+  init_bitbases();
   switch(bb::probe(pos))
   {
     case bb::Value::Draw: return 0;
@@ -235,6 +246,7 @@ class ScanPlayer
   public:
     int play(const Pos& pos, Depth max_depth = Depth_Max, double max_time = 1.0, int max_moves = 100, int64 max_nodes = 1E12, bool verbose = false)
     {
+      init_engine();
       Game& game = m_game;
       game.clear();
       new_game(pos);
@@ -381,6 +393,8 @@ std::pair<int, Move> scan_search(Pos pos, int max_depth, double max_time)
     return {best_score, best_move};
   }
 
+  init_engine();
+
   Search_Input si;
   si.move = true;
   si.book = false;
@@ -577,6 +591,7 @@ game_result compute_position_result(Pos pos)
 
   if (bb::pos_is_load(pos))
   {
+    init_bitbases();
     switch(bb::probe(pos))
     {
       case bb::Value::Draw: return game_result::draw;
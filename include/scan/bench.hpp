@@ -0,0 +1,35 @@
+
+#ifndef BENCH_HPP
+#define BENCH_HPP
+
+// includes
+
+#include <string>
+#include <vector>
+
+#include "scan/common.hpp"
+#include "scan/libmy.hpp"
+
+// constants
+
+const Depth Bench_Depth {Depth(12)};
+
+// types
+
+struct Bench_Result {
+
+   int positions {0};
+   int64 node {0};
+   double time {0.0};
+
+   double nps () const { return (time < 0.001) ? 0.0 : double(node) / time; }
+};
+
+// functions
+
+const std::vector<std::string> & bench_positions ();
+
+Bench_Result bench (Depth depth = Bench_Depth, bool verbose = false);
+
+#endif // !defined BENCH_HPP
+
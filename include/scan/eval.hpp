@@ -4,16 +4,124 @@
 
 // includes
 
+#include <chrono>
+#include <condition_variable>
+#include <functional>
+#include <mutex>
+#include <string>
+#include <vector>
+
 #include "scan/common.hpp"
 #include "scan/libmy.hpp"
+#include "scan/pos.hpp"
+
+// types
+
+class Eval_Cache { // position key -> eval(), not shared between threads
+
+private:
+
+   struct Entry { // 8 bytes
+      uint32 lock;
+      int32 score; // score::None if empty
+   };
+
+   std::vector<Entry> m_table;
+   int m_mask {0};
+
+   int64 m_hit {0};
+   int64 m_miss {0};
+
+public:
+
+   void set_size (int64 size); // rounded down to a power of two, 0 disables the cache
+   void clear    ();
+
+   bool probe (Key key, Score & sc);
+   void store (Key key, Score sc);
+
+   int64 size () const { return int64(m_table.size()); }
+   int64 hit  () const { return m_hit; }
+   int64 miss () const { return m_miss; }
+};
+
+class Evaluator { // replaces eval() in the search, called by all search threads at the same time
+
+public:
+
+   virtual ~Evaluator () = default;
+
+   virtual void attach (int /* threads */) {} // search threads that will call eval()
+   virtual void detach (int /* threads */) {}
+
+   virtual Score eval (const Pos & pos) = 0; // for the side to move
+};
+
+using Batch_Eval = std::function<void (const std::vector<Pos> & positions, std::vector<Score> & scores)>; // for the side to move
 
-class Pos;
+class Batch_Evaluator : public Evaluator { // evaluates the leaves of concurrent searches together
+
+private:
+
+   struct Request {
+      Pos pos;
+      Score * score;
+      bool * done;
+   };
+
+   Batch_Eval m_batch_eval; // native eval() if empty
+   int m_batch_max;
+   std::chrono::duration<double> m_wait_max;
+
+   mutable std::mutex m_mutex;
+   std::condition_variable m_cond;
+
+   std::vector<Request> m_queue;
+   std::chrono::steady_clock::time_point m_deadline; // of the oldest request in the queue
+   int m_threads {0}; // attached
+
+   int64 m_positions {0};
+   int64 m_batches {0};
+   int64 m_fallbacks {0}; // positions evaluated by eval() after an error
+   std::string m_error;   // last error of m_batch_eval
+
+public:
+
+   Batch_Evaluator (Batch_Eval batch_eval, int batch_max, double wait_max);
+
+   void attach (int threads) override;
+   void detach (int threads) override;
+
+   Score eval (const Pos & pos) override;
+
+   int64 positions () const;
+   int64 batches   () const;
+   int64 fallbacks () const;
+   std::string error () const;
+
+private:
+
+   bool is_ready () const;
+   void flush    (std::unique_lock<std::mutex> & lock);
+};
+
+struct Eval_Components {
+   int mg; // middle-game score for white
+   int eg; // endgame score for white
+   int stage; // game phase in [0, Stage_Size], used to interpolate between mg and eg
+   Score score; // same as eval(pos), for the side to move
+};
 
 // functions
 
 void eval_init ();
+void eval_save (const std::string & file_name); // prepared file, mapped by eval_init() if present
+
+bool eval_is_mapped ();
 
 Score eval (const Pos & pos);
 
+Eval_Components eval_components (const Pos & pos);
+
 #endif // !defined EVAL_HPP
 
@@ -17,6 +17,9 @@ void gen_captures   (List & list, const Pos & pos);
 void gen_promotions (List & list, const Pos & pos);
 void add_sacs       (List & list, const Pos & pos);
 
+void gen_quiets_from (List & list, const Pos & pos, Square from);
+int  count_quiets    (const Pos & pos);
+
 bool can_move    (const Pos & pos, Side sd);
 bool can_capture (const Pos & pos, Side sd);
 
@@ -6,20 +6,34 @@
 
 #include "scan/common.hpp"
 #include "scan/libmy.hpp"
-
-class Pos;
+#include "scan/pos.hpp"
 
 namespace hash {
 
+// constants
+
+const uint64 Seed {5489}; // seed of the key generator, keys depend on it
+
+// variables
+
+extern Key Key_Turn;
+extern Key Key_Piece[Side_Size][Piece_Size][64];
+extern Key Key_Wolf[Side_Size][4][64];
+
 // functions
 
 void init ();
 
-Key key (const Pos & pos);
+Key compute (const Pos & pos); // from scratch, Pos::succ() updates keys incrementally
+
+inline Key key (const Pos & pos) { return pos.key(); }
 
 inline int    index (Key key, int mask) { return uint64(key) & mask; }
 inline uint32 lock  (Key key)           { return uint64(key) >> 32; }
 
+// index in [0, size) for any size <= 2^32, independent of lock()
+inline int64  scale (Key key, int64 size) { return int64((uint64(uint32(uint64(key))) * uint64(size)) >> 32); }
+
 } // namespace hash
 
 #endif // !defined HASH_HPP
@@ -39,6 +39,7 @@ public:
    void set_score (int i, int sc);
 
    void move_to_front (int i);
+   void select        (int i);
    void sort          ();
    void sort_static   (const Pos & pos);
 
@@ -27,6 +27,8 @@ private:
    int m_wolf[Side_Size];
    int m_count[Side_Size];
 
+   Key m_key; // see hash::compute()
+
 public:
 
    Pos () = default;
@@ -37,6 +39,7 @@ public:
    Pos succ (Move mv) const;
 
    Side turn () const { return m_turn; }
+   Key  key  () const { return m_key; }
 
    Bit all   () const { return m_all; }
    Bit empty () const { return bit::Squares ^ all(); }
@@ -124,6 +127,7 @@ public:
       bit::set(m_piece[is_king ? Piece::King : Piece::Man], sq);
       bit::clear(m_piece[is_king ? Piece::Man : Piece::King], sq);
       m_all = m_piece[Piece::Man] ^ m_piece[Piece::King];
+      update_key();
     }
 
     void flip()
@@ -140,6 +144,7 @@ public:
         m_wolf[sd] = -1;
         m_count[sd] = 0;
       }
+      update_key();
     }
 
     Pos flipped() const
@@ -162,6 +167,9 @@ public:
   private:
 
    Pos (Bit man, Bit king, Bit white, Bit black, Bit all, Side turn);
+
+   void set (Bit man, Bit king, Bit white, Bit black, Bit all, Side turn);
+   void update_key ();
 };
 
 bool operator == (const Pos & p0, const Pos & p1);
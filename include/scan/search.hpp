@@ -4,7 +4,11 @@
 
 // includes
 
+#include <atomic>
+#include <functional>
+#include <memory>
 #include <string>
+#include <vector>
 
 #include "scan/common.hpp"
 #include "scan/libmy.hpp"
@@ -13,7 +17,9 @@
 #include "scan/score.hpp"
 #include "scan/tt.hpp" // for Flag
 #include "scan/util.hpp" // for Timer
+#include "scan/var.hpp" // for SMP_Type
 
+class Evaluator;
 class List;
 class Node;
 
@@ -29,6 +35,12 @@ const int Ply_Size {Ply_Max + 1};
 
 enum Output_Type { Output_None, Output_Terminal, Output_Hub };
 
+enum Search_Event { Event_Best_Move, Event_Iteration };
+
+class Search_Output;
+
+using Search_Callback = std::function<bool (Search_Event event, const Search_Output & so)>; // returns true to stop the search
+
 class Line {
 
 private:
@@ -55,6 +67,14 @@ public:
    std::string to_hub    (const Pos & pos) const;
 };
 
+struct PV_Entry { // one line of a multi-PV search
+   Move move {move::None};
+   Score score {score::None};
+   Flag flag {Flag::None};
+   Depth depth {Depth(0)};
+   Line pv;
+};
+
 class Search_Input {
 
 public:
@@ -65,6 +85,10 @@ public:
    int64 nodes {int64(1E12)};
    bool input {false};
    Output_Type output {Output_None};
+   int multipv {1};
+   Search_Callback callback; // called for each new best move and iteration
+   const std::atomic<bool> * stop {nullptr}; // aborts the search when set, checked every few nodes
+   Evaluator * evaluator {nullptr}; // replaces eval() if not null
 
    bool smart {false};
    int moves {0};
@@ -94,6 +118,15 @@ public:
    int64 leaf {0};
    int64 ply_sum {0};
 
+   int64 tt_probe {0};
+   int64 tt_hit {0};
+   int64 bb_probe {0};
+
+   int64 eval_probe {0};
+   int64 eval_hit {0};
+
+   std::vector<PV_Entry> multipv; // lines of the last completed iteration, the best first
+
 private:
 
    const Search_Input * m_si;
@@ -111,13 +144,46 @@ public:
    void new_best_move (Move mv, Score sc = score::None);
    void new_best_move (Move mv, Score sc, Flag flag, Depth depth, const Line & pv);
 
+   PV_Entry line () const;
+
    double ply_avg () const;
    double time    () const;
+   double nps     () const;
+};
+
+class Search_Engine {
+
+private:
+
+   std::unique_ptr<TT> m_tt_own;
+   TT * m_tt;
+   std::atomic<int> m_threads;
+   std::atomic<var::SMP_Type> m_smp_mode;
+
+public:
+
+   Search_Engine (TT & tt, int threads, var::SMP_Type smp_mode = var::SMP_Split); // shared table
+   Search_Engine (int64 tt_size, int threads, var::SMP_Type smp_mode = var::SMP_Split); // private table
+
+   void search (Search_Output & so, const Node & node, const Search_Input & si);
+
+   Move  quick_move  (const Pos & pos);
+   Score quick_score (const Pos & pos);
+
+   TT & tt () const { return *m_tt; }
+
+   // a search reads these settings when it starts, changes apply to the next search
+
+   int  threads     () const { return m_threads; }
+   void set_threads (int threads);
+
+   var::SMP_Type smp_mode     () const { return m_smp_mode; }
+   void          set_smp_mode (var::SMP_Type smp_mode) { m_smp_mode = smp_mode; }
 };
 
 // functions
 
-void search (Search_Output & so, const Node & node, const Search_Input & si);
+void search (Search_Output & so, const Node & node, const Search_Input & si); // global engine
 
 Move  quick_move  (const Pos & pos);
 Score quick_score (const Pos & pos);
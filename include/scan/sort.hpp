@@ -4,20 +4,34 @@
 
 // includes
 
+#include <array>
+
 #include "scan/common.hpp"
 #include "scan/libmy.hpp"
 
 class List;
 class Pos;
 
-// functions
+// types
+
+class History {
+
+private:
+
+   std::array<int, Move_Index_Size> m_prob;
+
+public:
+
+   History () { clear(); }
 
-void sort_clear ();
+   void clear ();
 
-void good_move (Move mv, const Pos & pos);
-void bad_move  (Move mv, const Pos & pos);
+   void good_move (Move mv, const Pos & pos);
+   void bad_move  (Move mv, const Pos & pos);
 
-void sort_moves (List & list, const Pos & pos, Move_Index tt_move);
+   void score_moves (List & list, const Pos & pos, Move_Index tt_move) const;
+   void sort_moves  (List & list, const Pos & pos, Move_Index tt_move) const;
+};
 
 #endif // !defined SORT_HPP
 
@@ -4,6 +4,8 @@
 
 // includes
 
+#include <atomic>
+#include <string>
 #include <vector>
 
 #include "scan/common.hpp"
@@ -24,9 +26,7 @@ private:
 
    static const int Date_Size {16};
 
-   struct Entry { // 16 bytes
-      uint32 lock;
-      uint32 pad_4; // #
+   struct Data { // 8 bytes
       uint16 move;
       int16 score;
       uint8 depth;
@@ -35,26 +35,89 @@ private:
       uint8 pad_1; // #
    };
 
-   std::vector<Entry> m_table;
+   struct alignas(16) Entry { // 16 bytes
+      uint64 check; // lock ^ data: an entry torn by concurrent writes fails verification
+      uint64 data;  // packed Data
+   };
+
+   struct File_Header { // 64 bytes
+      char   magic[8];
+      uint32 version;
+      uint32 variant;
+      uint64 seed;
+      uint64 size;
+      uint32 entry_size;
+      uint32 date;
+      uint8  pad[24]; // #
+   };
+
+   std::vector<Entry> m_memory;
+   Entry * m_table {nullptr}; // cache-line aligned, points into m_memory or into a mapped file
+
+   File_Header * m_map {nullptr}; // mapped file, nullptr if none
+   std::size_t m_map_size {0};
+   int m_map_fd {-1};
 
-   int m_size {0};
-   int m_mask {0};
+   std::string m_shared_name; // POSIX shared memory object, empty if none
+   bool m_owner {false};      // created the shared memory object
+
+   int64 m_size {0}; // entries
+   int64 m_clusters {0};
    int m_date {0};
    int m_age[Date_Size] {};
 
+   std::atomic<int> m_searches {0}; // searches using the table, not copied
+
 public:
 
-   void set_size (int size);
+   TT () = default;
+   TT (const TT & tt);
+   ~TT ();
+
+   TT & operator= (const TT & tt);
+
+   static const int64 Size_Max;
+
+   static int64 size_mb (int64 mb); // entries that fit in mb megabytes
+
+   void set_size    (int64 size); // rounded down to a whole number of clusters
+   void set_size_mb (int64 mb);
+
+   int64 size () const { return m_size; }
+
+   void save (const std::string & file_name);
+   void load (const std::string & file_name, bool mapped = false);
+
+   void open_shared (const std::string & name, int64 size); // size is only used by the owner
+
+   bool is_mapped () const { return m_map != nullptr; }
+   bool is_shared () const { return !m_shared_name.empty(); }
+   bool is_owner  () const { return !is_shared() || m_owner; }
 
    void clear    ();
    void inc_date ();
 
+   int  add_search    () { return m_searches.fetch_add(1); } // returns the number of other searches
+   void remove_search () { m_searches.fetch_sub(1); }
+
    void store (Key key, Move_Index move, Score score, Flag flag, Depth depth);
    bool probe (Key key, Move_Index & move, Score & score, Flag & flag, Depth & depth);
 
+   void prefetch (Key key) const;
+
 private:
 
    void set_date (int date);
+   static uint64 pack   (const Data & data);
+   static Data   unpack (uint64 word);
+
+   void allocate (int64 size);
+   void set_entries (int64 size);
+   void map (int fd, std::size_t map_size, const std::string & name);
+   void unmap    ();
+
+   File_Header header () const;
+   void check_header (const File_Header & header, const std::string & file_name) const;
 };
 
 // variables
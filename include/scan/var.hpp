@@ -13,6 +13,7 @@ namespace var {
 // types
 
 enum Variant_Type { Normal, Killer, BT, Frisian, Losing };
+enum SMP_Type { SMP_Split, SMP_Lazy };
 
 // variables
 
@@ -22,10 +23,14 @@ extern int  Book_Ply;
 extern int  Book_Margin;
 extern bool Ponder;
 extern bool SMP;
+extern SMP_Type SMP_Mode;
 extern int  Threads;
-extern int  TT_Size;
+extern int64 TT_Size; // entries
+extern std::string TT_Shared; // shared memory object name, empty if none
 extern bool BB;
 extern int  BB_Size;
+extern int64 Eval_Cache_Size; // entries per search thread, 0 if none
+extern std::string Data_Dir;
 
 extern bool DXP_Server;
 extern std::string DXP_Host;
@@ -46,6 +51,7 @@ std::string get (const std::string & name);
 void        set (const std::string & name, const std::string & value);
 
 std::string variant_name ();
+std::string data_file    (const std::string & name); // in Data_Dir
 
 } // namespace var
 
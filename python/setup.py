@@ -23,6 +23,7 @@ ext_modules = [
         ["../src/bb_base.cpp",
          "../src/bb_comp.cpp",
          "../src/bb_index.cpp",
+         "../src/bench.cpp",
          "../src/bit.cpp",
          "../src/book.cpp",
          "../src/common.cpp",
@@ -50,7 +51,7 @@ ext_modules = [
          ],
         define_macros = [('VERSION_INFO', __version__)],
         extra_compile_args=['-std=c++17'] if not sys.platform.startswith("win") else [],
-        extra_link_args = ['ws2_32.lib', 'wldap32.lib', 'crypt32.lib'] if sys.platform.startswith("win") else [],
+        extra_link_args = ['ws2_32.lib', 'wldap32.lib', 'crypt32.lib'] if sys.platform.startswith("win") else ['-lrt'] if sys.platform.startswith("linux") else [],
         include_dirs=['../include'],
     ),
 ]
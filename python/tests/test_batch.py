@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+
+#  (C) Copyright Wieger Wesselink 2022. Distributed under the GPL-3.0
+#  Software License, (See accompanying file license.txt or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from draughts1 import *
+
+
+def some_positions():
+    pos = start_position()
+    result = [pos]
+    for move in generate_moves(pos):
+        u = pos.succ(move)
+        result.append(u)
+        result += [u.succ(m) for m in generate_moves(u)]
+    result.append(parse_position('''
+           O   .   .   .   .
+         .   .   .   .   .
+           .   .   x   .   .
+         .   .   .   .   .
+           .   x   x   .   .
+         .   .   .   .   .
+           .   .   .   .   .
+         .   .   .   .   .
+           .   .   .   o   .
+         X   .   .   .   o   B
+    '''))
+    return result
+
+
+class Test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        Scan.set("variant", "normal")
+        Scan.set("book", "false")
+        Scan.set("book-ply", "4")
+        Scan.set("book-margin", "4")
+        Scan.set("ponder", "false")
+        Scan.set("threads", "1")
+        Scan.set("tt-size", "24")
+        Scan.set("bb-size", "4")
+        Scan.update()
+        Scan.init()
+
+    def test_encode_batch(self):
+        positions = some_positions()
+
+        boards = encode_batch(positions)
+        self.assertEqual((len(positions), 4, 10, 10), boards.shape)
+        self.assertEqual(np.uint8, boards.dtype)
+        for i, pos in enumerate(positions):
+            self.assertEqual(pos_to_numpy1(pos).tolist(), boards[i].reshape(400).tolist())
+
+        squares = encode_batch(positions, layout='squares', dtype=np.float32, threads=4)
+        self.assertEqual((len(positions), 4, 50), squares.shape)
+        self.assertEqual(np.float32, squares.dtype)
+        for i, pos in enumerate(positions):
+            self.assertEqual(pos_to_numpy2(pos).tolist(), squares[i].reshape(200).tolist())
+
+        out = np.ones((len(positions), 4, 50), dtype=np.float32)
+        encode_batch(positions, layout='squares', dtype=np.float32, out=out)
+        self.assertTrue((out == squares).all())
+
+        with self.assertRaises(RuntimeError):
+            encode_batch(positions, layout='squares', dtype=np.float32, out=np.zeros((1, 4, 50), dtype=np.float32))
+
+    def test_pos_batch(self):
+        positions = some_positions()
+        batch = PosBatch.from_positions(positions)
+        self.assertEqual(len(positions), len(batch))
+        self.assertEqual(positions, batch.to_positions())
+        self.assertEqual(positions[-1], batch[-1])
+        self.assertEqual([hash_key(pos) for pos in positions], batch.hash_key(threads=4).tolist())
+        self.assertTrue((encode_batch(positions) == encode_batch(batch)).all())
+
+        # slices and the array property are views on the same data
+        view = batch[1:5]
+        self.assertEqual(positions[1:5], view.to_positions())
+        view[0] = positions[0]
+        self.assertEqual(positions[0], batch[1])
+        self.assertEqual(batch.array[1], np.asarray(batch)[1])
+
+        # zero-copy construction from a structured array
+        array = np.zeros(3, dtype=PosBatch.dtype)
+        array[0] = batch.array[0]
+        array[1] = batch.array[2]
+        array[2] = batch.array[3]
+        self.assertEqual([positions[0], positions[2], positions[3]], PosBatch(array).to_positions())
+        array['wm'][0] = array['bm'][0]
+        with self.assertRaises(RuntimeError):
+            PosBatch(array)
+
+        self.assertEqual(batch.to_positions() + positions[1:5], (batch + PosBatch.from_positions(positions[1:5])).to_positions())
+        self.assertEqual(10, len(PosBatch(10)))
+
+        import pickle
+        self.assertEqual(batch.to_positions(), pickle.loads(pickle.dumps(batch)).to_positions())
+
+    def test_generate_moves_batch(self):
+        positions = some_positions()
+        for kind, generate in [('moves', generate_moves), ('captures', generate_captures), ('promotions', generate_promotions)]:
+            result = generate_moves_batch(positions, kind=kind, details=True, threads=3)
+            moves, offsets = result['moves'], result['offsets']
+            self.assertEqual(len(positions) + 1, len(offsets))
+            for i, pos in enumerate(positions):
+                expected = list(generate(pos))
+                first, last = offsets[i], offsets[i + 1]
+                self.assertEqual(expected, moves[first:last].tolist())
+                self.assertEqual([move_index(m, pos) for m in expected], result['index'][first:last].tolist())
+                for j, m in enumerate(expected):
+                    records = PosBatch.from_positions([pos, pos.succ(m)]).array
+                    opponent = ['bm', 'bk'] if pos.is_white_to_move() else ['wm', 'wk']
+                    pieces = [int(records[k][opponent[0]] | records[k][opponent[1]]) for k in range(2)]
+                    self.assertEqual(pieces[0] & ~pieces[1], int(result['captured'][first + j]))
+                self.assertEqual([print_move(m, pos).replace('x', '-').split('-')[0] for m in expected], [str(f) for f in result['from'][first:last]])
+
+        result = generate_moves_batch(PosBatch())
+        self.assertEqual([0], result['offsets'].tolist())
+        self.assertNotIn('from', result)
+
+    def test_succ_batch(self):
+        positions = some_positions()
+        moves = [generate_moves(pos)[0] for pos in positions]
+        children = succ_batch(positions, np.array(moves, dtype=np.uint64), threads=2)
+        self.assertEqual([pos.succ(m) for pos, m in zip(positions, moves)], children.to_positions())
+        with self.assertRaises(RuntimeError):
+            succ_batch(positions, moves[1:])
+        illegal = list(moves)
+        illegal[2] = moves[1] # a black move, white is to move
+        with self.assertRaisesRegex(ValueError, r'moves\[2\]'):
+            succ_batch(positions, np.array(illegal, dtype=np.uint64), threads=2)
+
+        children, offsets = expand_all(PosBatch.from_positions(positions), threads=3)
+        self.assertEqual(len(children), offsets[-1])
+        for i, pos in enumerate(positions):
+            self.assertEqual([pos.succ(m) for m in generate_moves(pos)], children[offsets[i]:offsets[i + 1]].to_positions())
+
+    def test_eval_batch(self):
+        positions = some_positions()
+        scores = eval_batch(positions)
+        self.assertEqual(np.int16, scores.dtype)
+        self.assertEqual([eval_position(pos) for pos in positions], scores.tolist())
+
+        white_scores = eval_batch(PosBatch.from_positions(positions), perspective='white', threads=4)
+        self.assertEqual([s if pos.is_white_to_move() else -s for pos, s in zip(positions, scores)], white_scores.tolist())
+
+        result = eval_batch(positions, perspective='white', components=True)
+        self.assertEqual(white_scores.tolist(), result['score'].tolist())
+        self.assertEqual(len(positions), len(result['mg']))
+        self.assertTrue(all(0 <= stage <= 300 for stage in result['stage']))
+
+    def test_eval_cache(self):
+        positions = some_positions()
+        cache = EvalCache(1000)
+        self.assertEqual(512, cache.size())
+        for _ in range(2):
+            self.assertEqual([eval_position(pos) for pos in positions], [eval_position(pos, cache) for pos in positions])
+        self.assertEqual(2 * len(positions), cache.hits + cache.misses)
+        self.assertGreaterEqual(cache.hits, 1)
+        cache.clear()
+        self.assertEqual((0, 0), (cache.hits, cache.misses))
+        with self.assertRaises(ValueError):
+            EvalCache(-1)
+
+    def test_eval_weights_mapped(self):
+        positions = some_positions()
+        scores = [eval_position(pos) for pos in positions]
+        data_dir = Scan.get("data-dir")
+        with tempfile.TemporaryDirectory() as directory:
+            os.symlink(os.path.abspath(os.path.join(data_dir, 'eval')), os.path.join(directory, 'eval'))
+            save_eval_weights(os.path.join(directory, 'eval.i16'))
+            self.assertEqual(64 + 2 * 2 * 2125820, os.path.getsize(os.path.join(directory, 'eval.i16')))
+            try:
+                Scan.set("data-dir", directory)
+                Scan.update()
+                Scan.init()
+                self.assertTrue(eval_weights_mapped())
+                self.assertEqual(scores, [eval_position(pos) for pos in positions])
+            finally:
+                Scan.set("data-dir", data_dir)
+                Scan.update()
+                Scan.init()
+
+    def test_binary_encoding(self):
+        positions = some_positions()
+        for pos in positions:
+            data = encode_position(pos)
+            self.assertEqual(26, len(data))
+            self.assertEqual(pos, decode_position(data))
+
+        data = encode_positions(positions, threads=2)
+        self.assertEqual(26 * len(positions), len(data))
+        self.assertEqual(positions, decode_positions(data).to_positions())
+        self.assertEqual(positions[1:3], decode_positions(memoryview(data)[26:78]).to_positions())
+        with self.assertRaises(RuntimeError):
+            decode_positions(data[:-1])
+
+        pos = start_position()
+        moves = []
+        game = Game()
+        game.init(pos)
+        for _ in range(20):
+            m = list(generate_moves(pos))[-1]
+            moves.append(m)
+            game.add_move(m, 0.0)
+            pos = pos.succ(m)
+        data = encode_moves(start_position(), moves)
+        self.assertEqual(1 + len(moves), len(data))
+        self.assertEqual(moves, decode_moves(start_position(), data))
+
+        games = decode_games(encode_games([game, game]))
+        self.assertEqual(2, len(games))
+        self.assertEqual(moves, [games[1].move(i) for i in range(games[1].size())])
+        self.assertEqual(game.pos(), games[1].pos())
+
+    def test_actions(self):
+        # the last two positions have different captures with the same start and end square
+        positions = some_positions() + [parse_position('........xx....xx...x.x......o.o.o...o.....oooX..ooB'),
+                                        parse_position('...xOxx....xxxxo.....x..ox......o..o....o.o..o...oW')]
+        masks = legal_action_mask_batch(positions, threads=2)
+        self.assertEqual((len(positions), action_size), masks.shape)
+        self.assertEqual(np.bool_, masks.dtype)
+        for i, pos in enumerate(positions):
+            moves = list(generate_moves(pos))
+            actions = [move_to_action(m, pos) for m in moves]
+            self.assertEqual(len(moves), len(set(actions)))
+            self.assertTrue(all(0 <= action < action_size for action in actions))
+            self.assertEqual(sorted(actions), np.flatnonzero(masks[i]).tolist())
+            for m, action in zip(moves, actions):
+                self.assertEqual(m, action_to_move(action, pos))
+            unused = next(a for a in range(action_size) if a not in actions)
+            self.assertEqual(move_none(), action_to_move(unused, pos))
+        self.assertTrue(any(action >= 2500 for action in np.flatnonzero(masks[-1])))
+
+        # quiet moves that are legal two plies later, but not in the start position
+        pos = start_position()
+        u = pos.succ(generate_moves(pos)[0])
+        u = u.succ(generate_moves(u)[0])
+        illegal = [m for m in generate_moves(u) if m not in list(generate_moves(pos))]
+        self.assertTrue(illegal)
+        for m in illegal:
+            with self.assertRaises(RuntimeError):
+                move_to_action(m, pos)
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
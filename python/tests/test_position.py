@@ -4,6 +4,9 @@
 #  Software License, (See accompanying file license.txt or copy at
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
+import os
+import subprocess
+import sys
 import unittest
 from draughts1 import *
 
@@ -462,6 +465,18 @@ class Test(unittest.TestCase):
         self.assertEqual(pos, pos1)
 
 
+    def test_hash_key(self):
+        import pickle
+        # keys are updated incrementally by succ, and computed from scratch by the constructor
+        pos = start_position()
+        for i in range(40):
+            moves = list(generate_moves(pos))
+            if not moves:
+                break
+            pos = pos.succ(moves[(7 * i) % len(moves)])
+            self.assertEqual(hash_key(pos), hash_key(pickle.loads(pickle.dumps(pos))))
+            self.assertEqual(hash_key(pos), hash_key(pos.flip().flip()))
+
     def test_flip(self):
         text1 = '''
            x   X   .   .   .
@@ -836,6 +851,21 @@ class Test(unittest.TestCase):
         result = compute_position_result(pos)
         self.assertEqual(GameResult.Unknown, result)
 
+    def test_init_report(self):
+        eval_position(start_position())  # loads the evaluation on first use
+        phases = [record['name'] for record in init_report()]
+        for name in ['bit', 'var', 'pos', 'eval']:
+            self.assertIn(name, phases)
+        self.assertTrue(all(record['seconds'] >= 0 for record in init_report()))
+
+    def test_pos_tables_on_import(self):
+        # the position tables must be available right after importing the module, before
+        # anything else has triggered the lazy initialization
+        code = 'from draughts1 import *; pos = start_position(); print(pos.tempo(), pos.skew(Side.White), pos.stage())'
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout
+        self.assertEqual('300 0 0', output.strip())
+
 
 if __name__ == '__main__':
     import unittest
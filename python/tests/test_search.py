@@ -4,7 +4,12 @@
 #  Software License, (See accompanying file license.txt or copy at
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
+import os
+import time
+import sys
+import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from draughts1 import *
 
 
@@ -172,6 +177,316 @@ class Test(unittest.TestCase):
         expected_piece_count = -3
         self.check_position(text, max_depth, expected_moves, expected_piece_count)
 
+    def test_search_engine(self):
+        positions = [start_position()]
+        positions += [positions[0].succ(m) for m in generate_moves(positions[0])][:3]
+
+        def run(pos):
+            engine = SearchEngine(tt_size=16)
+            output = engine.search(pos, depth=6)
+            return output.move, output.score, output.node
+
+        # engines with a private state give the same results when they run at the same time
+        expected = [run(pos) for pos in positions]
+        with ThreadPoolExecutor(max_workers=len(positions)) as executor:
+            self.assertEqual(expected, list(executor.map(run, positions)))
+        for pos, (m, score, nodes) in zip(positions, expected):
+            self.assertIn(m, list(generate_moves(pos)))
+            self.assertGreater(nodes, 0)
+
+        # a shared engine keeps its transposition table between searches
+        engine = SearchEngine(tt_size=16)
+        output = engine.search(positions[0], depth=6)
+        child = positions[0].succ(output.move)
+        self.assertNotEqual(move_none(), engine.quick_move(child))
+        self.assertEqual(move_none(), SearchEngine(tt_size=16).quick_move(child))
+
+        with self.assertRaises(RuntimeError):
+            SearchEngine(threads=0)
+
+    def test_smp_modes(self):
+        pos = start_position()
+        for smp_mode in ['split', 'lazy']:
+            for threads in [2, 20]:
+                engine = SearchEngine(tt_size=16, threads=threads, smp_mode=smp_mode)
+                self.assertEqual(smp_mode, engine.smp_mode)
+                output = engine.search(pos, depth=7)
+                self.assertEqual(7, output.depth)
+                self.assertIn(output.move, list(generate_moves(pos)))
+        with self.assertRaises(RuntimeError):
+            SearchEngine(smp_mode='ybwc')
+
+    def test_multipv(self):
+        pos = start_position()
+        moves = list(generate_moves(pos))
+        output = SearchEngine(tt_size=16).search(pos, depth=6, multipv=3)
+        self.assertEqual(3, len(output.multipv))
+        self.assertEqual(output.move, output.multipv[0].move)
+        self.assertEqual(output.score, output.multipv[0].score)
+        self.assertEqual(3, len({line.move for line in output.multipv}))
+        for line in output.multipv:
+            self.assertIn(line.move, moves)
+            self.assertEqual(6, line.depth)
+            self.assertEqual(line.move, line.pv[0])
+
+        output = SearchEngine(tt_size=16).search(pos, depth=4, multipv=100)
+        self.assertEqual(sorted(moves), sorted(line.move for line in output.multipv))
+        self.assertEqual(1, len(SearchEngine(tt_size=16).search(pos, depth=4).multipv))
+
+    def test_search_callback(self):
+        pos = start_position()
+        events = []
+
+        def callback(event, output):
+            events.append((event, output.depth, output.node, list(output.pv)))
+            return event == SearchEvent.Iteration and output.depth == 5
+
+        output = SearchEngine(tt_size=16).search(pos, depth=10, callback=callback)
+        self.assertEqual(5, output.depth)
+        iterations = [e for e in events if e[0] == SearchEvent.Iteration]
+        self.assertEqual([1, 2, 3, 4, 5], [e[1] for e in iterations])
+        self.assertTrue(any(e[0] == SearchEvent.BestMove for e in events))
+        self.assertEqual(sorted(e[2] for e in events), [e[2] for e in events])
+        self.assertEqual(list(output.pv), iterations[-1][3])
+        self.assertGreater(output.tt_probe, 0)
+        self.assertLessEqual(output.tt_hit, output.tt_probe)
+
+        def fail(event, output):
+            raise ValueError('stop')
+        with self.assertRaises(ValueError):
+            SearchEngine(tt_size=16).search(pos, depth=10, callback=fail)
+
+        si = SearchInput()
+        si.depth = 3
+        si.book = False
+        si.callback = lambda event, output: None
+        self.assertTrue(si.callback)
+        so = SearchOutput()
+        SearchEngine(tt_size=16).search(so, make_node(pos), si)
+        self.assertEqual(3, so.depth)
+
+    def test_search_callback_split(self):
+        pos = start_position()
+        moves = list(generate_moves(pos))
+        events = []
+
+        def callback(event, output):
+            time.sleep(0.001) # keep the helpers running while the callback holds the GIL
+            events.append((event, output.depth, output.move))
+            return False
+
+        engine = SearchEngine(tt_size=16, threads=4, smp_mode='split')
+        output = engine.search(pos, depth=10, callback=callback)
+        self.assertEqual(10, output.depth)
+        self.assertIn(output.move, moves)
+        iterations = [e for e in events if e[0] == SearchEvent.Iteration]
+        self.assertEqual(list(range(1, 11)), [e[1] for e in iterations])
+        best_moves = [e for e in events if e[0] == SearchEvent.BestMove]
+        self.assertTrue(best_moves)
+        for event in best_moves:
+            self.assertIn(event[2], moves)
+        self.assertEqual(sorted(e[1] for e in events), [e[1] for e in events])
+
+    def test_search_handle(self):
+        pos = start_position()
+        engine = SearchEngine(tt_size=16)
+        handle = engine.start(pos, depth=int(1E3))
+        self.assertFalse(handle.wait(0.2))
+        handle.stop()
+        self.assertTrue(handle.wait(10))
+        output = handle.result()
+        self.assertIn(output.move, list(generate_moves(pos)))
+
+        handle = engine.start(pos, depth=4)
+        self.assertEqual(4, handle.future().result().depth)
+
+        import asyncio
+        async def run():
+            return await engine.start(pos, depth=3)
+        self.assertEqual(3, asyncio.run(run()).depth)
+
+        handle = engine.start(pos, depth=int(1E3))
+        handle.future().cancel()
+        self.assertTrue(handle.wait(10))
+
+    def test_tt_size(self):
+        tt = TranspositionTable()
+        tt.set_size(100003)
+        self.assertEqual(100000, tt.size())
+        tt.set_size_mb(3)
+        self.assertEqual(3 * 2 ** 20 // 16, tt.size())
+        moves = list(generate_moves(start_position()))
+        self.assertIn(SearchEngine(tt).search(start_position(), depth=8).move, moves)
+        self.assertIn(SearchEngine(tt_mb=1, threads=2, smp_mode='lazy').search(start_position(), depth=8).move, moves)
+
+    def test_tt_save_load(self):
+        pos = start_position()
+        tt = TranspositionTable()
+        tt.set_size(1 << 16)
+        cold = SearchEngine(tt).search(pos, depth=8)
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'tt.bin')
+            tt.save(filename)
+            self.assertEqual(64 + 16 * (1 << 16), os.path.getsize(filename))
+
+            for mapped in [False, True]:
+                warm = TranspositionTable()
+                warm.load(filename, mapped=mapped)
+                self.assertEqual(mapped, warm.is_mapped())
+                output = SearchEngine(warm).search(pos, depth=8)
+                self.assertEqual(cold.move, output.move)
+                self.assertLess(output.node, cold.node)
+                warm.save(filename)
+                del warm
+
+            with open(filename, 'r+b') as f:
+                f.write(b'x')
+            with self.assertRaises(RuntimeError):
+                TranspositionTable().load(filename)
+
+    def test_tt_mapped_kept(self):
+        pos = start_position()
+        tt = TranspositionTable()
+        tt.set_size(1 << 16)
+        cold = SearchEngine(tt).search(pos, depth=8)
+
+        # the root is in the bitbases, which clears a table used by this search only
+        text = '''
+           .   .   .   .   .
+         .   .   .   x   .
+           .   .   .   .   .
+         .   .   .   .   .
+           .   .   .   .   .
+         .   .   .   .   .
+           .   .   x   .   .
+         .   .   .   .   .
+           .   .   .   .   .
+         O   .   .   .   O   W
+        '''
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'tt.bin')
+            tt.save(filename)
+            mapped = TranspositionTable()
+            mapped.load(filename, mapped=True)
+            SearchEngine(mapped).search(parse_position(text), depth=4)
+            output = SearchEngine(mapped).search(pos, depth=8)
+            self.assertEqual(cold.move, output.move)
+            self.assertLess(output.node, cold.node)
+            del mapped
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'requires POSIX shared memory')
+    def test_tt_shared(self):
+        name = '/draughts1-test-%d' % os.getpid()
+        pos = start_position()
+        owner = TranspositionTable()
+        owner.open_shared(name, 1 << 16)
+        other = TranspositionTable()
+        other.open_shared(name, 1 << 10)
+        self.assertTrue(owner.is_owner())
+        self.assertFalse(other.is_owner())
+        self.assertEqual(1 << 16, other.size())
+
+        cold = SearchEngine(owner).search(pos, depth=8)
+        other.clear()  # ignored, only the owner resets the table
+        warm = SearchEngine(other).search(pos, depth=8)
+        self.assertLess(warm.node, cold.node)
+
+        owner.clear()
+        self.assertEqual(cold.node, SearchEngine(other).search(pos, depth=8).node)
+        del owner
+        with self.assertRaises(RuntimeError):
+            TranspositionTable().open_shared(name + '/invalid')
+
+    def test_bench(self):
+        result = bench(depth=6)
+        self.assertEqual(len(bench_positions()), result['positions'])
+        self.assertGreater(result['nodes'], 0)
+        self.assertEqual(result['nodes'], bench(depth=6)['nodes'])
+
+    def test_batch_evaluator(self):
+        pos = start_position()
+        expected = SearchEngine(tt_size=18).search(pos, depth=7)
+
+        sizes = []
+        def fn(positions):
+            sizes.append(len(positions))
+            return eval_batch(positions)
+
+        for evaluator in [BatchEvaluator(), BatchEvaluator(fn, max_batch=16, max_wait=0.01)]:
+            result = SearchEngine(tt_size=18).search(pos, depth=7, evaluator=evaluator)
+            self.assertEqual((expected.node, expected.move), (result.node, result.move))
+            self.assertEqual(evaluator.positions, evaluator.batches) # a single search thread never fills a batch
+        self.assertEqual(len(sizes), sum(sizes))
+
+        positions = [pos.succ(m) for m in generate_moves(pos)]
+        evaluator = BatchEvaluator(fn, max_batch=16, max_wait=0.01)
+        result = search_many(positions, depth=5, workers=3, evaluator=evaluator)
+        self.assertEqual(search_many(positions, depth=5)['move'].tolist(), result['move'].tolist())
+        self.assertGreater(evaluator.batches, 0)
+        self.assertLessEqual(max(sizes), 16)
+
+        def fails(positions):
+            raise ValueError('no model')
+        evaluator = BatchEvaluator(fails)
+        self.assertEqual(expected.node, SearchEngine(tt_size=18).search(pos, depth=7, evaluator=evaluator).node)
+        self.assertEqual(evaluator.positions, evaluator.fallbacks)
+        self.assertIn('no model', evaluator.error)
+
+    def test_search_many(self):
+        positions = [start_position()]
+        positions += [positions[0].succ(m) for m in generate_moves(positions[0])][:5]
+
+        finished = []
+        result = search_many(positions, depth=5, workers=3, callback=lambda i, output: finished.append((i, output.move)))
+        self.assertEqual(sorted(range(len(positions))), sorted(i for i, _ in finished))
+        for i, pos in enumerate(positions):
+            expected = SearchEngine(tt_size=20).search(pos, depth=5)
+            self.assertEqual(expected.move, result['move'][i])
+            self.assertEqual(expected.score, result['score'][i])
+            self.assertEqual(expected.node, result['nodes'][i])
+            pv = result['pv'][result['pv_offsets'][i]:result['pv_offsets'][i + 1]]
+            self.assertEqual(list(expected.pv), pv.tolist())
+
+        result = search_many(PosBatch.from_positions(positions), depth=5, workers=2, shared_tt=True)
+        self.assertTrue(all(m in list(generate_moves(pos)) for pos, m in zip(positions, result['move'])))
+
+        def fail(i, output):
+            raise ValueError('stop')
+        with self.assertRaises(ValueError):
+            search_many(positions, depth=3, callback=fail)
+
+        for tt_size in [-1, 15, 35, 64]:
+            with self.assertRaises(ValueError):
+                search_many(positions, depth=3, tt_size=tt_size)
+            with self.assertRaises(ValueError):
+                SearchEngine(tt_size=tt_size)
+
+    @unittest.skipIf((os.cpu_count() or 1) < 2, 'requires at least 2 CPUs')
+    def test_parallel_minimax_search(self):
+        # minimax_search releases the GIL and does not use global engine state, so
+        # searches in Python threads run in parallel
+        workers = min(4, os.cpu_count())
+        pos = start_position()
+        max_depth = 10
+
+        expected = [minimax_search(pos, max_depth) for _ in range(workers)]
+
+        # best of several runs, such that a busy machine does not fail the test
+        sequential_time = parallel_time = float('inf')
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in range(5):
+                start = time.perf_counter()
+                for _ in range(workers):
+                    minimax_search(pos, max_depth)
+                sequential_time = min(sequential_time, time.perf_counter() - start)
+
+                start = time.perf_counter()
+                results = list(executor.map(lambda _: minimax_search(pos, max_depth), range(workers)))
+                parallel_time = min(parallel_time, time.perf_counter() - start)
+                self.assertEqual(expected, results)
+
+        self.assertGreaterEqual(sequential_time / parallel_time, 0.5 * workers)
+
 
 if __name__ == '__main__':
     import unittest
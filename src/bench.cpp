@@ -0,0 +1,93 @@
+
+// includes
+
+#include <cinttypes>
+#include <cstdio>
+#include <string>
+#include <vector>
+
+#include "scan/bench.hpp"
+#include "scan/common.hpp"
+#include "scan/fen.hpp"
+#include "scan/libmy.hpp"
+#include "scan/pos.hpp"
+#include "scan/search.hpp"
+
+// constants
+
+const int Bench_TT_Size {1 << 20}; // fixed, the node count depends on it
+
+// variables
+
+static const std::vector<std::string> G_Positions { // normal variant, mostly from games/wiersma.pdn
+
+   // opening
+
+   "W:W31-50:B1-20",
+   "W:W26,31-36,39-50:B1-6,8-13,15-18,20,22,23",
+   "W:W31-49:B1-4,6-19,23,29",
+   "W:W31,33-36,38-50:B1-6,8-10,12-16,18,20,22,23",
+
+   // middlegame
+
+   "W:W34-36,38-41,43,46-50:B2-6,9,12,14-16,18,19,22",
+   "W:W25,31-39,42-45,47-49:B3-6,8-11,13-16,18,20-22,26",
+   "W:W15,25,31,32,36-38,42,44,47,48,50:B2-4,6,8,11,12,14,16,18,26,33,45",
+   "W:W28,29,33,34,36-40,43,46,48,49:B3,4,6-9,12,13,15,20,22,24,26",
+   "B:W29,31,32,34,37,40,42-45,47:B1,4,7,9-11,14-17,25",
+   "W:W27,32,33,36-38,42,45,48,49:B1-3,7,8,13,16,17,21,25,29,30",
+
+   // endgame
+
+   "B:W27,28,43,48-50:B6,8,12,15,17,35",
+   "B:W26,27,33-35,43:B12,16,18,20,23,25",
+   "B:W16,27,K30,44:B23,26,37",
+   "W:WK5,29,33:B22,25,27,K38",
+
+   // bitbases
+
+   "W:W29,34,36:B19,27,31",
+   "B:WK5,29,42:B22,25,27",
+};
+
+// functions
+
+const std::vector<std::string> & bench_positions() {
+   return G_Positions;
+}
+
+Bench_Result bench(Depth depth, bool verbose) {
+
+   Search_Engine engine(Bench_TT_Size, 1); // single thread => deterministic
+
+   Search_Input si;
+   si.move = false; // also search forced moves
+   si.book = false;
+   si.depth = depth;
+   si.input = false;
+   si.output = Output_None;
+
+   Bench_Result result;
+
+   for (const std::string & fen : G_Positions) {
+
+      engine.tt().clear();
+
+      Node node(pos_from_fen(fen));
+
+      Search_Output so;
+      engine.search(so, node, si);
+
+      result.positions += 1;
+      result.node += so.node;
+      result.time += so.time();
+
+      if (verbose) {
+         std::printf("%2d %+7.2f%11" PRId64 "%7.2f  %s\n", so.depth, double(so.score) / 100.0, so.node, so.time(), fen.c_str());
+         std::fflush(stdout);
+      }
+   }
+
+   return result;
+}
+
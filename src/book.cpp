@@ -73,7 +73,7 @@ void init() {
    static_assert(sizeof(Entry) == 16, "");
 
    std::cout << "init book" << std::endl;
-   G_Book.load(std::string("data/book") + var::variant_name());
+   G_Book.load(var::data_file(std::string("book") + var::variant_name()));
 }
 
 bool probe(const Pos & pos, Score margin, Move & move, Score & score) {
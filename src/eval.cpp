@@ -2,16 +2,29 @@
 // includes
 
 #include <algorithm>
+#include <chrono>
 #include <cmath>
 #include <cstdlib>
+#include <cstring>
 #include <fstream>
 #include <iostream>
+#include <stdexcept>
 #include <string>
+#include <utility>
 #include <vector>
 
+#if defined(__unix__) || defined(__APPLE__)
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#define EVAL_MMAP
+#endif
+
 #include "scan/bit.hpp"
 #include "scan/common.hpp"
 #include "scan/eval.hpp"
+#include "scan/hash.hpp"
 #include "scan/libmy.hpp"
 #include "scan/pos.hpp"
 #include "scan/score.hpp"
@@ -27,14 +40,33 @@ const int Pattern_Size {12}; // squares per pattern
 const int P {2125820}; // eval parameters
 const int Unit {10}; // units per cp
 
+const char Weight_Magic[8] {"scan-ev"};
+const uint32 Weight_Version {1};
+const uint32 Weight_Endian {0x01020304}; // written in native byte order
+
 // "constants"
 
 const int Perm_0[Pattern_Size] { 11, 10,  7,  6,  3,  2,  9,  8,  5,  4,  1,  0 };
 const int Perm_1[Pattern_Size] {  0,  1,  4,  5,  8,  9,  2,  3,  6,  7, 10, 11 };
 
+// types
+
+struct Weight_Header { // 64 bytes, followed by P * 2 native int16 weights (mg/eg interleaved)
+   char   magic[8];
+   uint32 version;
+   uint32 variant;
+   uint32 size; // weights
+   uint32 endian;
+   uint8  pad[40]; // #
+};
+
 // variables
 
-static std::vector<int> G_Weight;
+static const int16 * G_Weight {nullptr}; // P * 2, points into G_Weight_Memory or G_Weight_Map
+static std::vector<int16> G_Weight_Memory;
+
+static void * G_Weight_Map {nullptr};
+static std::size_t G_Weight_Map_Size {0};
 
 static int Trits_0[pow(2, Pattern_Size)];
 static int Trits_1[pow(2, Pattern_Size)];
@@ -67,6 +99,16 @@ static void pst      (Score_2 & s2, int var, Bit bw, Bit bb);
 static void king_mob (Score_2 & s2, int var, const Pos & pos);
 static void pattern  (Score_2 & s2, int var, const Pos & pos);
 
+static bool load_weights_mapped (const std::string & file_name);
+static void load_weights        (const std::string & file_name);
+static void unload_weights      ();
+
+static Weight_Header weight_header ();
+
+static void features (Score_2 & s2, const Pos & pos);
+
+static Score eval (const Score_2 & s2, const Pos & pos);
+
 static void indices_column (uint64 white, uint64 black, int & index_top, int & index_bottom);
 static void indices_column (uint64 b, int & i0, int & i2);
 
@@ -78,9 +120,86 @@ void eval_init() {
 
    std::cout << "init eval" << std::endl;
 
-   // load weights
+   // load weights, prepared file first
+
+   std::string file_name = var::data_file(std::string("eval") + var::variant_name());
+
+   unload_weights();
+   if (!load_weights_mapped(file_name + ".i16")) load_weights(file_name);
+
+   // init base conversion (2 -> 3)
+
+   int size = Pattern_Size;
+   int bf = 2;
+   int bt = 3;
+
+   for (int i = 0; i < pow(bf, size); i++) {
+      Trits_0[i] = conv(i, size, bf, bt, Perm_0);
+      Trits_1[i] = conv(i, size, bf, bt, Perm_1);
+   }
+}
+
+void eval_save(const std::string & file_name) {
+
+   if (G_Weight == nullptr) throw std::runtime_error("unable to save evaluation weights: not loaded");
+
+   std::ofstream file(file_name, std::ios::binary | std::ios::trunc);
+
+   Weight_Header head = weight_header();
+   file.write(reinterpret_cast<const char *>(&head), sizeof(Weight_Header));
+   file.write(reinterpret_cast<const char *>(G_Weight), std::streamsize(P * 2) * sizeof(int16));
+
+   if (!file) {
+      throw std::runtime_error("unable to save evaluation weights \"" + file_name + "\"");
+   }
+}
+
+bool eval_is_mapped() {
+   return G_Weight_Map != nullptr;
+}
+
+static bool load_weights_mapped(const std::string & file_name) {
+
+#ifdef EVAL_MMAP
+
+   std::size_t map_size = sizeof(Weight_Header) + std::size_t(P * 2) * sizeof(int16);
+
+   int fd = open(file_name.c_str(), O_RDONLY);
+   if (fd < 0) return false; // no prepared file
+
+   struct stat st;
+   void * map = MAP_FAILED;
+
+   if (fstat(fd, &st) == 0 && std::size_t(st.st_size) == map_size) {
+      map = mmap(nullptr, map_size, PROT_READ, MAP_SHARED, fd, 0); // pages are shared by all processes
+   }
+
+   close(fd);
+
+   Weight_Header head = weight_header();
+
+   if (map == MAP_FAILED || std::memcmp(map, &head, sizeof(Weight_Header)) != 0) {
+      if (map != MAP_FAILED) munmap(map, map_size);
+      std::cerr << "ignoring invalid weight file \"" << file_name << "\"" << std::endl;
+      return false;
+   }
+
+   G_Weight_Map = map;
+   G_Weight_Map_Size = map_size;
+   G_Weight = reinterpret_cast<const int16 *>(static_cast<const char *>(map) + sizeof(Weight_Header));
+
+   return true;
+
+#else
+
+   (void) file_name;
+   return false;
+
+#endif
+}
+
+static void load_weights(const std::string & file_name) { // original format: big-endian int16
 
-   std::string file_name = std::string("data/eval") + var::variant_name();
    std::ifstream file(file_name, std::ios::binary);
 
    if (!file) {
@@ -88,22 +207,49 @@ void eval_init() {
       std::exit(EXIT_FAILURE);
    }
 
-   G_Weight.resize(P * 2);
+   std::vector<uint8> bytes(std::size_t(P * 2) * 2);
+
+   if (!file.read(reinterpret_cast<char *>(bytes.data()), std::streamsize(bytes.size()))) {
+      std::cerr << "unable to read file \"" << file_name << "\"" << std::endl;
+      std::exit(EXIT_FAILURE);
+   }
+
+   G_Weight_Memory.resize(P * 2);
 
    for (int i = 0; i < P * 2; i++) {
-      G_Weight[i] = int16(ml::get_bytes(file, 2)); // HACK: extend sign
+      G_Weight_Memory[i] = int16((bytes[i * 2 + 0] << 8) | bytes[i * 2 + 1]);
    }
 
-   // init base conversion (2 -> 3)
+   G_Weight = G_Weight_Memory.data();
+}
 
-   int size = Pattern_Size;
-   int bf = 2;
-   int bt = 3;
+static void unload_weights() {
 
-   for (int i = 0; i < pow(bf, size); i++) {
-      Trits_0[i] = conv(i, size, bf, bt, Perm_0);
-      Trits_1[i] = conv(i, size, bf, bt, Perm_1);
-   }
+#ifdef EVAL_MMAP
+   if (G_Weight_Map != nullptr) munmap(G_Weight_Map, G_Weight_Map_Size);
+#endif
+
+   G_Weight_Map = nullptr;
+   G_Weight_Map_Size = 0;
+
+   G_Weight_Memory.clear();
+   G_Weight_Memory.shrink_to_fit();
+
+   G_Weight = nullptr;
+}
+
+static Weight_Header weight_header() {
+
+   static_assert(sizeof(Weight_Header) == 64, "");
+
+   Weight_Header header {};
+   std::memcpy(header.magic, Weight_Magic, sizeof(Weight_Magic));
+   header.version = Weight_Version;
+   header.variant = uint32(var::Variant);
+   header.size = uint32(P * 2);
+   header.endian = Weight_Endian;
+
+   return header;
 }
 
 static int conv(int index, int size, int bf, int bt, const int perm[]) {
@@ -131,11 +277,8 @@ static int conv(int index, int size, int bf, int bt, const int perm[]) {
    return to;
 }
 
-Score eval(const Pos & pos) {
-
-   // features
+static void features(Score_2 & s2, const Pos & pos) {
 
-   Score_2 s2;
    int var = 0;
 
    // material
@@ -171,6 +314,30 @@ Score eval(const Pos & pos) {
 
    pattern(s2, var, pos);
    var += pow(3, Pattern_Size) * 4;
+}
+
+Eval_Components eval_components(const Pos & pos) {
+
+   Score_2 s2;
+   features(s2, pos);
+
+   return { ml::div_round(s2.mg(), Unit), ml::div_round(s2.eg(), Unit), pos::stage(pos), eval(s2, pos) };
+}
+
+Score eval(const Pos & pos) {
+
+   Score_2 s2;
+   features(s2, pos);
+
+   return eval(s2, pos);
+}
+
+static Score eval(const Score_2 & s2, const Pos & pos) {
+
+   int nwm = bit::count(pos.wm());
+   int nbm = bit::count(pos.bm());
+   int nwk = bit::count(pos.wk());
+   int nbk = bit::count(pos.bk());
 
    // game phase
 
@@ -288,6 +455,185 @@ static void pattern(Score_2 & s2, int var, const Pos & pos) {
    s2.add(var +  265720 - i7, -1);
 }
 
+void Eval_Cache::set_size(int64 size) {
+
+   assert(size >= 0 && size <= int64(1) << 30);
+
+   int64 entries = 0;
+
+   if (size != 0) {
+      entries = 1;
+      while (entries * 2 <= size) entries *= 2;
+   }
+
+   if (entries != this->size()) {
+      m_table.resize(entries);
+      m_table.shrink_to_fit();
+   }
+
+   m_mask = (entries != 0) ? int(entries - 1) : 0;
+
+   clear();
+}
+
+void Eval_Cache::clear() {
+
+   for (Entry & entry : m_table) {
+      entry = { 0, score::None };
+   }
+
+   m_hit = 0;
+   m_miss = 0;
+}
+
+bool Eval_Cache::probe(Key key, Score & sc) {
+
+   if (m_table.empty()) return false;
+
+   const Entry & entry = m_table[hash::index(key, m_mask)];
+
+   if (entry.lock == hash::lock(key) && entry.score != score::None) {
+      m_hit += 1;
+      sc = Score(entry.score);
+      return true;
+   }
+
+   m_miss += 1;
+   return false;
+}
+
+void Eval_Cache::store(Key key, Score sc) {
+
+   assert(score::is_ok(sc));
+
+   if (m_table.empty()) return;
+
+   Entry & entry = m_table[hash::index(key, m_mask)];
+   entry = { hash::lock(key), int32(sc) };
+}
+
+Batch_Evaluator::Batch_Evaluator(Batch_Eval batch_eval, int batch_max, double wait_max)
+   : m_batch_eval{std::move(batch_eval)}, m_batch_max{batch_max}, m_wait_max{wait_max} {
+
+   assert(batch_max >= 1);
+   assert(wait_max >= 0.0);
+}
+
+void Batch_Evaluator::attach(int threads) {
+   std::lock_guard<std::mutex> lock(m_mutex);
+   m_threads += threads;
+}
+
+void Batch_Evaluator::detach(int threads) {
+
+   std::lock_guard<std::mutex> lock(m_mutex);
+   m_threads -= threads;
+   assert(m_threads >= 0);
+
+   m_cond.notify_all(); // the remaining threads might all be waiting
+}
+
+Score Batch_Evaluator::eval(const Pos & pos) {
+
+   Score sc = score::None;
+   bool done = false;
+
+   std::unique_lock<std::mutex> lock(m_mutex);
+
+   if (m_queue.empty()) m_deadline = std::chrono::steady_clock::now() + std::chrono::duration_cast<std::chrono::steady_clock::duration>(m_wait_max);
+   m_queue.push_back({ pos, &sc, &done });
+
+   while (!done) {
+
+      if (is_ready()) {
+         flush(lock); // maybe not our batch, any waiting thread can do it
+      } else if (m_queue.empty()) {
+         m_cond.wait(lock); // our batch is being evaluated by another thread
+      } else {
+         m_cond.wait_until(lock, m_deadline);
+      }
+   }
+
+   assert(score::is_eval(sc));
+   return sc;
+}
+
+bool Batch_Evaluator::is_ready() const {
+
+   int size = int(m_queue.size());
+
+   return size != 0
+       && (size >= m_batch_max
+        || size >= m_threads // every search thread is waiting
+        || std::chrono::steady_clock::now() >= m_deadline);
+}
+
+void Batch_Evaluator::flush(std::unique_lock<std::mutex> & lock) {
+
+   std::vector<Request> batch;
+   batch.swap(m_queue);
+
+   lock.unlock(); // other threads can fill the next batch meanwhile
+
+   std::vector<Pos> positions;
+   for (const Request & request : batch) positions.push_back(request.pos);
+
+   std::vector<Score> scores(positions.size());
+   std::string error;
+
+   if (m_batch_eval) {
+
+      try {
+         m_batch_eval(positions, scores);
+         if (scores.size() != positions.size()) throw std::runtime_error("wrong number of scores");
+      } catch (const std::exception & e) {
+         error = e.what();
+      }
+   }
+
+   if (!m_batch_eval || !error.empty()) { // native fallback
+      scores.resize(positions.size());
+      for (int i = 0; i < int(positions.size()); i++) scores[i] = ::eval(positions[i]);
+   }
+
+   lock.lock();
+
+   for (int i = 0; i < int(batch.size()); i++) {
+      *batch[i].score = std::clamp(scores[i], -score::Eval_Inf, +score::Eval_Inf);
+      *batch[i].done = true;
+   }
+
+   m_positions += int64(batch.size());
+   m_batches += 1;
+
+   if (!error.empty()) {
+      m_fallbacks += int64(batch.size());
+      m_error = error;
+   }
+
+   m_cond.notify_all();
+}
+
+int64 Batch_Evaluator::positions() const {
+   std::lock_guard<std::mutex> lock(m_mutex);
+   return m_positions;
+}
+
+int64 Batch_Evaluator::batches() const {
+   std::lock_guard<std::mutex> lock(m_mutex);
+   return m_batches;
+}
+
+int64 Batch_Evaluator::fallbacks() const {
+   std::lock_guard<std::mutex> lock(m_mutex);
+   return m_fallbacks;
+}
+
+std::string Batch_Evaluator::error() const {
+   std::lock_guard<std::mutex> lock(m_mutex);
+   return m_error;
+}
+
 static void indices_column(uint64 white, uint64 black, int & index_top, int & index_bottom) {
 
    int w0, w2;
@@ -86,6 +86,43 @@ static void gen_quiets(List & list, const Pos & pos) {
    }
 }
 
+void gen_quiets_from(List & list, const Pos & pos, Square from) { // the quiet moves of one piece, in gen_quiets() order
+
+   list.clear();
+
+   Side atk = pos.turn();
+
+   if (bit::has(pos.man(atk), from)) {
+      add_man_moves(list, pos, bit::bit(from));
+   } else if (bit::has(pos.king(atk), from)) {
+      if (var::Variant == var::Frisian && pos.count(atk) >= 3 && from == pos.wolf(atk)) return;
+      add_king_moves(list, pos, from);
+   }
+}
+
+int count_quiets(const Pos & pos) { // size of the gen_quiets() list, without generating it
+
+   Side atk = pos.turn();
+
+   Bit be = pos.empty();
+   Bit bm = pos.man(atk);
+
+   int count = 0;
+
+   if (atk == White) {
+      count += bit::count(bm & (be << I1)) + bit::count(bm & (be << J1));
+   } else {
+      count += bit::count(bm & (be >> I1)) + bit::count(bm & (be >> J1));
+   }
+
+   for (Square from : pos.king(atk)) {
+      if (var::Variant == var::Frisian && pos.count(atk) >= 3 && from == pos.wolf(atk)) continue;
+      count += bit::count(bit::king_moves(from, be) & be);
+   }
+
+   return count;
+}
+
 static void add_man_moves(List & list, const Pos & pos, Bit froms) {
 
    Side atk = pos.turn();
@@ -1,6 +1,8 @@
 
 // includes
 
+#include <random>
+
 #include "scan/bit.hpp"
 #include "scan/common.hpp"
 #include "scan/hash.hpp"
@@ -18,9 +20,9 @@ const int Table_Mask {Table_Size - 1};
 
 // variables
 
-static Key Key_Turn;
-static Key Key_Piece[Side_Size][Piece_Size][64];
-static Key Key_Wolf[Side_Size][4][64];
+Key Key_Turn;
+Key Key_Piece[Side_Size][Piece_Size][64];
+Key Key_Wolf[Side_Size][4][64];
 
 static Key Key_Ranks_123[Table_Size];
 static Key Key_Ranks_456[Table_Size];
@@ -40,12 +42,14 @@ void init() {
 
    // hash keys
 
-   Key_Turn = Key(ml::rand_int_64());
+   std::mt19937_64 gen(Seed); // fixed seed: the keys do not depend on when init() is called
+
+   Key_Turn = Key(gen());
 
    for (int sd = 0; sd < Side_Size; sd++) {
       for (int pc = 0; pc < Piece_Size; pc++) {
          for (Square sq : bit::Squares) {
-            Key_Piece[sd][pc][sq] = Key(ml::rand_int_64());
+            Key_Piece[sd][pc][sq] = Key(gen());
          }
       }
    }
@@ -53,7 +57,7 @@ void init() {
    for (int sd = 0; sd < Side_Size; sd++) {
       for (int count = 1; count <= 3; count++) {
          for (Square sq : bit::Squares) {
-            Key_Wolf[sd][count][sq] = Key(ml::rand_int_64());
+            Key_Wolf[sd][count][sq] = Key(gen());
          }
       }
    }
@@ -86,7 +90,7 @@ static Key table_key(Piece pc, Side sd, int index, int offset) {
    return key;
 }
 
-Key key(const Pos & pos) {
+Key compute(const Pos & pos) {
 
    Key key {};
 
@@ -286,9 +286,12 @@ void hub_loop() {
       param_int ("book-ply", 0, 20);
       param_int ("book-margin", 0, 100);
       param_bool("ponder");
-      param_int ("threads", 1, 16);
-      param_int ("tt-size", 16, 30);
+      param_int ("threads", 1, 256);
+      param_enum("smp-mode", "split lazy");
+      param_int ("tt-size", 16, 34);
+      param_int ("tt-mb", 0, 1 << 20);
       param_int ("bb-size", 0, 7);
+      param_int ("eval-cache-size", 0, 24);
 
       hub::write("wait");
 
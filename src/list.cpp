@@ -85,6 +85,28 @@ void List::move_to_front(int i) {
    m_score[0] = sc;
 }
 
+void List::select(int i) { // moves the first highest-scored move of [i, size) to i; a stable sort, one move at a time
+
+   assert(i >= 0 && i < m_size);
+
+   int bi = i;
+
+   for (int j = i + 1; j < m_size; j++) {
+      if (m_score[j] > m_score[bi]) bi = j;
+   }
+
+   Move mv = m_move [bi];
+   int  sc = m_score[bi];
+
+   for (int j = bi; j > i; j--) {
+      m_move [j] = m_move [j - 1];
+      m_score[j] = m_score[j - 1];
+   }
+
+   m_move [i] = mv;
+   m_score[i] = sc;
+}
+
 void List::sort() {
 
    // init
@@ -10,6 +10,7 @@
 #include "scan/bit.hpp"
 #include "scan/common.hpp"
 #include "scan/gen.hpp"
+#include "scan/hash.hpp"
 #include "scan/libmy.hpp"
 #include "scan/move.hpp"
 #include "scan/pos.hpp"
@@ -28,6 +29,15 @@ Pos::Pos(Side turn, Bit wm, Bit bm, Bit wk, Bit bk)
 }
 
 Pos::Pos(Bit man, Bit king, Bit white, Bit black, Bit all, Side turn) {
+   set(man, king, white, black, all, turn);
+   update_key();
+}
+
+void Pos::update_key() {
+   m_key = hash::compute(*this);
+}
+
+void Pos::set(Bit man, Bit king, Bit white, Bit black, Bit all, Side turn) {
 
    assert((man ^ king) == all);
    assert((white ^ black) == all);
@@ -68,6 +78,8 @@ Pos Pos::succ(Move mv) const {
    auto side = m_side;
    Bit all = this->all();
 
+   Key key = m_key ^ hash::Key_Turn;
+
    Bit delta = bit::bit(from) ^ bit::bit(to);
 
    side[atk] ^= delta;
@@ -75,11 +87,18 @@ Pos Pos::succ(Move mv) const {
 
    if (is_piece(from, King)) { // king move
       piece[King] ^= delta;
+      key ^= hash::Key_Piece[atk][King][from] ^ hash::Key_Piece[atk][King][to];
    } else if (square_is_promotion(to, atk)) { // promotion
       bit::clear(piece[Man], from);
       bit::set(piece[King], to);
+      key ^= hash::Key_Piece[atk][Man][from] ^ hash::Key_Piece[atk][King][to];
    } else { // man move
       piece[Man] ^= delta;
+      key ^= hash::Key_Piece[atk][Man][from] ^ hash::Key_Piece[atk][Man][to];
+   }
+
+   for (Square sq : caps) {
+      key ^= hash::Key_Piece[def][is_piece(sq, King) ? King : Man][sq];
    }
 
    piece[Man]  &= ~caps;
@@ -87,7 +106,8 @@ Pos Pos::succ(Move mv) const {
    side[def]   &= ~caps;
    all         &= ~caps;
 
-   Pos pos(piece[Man], piece[King], side[White], side[Black], all, def);
+   Pos pos;
+   pos.set(piece[Man], piece[King], side[White], side[Black], all, def);
 
    if (var::Variant == var::Frisian) {
 
@@ -104,8 +124,16 @@ Pos Pos::succ(Move mv) const {
          pos.m_count[atk] += 1;
          assert(pos.m_count[atk] <= 3);
       }
+
+      for (int sd = 0; sd < Side_Size; sd++) {
+         if (m_count[sd] != 0) key ^= hash::Key_Wolf[sd][m_count[sd]][m_wolf[sd]];
+         if (pos.m_count[sd] != 0) key ^= hash::Key_Wolf[sd][pos.m_count[sd]][pos.m_wolf[sd]];
+      }
    }
 
+   pos.m_key = key;
+   assert(pos.m_key == hash::compute(pos)); // debug builds check the incremental update
+
    return pos;
 }
 
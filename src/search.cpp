@@ -5,9 +5,12 @@
 #include <cmath>
 #include <cstdio>
 #include <cstdlib>
+#include <exception>
 #include <iostream>
+#include <memory>
 #include <sstream>
 #include <string>
+#include <vector>
 
 #include "scan/bb_base.hpp"
 #include "scan/book.hpp"
@@ -73,15 +76,35 @@ public:
    Move sing_move {move::None};
    Score sing_score {score::None};
 
-   List list;
+   // staged move picker: the TT move of a quiet position is searched before the
+   // other moves are generated, the others are picked by history score
+
+   List list; // moves in search order up to i
    int i {0};
    int j {0};
 
+   Move tt_move {move::None};      // searched before generation
+   Move_Index tt_index {Move_Index_None};
+   bool gen {false};    // list has all the moves
+   bool sorted {false}; // list is in search order
+   bool single {false}; // only one legal move
+
    Move move {move::None};
    Score score {score::None};
    Line pv;
 
    const Node & node () const { assert(m_node != nullptr); return *m_node; }
+
+   Move next_move () {
+      assert(gen && i < list.size());
+      if (!sorted) list.select(i);
+      return list[i++];
+   }
+
+   void sort () { // copies of a list lose the scores
+      for (int k = i; k < list.size(); k++) list.select(k);
+      sorted = true;
+   }
 };
 
 class Search_Global;
@@ -142,6 +165,14 @@ private:
    int64 m_leaf;
    int64 m_ply_sum;
 
+   int64 m_tt_probe;
+   int64 m_tt_hit;
+   int64 m_bb_probe;
+
+   Score m_last_score; // Lazy SMP helpers
+
+   Eval_Cache m_eval_cache;
+
 public:
 
    void init (ID id, Search_Global & sg);
@@ -150,7 +181,7 @@ public:
    void start_iter ();
    void end_iter   (Search_Output & so);
 
-   void search_root_try (const Node & node, const List & list, Depth depth);
+   Score search_root_try (const Node & node, const List & list, Depth depth);
 
    void give_work (Split_Point * sp);
 
@@ -162,16 +193,18 @@ private:
    static void launch (Search_Local * sl, Split_Point * root_sp);
 
    void idle_loop (Split_Point * wait_sp);
+   void lazy_loop ();
 
    void join      (Split_Point * sp);
    void move_loop (Split_Point * sp);
 
-   void  search_asp  (const Node & node, const List & list, Depth depth, Ply ply, bool prune);
-   void  search_root (const Node & node, const List & list, Score alpha, Score beta, Depth depth, Ply ply, bool prune);
+   Score search_asp  (const Node & node, const List & list, Depth depth, Ply ply, bool prune);
+   Score search_root (const Node & node, const List & list, Score alpha, Score beta, Depth depth, Ply ply, bool prune);
    Score search      (const Node & node, Score alpha, Score beta, Depth depth, Ply ply, bool prune, Move skip_move, Line & pv);
    Score qs          (const Node & node, Score alpha, Score beta, Depth depth, Ply ply, Line & pv);
 
    void  move_loop   (Local & local);
+   void  gen_moves   (Local & local);
    Score search_move (Move mv, const Local & local, Line & pv);
 
    void split (Local & local);
@@ -181,6 +214,7 @@ private:
 
    void inc_node ();
 
+   Score evaluate  (const Pos & pos);
    Score end_score (const Pos & pos, Ply ply);
    Score leaf      (Score sc, Ply ply);
    void  mark_leaf (Ply ply);
@@ -196,6 +230,10 @@ private:
    Split_Point * top_sp () const;
 };
 
+struct SMP : public Lockable {
+   std::atomic<bool> busy {false};
+};
+
 class Search_Global : public Lockable {
 
 private:
@@ -203,12 +241,20 @@ private:
    const Search_Input * m_si;
    Search_Output * m_so;
 
+   TT * m_tt;
+   History m_hist;
+   Time m_time;
+
+   int m_threads;
+   var::SMP_Type m_smp_mode;
+   SMP m_smp; // lock to create and broadcast split points
+
    const Node * m_node;
    List m_list;
 
    int m_bb_size;
 
-   Search_Local m_sl[16];
+   std::vector<std::unique_ptr<Search_Local>> m_sl;
 
    Split_Point m_root_sp;
 
@@ -222,9 +268,19 @@ private:
 
    double m_factor;
 
+   int m_pv_index; // multi-PV line that is being searched
+   std::vector<PV_Entry> m_lines;
+   std::vector<PV_Entry> m_last_lines;
+
+   std::vector<Search_Output> m_reports; // best moves for the callback, protected by the SMP lock
+   std::atomic<bool> m_report;
+
+   Lockable m_notify; // the callback runs without search locks, one call at a time
+   std::exception_ptr m_error; // thrown by the callback
+
 public:
 
-   void init (const Search_Input & si, Search_Output & so, const Node & node, const List & list, int bb_size);
+   void init (const Search_Input & si, Search_Output & so, const Node & node, const List & list, int bb_size, TT & tt, int threads, var::SMP_Type smp_mode);
    void end  ();
 
    void search        (Depth depth);
@@ -232,6 +288,13 @@ public:
 
    void new_best_move (Move mv, Score sc, Flag flag, Depth depth, const Line & pv);
 
+   void report ();
+   bool notify (Search_Event event);
+
+   bool stop_requested () const { return m_si->stop != nullptr && m_si->stop->load(std::memory_order_relaxed); }
+
+   std::exception_ptr error () const { return m_error; }
+
    void poll  ();
    void abort ();
 
@@ -249,31 +312,62 @@ public:
    bool ponder () const { return m_ponder; }
 
    Move  last_move  () const { return m_last_move; }
-   Score last_score () const { return m_last_score; }
+   Score last_score () const;
+   Score line_score () const;
 
    double factor () const { return m_factor; }
 
    int bb_size () const { return m_bb_size; }
 
-   const Search_Local & sl (ID id) const { return m_sl[id]; }
-         Search_Local & sl (ID id)       { return m_sl[id]; }
+   TT & tt () const { return *m_tt; }
+
+   History & hist () { return m_hist; }
+
+   const Time & time () const { return m_time; }
+
+   int  threads () const { return m_threads; }
+   bool smp     () const { return m_threads > 1; }
+   bool split   () const { return smp() && m_smp_mode == var::SMP_Split; }
+   bool lazy    () const { return smp() && m_smp_mode == var::SMP_Lazy; }
+
+   SMP & smp_lock () { return m_smp; }
+
+   const Search_Local & sl (ID id) const { return *m_sl[id]; }
+         Search_Local & sl (ID id)       { return *m_sl[id]; }
+
+   const Node & node () const { return *m_node; }
 
    const Search_Input  & si () const { assert(m_si != nullptr); return *m_si; }
    const Search_Output & so () const { assert(m_so != nullptr); return *m_so; }
-};
 
-struct SMP : public Lockable {
-   std::atomic<bool> busy {false};
+private:
+
+   bool callback (Search_Event event, const Search_Output & so);
 };
 
 class Abort : public std::exception {};
 
-// variables
+class TT_Search { // registers a search with its table while it runs
+
+private:
+
+   TT & m_tt;
+   bool m_alone;
 
-static Time G_Time;
+public:
+
+   explicit TT_Search (TT & tt) : m_tt(tt) { m_alone = tt.add_search() == 0 && !tt.is_shared() && !tt.is_mapped(); }
+   ~TT_Search () { m_tt.remove_search(); }
+
+   TT_Search (const TT_Search & ts) = delete;
+   void operator = (const TT_Search & ts) = delete;
+
+   bool alone () const { return m_alone; } // no other search (or process or file) uses the table
+};
+
+// variables
 
-static SMP G_SMP; // lock to create and broadcast split points
-static Lockable G_IO;
+static Lockable G_IO; // the terminal is shared by all engines
 
 // prototypes
 
@@ -281,11 +375,14 @@ inline int depth_min () { return (var::Variant == var::Losing) ? 6 : 12; }
 
 static void gen_moves_bb (List & list, const Pos & pos);
 
+static Move find_move  (const Pos & pos, Move_Index index);
+static Move quiet_move (const Pos & pos, Move_Index index);
+
 static double lerp (double mg, double eg, double phase);
 
 static double time_lag (double time);
 
-static void local_update (Local & local, Move mv, Score sc, const Line & pv, Search_Global & sg);
+static void local_update (Local & local, Move mv, Score sc, const Line & pv, Search_Global * sg);
 
 static Flag flag (Score sc, Score alpha, Score beta);
 
@@ -293,16 +390,55 @@ static Flag flag (Score sc, Score alpha, Score beta);
 
 void search(Search_Output & so, const Node & node, const Search_Input & si) {
 
-   // init
-
    var::update();
 
+   Search_Engine engine(G_TT, var::Threads, var::SMP_Mode);
+   engine.search(so, node, si);
+}
+
+Move quick_move(const Pos & pos) {
+   Search_Engine engine(G_TT, var::Threads);
+   return engine.quick_move(pos);
+}
+
+Score quick_score(const Pos & pos) {
+   Search_Engine engine(G_TT, var::Threads);
+   return engine.quick_score(pos);
+}
+
+Search_Engine::Search_Engine(TT & tt, int threads, var::SMP_Type smp_mode) {
+   m_tt = &tt;
+   set_threads(threads);
+   m_smp_mode = smp_mode;
+}
+
+Search_Engine::Search_Engine(int64 tt_size, int threads, var::SMP_Type smp_mode) {
+
+   m_tt_own.reset(new TT);
+   m_tt_own->set_size(tt_size);
+
+   m_tt = m_tt_own.get();
+   set_threads(threads);
+   m_smp_mode = smp_mode;
+}
+
+void Search_Engine::set_threads(int threads) {
+   assert(threads >= 1);
+   m_threads = threads;
+}
+
+void Search_Engine::search(Search_Output & so, const Node & node, const Search_Input & si) {
+
+   // init
+
    so.init(si, node);
 
+   TT_Search tt_search(*m_tt);
+
    int bb_size = var::BB_Size;
 
    if (bb::pos_is_load(node)) { // root position already in bitbases => only use smaller bitbases in search
-      G_TT.clear();
+      if (tt_search.alone()) m_tt->clear(); // a table shared with other searches is left alone
       bb_size = pos::size(node) - 1;
    }
 
@@ -315,7 +451,7 @@ void search(Search_Output & so, const Node & node, const Search_Input & si) {
    if (si.move && !si.ponder && list.size() == 1) {
 
       Move mv = list[0];
-      Score sc = quick_score(node);
+      Score sc = this->quick_score(node);
 
       so.new_best_move(mv, sc);
       return;
@@ -339,10 +475,8 @@ void search(Search_Output & so, const Node & node, const Search_Input & si) {
 
    // more init
 
-   G_Time.init(si, node);
-
    Search_Global sg;
-   sg.init(si, so, node, list, bb_size); // also launches threads
+   sg.init(si, so, node, list, bb_size, *m_tt, m_threads.load(), m_smp_mode.load()); // also launches threads
 
    // iterative deepening
 
@@ -355,11 +489,13 @@ void search(Search_Output & so, const Node & node, const Search_Input & si) {
          sg.search(depth);
          sg.collect_stats();
 
+         if (sg.notify(Event_Iteration)) break;
+
          // early exit?
 
          bool abort = false;
 
-         if (si.smart && so.time() >= G_Time.time_0() * sg.factor() * lerp(0.4, 0.8, pos::phase(node))) {
+         if (si.smart && so.time() >= sg.time().time_0() * sg.factor() * lerp(0.4, 0.8, pos::phase(node))) {
             abort = true;
          }
 
@@ -377,9 +513,13 @@ void search(Search_Output & so, const Node & node, const Search_Input & si) {
 
    sg.end(); // sync with threads
    so.end();
+
+   if (sg.error()) std::rethrow_exception(sg.error());
+
+   if (so.multipv.empty() && so.move != move::None) so.multipv.push_back(so.line()); // interrupted first iteration
 }
 
-Move quick_move(const Pos & pos) {
+Move Search_Engine::quick_move(const Pos & pos) {
 
    // init
 
@@ -409,7 +549,7 @@ Move quick_move(const Pos & pos) {
    Flag tt_flag;
    Depth tt_depth;
 
-   G_TT.probe(hash::key(pos), tt_move, tt_score, tt_flag, tt_depth); // updates tt_move
+   m_tt->probe(hash::key(pos), tt_move, tt_score, tt_flag, tt_depth); // updates tt_move
 
    if (tt_move != Move_Index_None) {
       Move mv = list::find_index(list, tt_move, pos);
@@ -419,7 +559,7 @@ Move quick_move(const Pos & pos) {
    return move::None;
 }
 
-Score quick_score(const Pos & pos) {
+Score Search_Engine::quick_score(const Pos & pos) {
 
    // book
 
@@ -439,7 +579,7 @@ Score quick_score(const Pos & pos) {
    Flag tt_flag;
    Depth tt_depth;
 
-   if (G_TT.probe(hash::key(pos), tt_move, tt_score, tt_flag, tt_depth)) {
+   if (m_tt->probe(hash::key(pos), tt_move, tt_score, tt_flag, tt_depth)) {
       return score::from_tt(tt_score, Ply_Root);
    }
 
@@ -469,6 +609,28 @@ static void gen_moves_bb(List & list, const Pos & pos) {
    }
 }
 
+static Move find_move(const Pos & pos, Move_Index index) { // legal move with this index or None
+
+   if (!pos::is_capture(pos)) return quiet_move(pos, index);
+
+   List list;
+   gen_captures(list, pos);
+
+   return list::find_index(list, index, pos);
+}
+
+static Move quiet_move(const Pos & pos, Move_Index index) { // only generates the moves of one piece
+
+   assert(!pos::is_capture(pos));
+
+   if (index == Move_Index_None) return move::None;
+
+   List list;
+   gen_quiets_from(list, pos, Square(index >> 6));
+
+   return list::find_index(list, index, pos);
+}
+
 static double lerp(double mg, double eg, double phase) {
    assert(phase >= 0.0 && phase <= 1.0);
    return mg + (eg - mg) * phase;
@@ -482,6 +644,9 @@ void Search_Input::init() {
    nodes = 1E12;
    input = false;
    output = Output_None;
+   multipv = 1;
+   callback = nullptr;
+   stop = nullptr;
 
    smart = false;
    moves = 0;
@@ -515,6 +680,15 @@ void Search_Output::init(const Search_Input & si, const Pos & pos) {
    node = 0;
    leaf = 0;
    ply_sum = 0;
+
+   tt_probe = 0;
+   tt_hit = 0;
+   bb_probe = 0;
+
+   eval_probe = 0;
+   eval_hit = 0;
+
+   multipv.clear();
 }
 
 void Search_Output::end() {
@@ -527,6 +701,7 @@ void Search_Output::new_best_move(Move mv, Score sc) {
    pv.set(mv);
 
    new_best_move(mv, sc, Flag::Exact, Depth(0), pv);
+   multipv.assign(1, line());
 
    if (m_si->output == Output_Terminal) std::cout << std::endl;
 }
@@ -542,7 +717,7 @@ void Search_Output::new_best_move(Move mv, Score sc, Flag flag, Depth depth, con
    this->depth = depth;
    this->pv = pv;
 
-   if (var::SMP) G_IO.lock();
+   G_IO.lock();
 
    double time = this->time();
    double speed = (time < 0.01) ? 0.0 : double(node) / time;
@@ -576,7 +751,20 @@ void Search_Output::new_best_move(Move mv, Score sc, Flag flag, Depth depth, con
       }
    }
 
-   if (var::SMP) G_IO.unlock();
+   G_IO.unlock();
+}
+
+PV_Entry Search_Output::line() const {
+
+   PV_Entry line;
+
+   line.move = move;
+   line.score = score;
+   line.flag = flag;
+   line.depth = depth;
+   line.pv = pv;
+
+   return line;
 }
 
 double Search_Output::ply_avg() const {
@@ -587,6 +775,11 @@ double Search_Output::time() const {
    return m_timer.elapsed();
 }
 
+double Search_Output::nps() const {
+   double time = this->time();
+   return (time < 0.01) ? 0.0 : double(node) / time;
+}
+
 void Time::init(const Search_Input & si, const Pos & pos) {
 
    if (si.smart) {
@@ -629,11 +822,18 @@ static double time_lag(double time) {
    return std::max(time - 0.1, 0.0);
 }
 
-void Search_Global::init(const Search_Input & si, Search_Output & so, const Node & node, const List & list, int bb_size) {
+void Search_Global::init(const Search_Input & si, Search_Output & so, const Node & node, const List & list, int bb_size, TT & tt, int threads, var::SMP_Type smp_mode) {
 
    m_si = &si;
    m_so = &so;
 
+   m_tt = &tt;
+   m_time.init(si, node);
+
+   assert(threads >= 1);
+   m_threads = threads;
+   m_smp_mode = smp_mode;
+
    m_node = &node;
    m_list = list;
 
@@ -647,19 +847,35 @@ void Search_Global::init(const Search_Input & si, Search_Output & so, const Node
 
    m_factor = 1.0;
 
+   m_pv_index = 0;
+   m_lines.assign(1, PV_Entry());
+   m_last_lines.clear();
+
+   m_reports.clear();
+   m_report = false;
+   m_error = nullptr;
+
    // new search
 
    m_bb_size = bb_size;
 
-   G_SMP.busy = false;
+   m_tt->inc_date();
+   m_hist.clear();
+
+   m_smp.busy = false;
    m_root_sp.init_root();
 
-   for (int id = 0; id < var::Threads; id++) {
-      sl(ID(id)).init(ID(id), *this); // also launches a thread if id /= 0
+   m_sl.clear();
+
+   for (int id = 0; id < m_threads; id++) {
+      m_sl.emplace_back(new Search_Local);
    }
 
-   G_TT.inc_date();
-   sort_clear();
+   if (si.evaluator != nullptr) si.evaluator->attach(m_threads);
+
+   for (int id = 0; id < m_threads; id++) {
+      sl(ID(id)).init(ID(id), *this); // also launches a thread if id /= 0
+   }
 }
 
 void Search_Global::collect_stats() {
@@ -668,7 +884,14 @@ void Search_Global::collect_stats() {
    m_so->leaf = 0;
    m_so->ply_sum = 0;
 
-   for (int id = 0; id < var::Threads; id++) {
+   m_so->tt_probe = 0;
+   m_so->tt_hit = 0;
+   m_so->bb_probe = 0;
+
+   m_so->eval_probe = 0;
+   m_so->eval_hit = 0;
+
+   for (int id = 0; id < m_threads; id++) {
       sl(ID(id)).end_iter(*m_so);
    }
 }
@@ -680,20 +903,61 @@ void Search_Global::end() {
    m_root_sp.leave();
    assert(m_root_sp.free());
 
-   for (int id = 0; id < var::Threads; id++) {
+   for (int id = 0; id < m_threads; id++) {
       sl(ID(id)).end();
    }
+
+   if (m_si->evaluator != nullptr) m_si->evaluator->detach(m_threads);
 }
 
 void Search_Global::search(Depth depth) {
 
    m_depth = depth;
 
-   for (int id = 0; id < var::Threads; id++) {
+   for (int id = 0; id < m_threads; id++) {
       sl(ID(id)).start_iter();
    }
 
-   sl(ID_Main).search_root_try(*m_node, m_list, depth);
+   // multi-PV: line k is the best line without the moves of lines 0 .. k-1
+
+   int lines = std::max(std::min(m_si->multipv, m_list.size()), 1);
+   m_lines.assign(lines, PV_Entry());
+
+   for (m_pv_index = 0; m_pv_index < lines; m_pv_index++) {
+
+      if (m_pv_index == 0) {
+         sl(ID_Main).search_root_try(*m_node, m_list, depth);
+         continue;
+      }
+
+      List list;
+
+      for (Move mv : m_list) {
+         bool found = false;
+         for (int k = 0; k < m_pv_index; k++) {
+            if (m_lines[k].move == mv) found = true;
+         }
+         if (!found) list.add(mv);
+      }
+
+      sl(ID_Main).search_root_try(*m_node, list, depth);
+   }
+
+   m_pv_index = 0;
+
+   if (lines > 1) { // search the lines in the same order in the next iteration
+
+      if (smp()) lock();
+
+      for (int k = lines - 1; k >= 0; k--) {
+         m_list.move_to_front(list::find(m_list, m_lines[k].move));
+      }
+
+      if (smp()) unlock();
+   }
+
+   m_last_lines = m_lines;
+   m_so->multipv = m_lines;
 
    // time management
 
@@ -710,13 +974,31 @@ void Search_Global::search(Depth depth) {
 
 void Search_Global::new_best_move(Move mv, Score sc, Flag flag, Depth depth, const Line & pv) {
 
-   if (var::SMP) lock();
+   if (smp()) lock();
+
+   PV_Entry & line = m_lines[m_pv_index];
+
+   line.move = mv;
+   line.score = sc;
+   line.flag = flag;
+   line.depth = depth;
+   line.pv = pv;
+
+   if (m_pv_index != 0) { // secondary multi-PV line
+      if (smp()) unlock();
+      return;
+   }
 
    Move bm = m_so->move;
 
    collect_stats(); // update search info
    m_so->new_best_move(mv, sc, flag, depth, pv);
 
+   if (m_si->callback) { // reported by the caller once it holds no lock, see report()
+      m_reports.push_back(*m_so);
+      m_report = true;
+   }
+
    int i = list::find(m_list, mv);
    m_list.move_to_front(i);
 
@@ -730,7 +1012,66 @@ void Search_Global::new_best_move(Move mv, Score sc, Flag flag, Depth depth, con
       }
    }
 
-   if (var::SMP) unlock();
+   if (smp()) unlock();
+}
+
+void Search_Global::report() { // calls the callback for the new best moves, the caller must not hold a search lock
+
+   if (!m_report) return;
+
+   m_notify.lock(); // keeps the reports in order
+
+   while (true) {
+
+      std::vector<Search_Output> reports;
+
+      if (smp()) lock();
+      reports.swap(m_reports);
+      m_report = false;
+      if (smp()) unlock();
+
+      if (reports.empty()) break;
+
+      for (const Search_Output & so : reports) {
+         if (callback(Event_Best_Move, so)) abort();
+      }
+   }
+
+   m_notify.unlock();
+}
+
+bool Search_Global::notify(Search_Event event) { // returns true to stop the search
+
+   report(); // best moves first
+
+   m_notify.lock();
+   bool stop = callback(event, *m_so);
+   m_notify.unlock();
+
+   return stop;
+}
+
+bool Search_Global::callback(Search_Event event, const Search_Output & so) { // m_notify is locked
+
+   if (!m_si->callback || m_error) return false;
+
+   try {
+      return m_si->callback(event, so);
+   } catch (...) {
+      m_error = std::current_exception();
+      return true;
+   }
+}
+
+Score Search_Global::last_score() const {
+
+   if (m_pv_index == 0) return m_last_score;
+
+   return (m_pv_index < int(m_last_lines.size())) ? m_last_lines[m_pv_index].score : score::None;
+}
+
+Score Search_Global::line_score() const { // score reported by the current root search
+   return (m_pv_index == 0) ? m_so->score : m_lines[m_pv_index].score;
 }
 
 void Search_Global::poll() {
@@ -739,7 +1080,7 @@ void Search_Global::poll() {
 
    // input event?
 
-   if (var::SMP) G_IO.lock();
+   if (m_si->input) G_IO.lock();
 
    if (m_si->input && has_input()) {
 
@@ -764,7 +1105,7 @@ void Search_Global::poll() {
       }
    }
 
-   if (var::SMP) G_IO.unlock();
+   if (m_si->input) G_IO.unlock();
 
    // time limit?
 
@@ -772,11 +1113,11 @@ void Search_Global::poll() {
 
    if (m_depth <= depth_min()) {
       // no-op
-   } else if (time >= G_Time.time_1()) {
+   } else if (time >= m_time.time_1()) {
       abort = true;
    } else if (m_si->smart) {
       // no-op
-   } else if (time >= G_Time.time_0() * factor()) {
+   } else if (time >= m_time.time_0() * factor()) {
       abort = true;
    }
 
@@ -792,9 +1133,9 @@ void Search_Global::abort() {
 
 bool Search_Global::has_worker() const {
 
-   if (G_SMP.busy) return false;
+   if (m_smp.busy) return false;
 
-   for (int id = 0; id < var::Threads; id++) {
+   for (int id = 0; id < m_threads; id++) {
       if (sl(ID(id)).idle()) return true;
    }
 
@@ -803,7 +1144,7 @@ bool Search_Global::has_worker() const {
 
 void Search_Global::broadcast(Split_Point * sp) {
 
-   for (int id = 0; id < var::Threads; id++) {
+   for (int id = 0; id < m_threads; id++) {
       sl(ID(id)).give_work(sp);
    }
 }
@@ -822,15 +1163,28 @@ void Search_Local::init(ID id, Search_Global & sg) {
    m_leaf = 0;
    m_ply_sum = 0;
 
-   if (var::SMP && m_id != ID_Main) m_thread = std::thread(launch, this, sg.root_sp());
+   m_tt_probe = 0;
+   m_tt_hit = 0;
+   m_bb_probe = 0;
+
+   m_last_score = score::None;
+
+   m_eval_cache.set_size(var::Eval_Cache_Size); // also clears it, weights might have changed
+
+   if (sg.smp() && m_id != ID_Main) m_thread = std::thread(launch, this, sg.root_sp());
 }
 
 void Search_Local::launch(Search_Local * sl, Split_Point * root_sp) {
-   sl->idle_loop(root_sp);
+
+   if (sl->m_sg->lazy()) {
+      sl->lazy_loop();
+   } else {
+      sl->idle_loop(root_sp);
+   }
 }
 
 void Search_Local::end() {
-   if (var::SMP && m_id != ID_Main) m_thread.join();
+   if (m_sg->smp() && m_id != ID_Main) m_thread.join();
 }
 
 void Search_Local::start_iter() {
@@ -841,10 +1195,17 @@ void Search_Local::start_iter() {
 
 void Search_Local::end_iter(Search_Output & so) {
 
-   if (var::SMP || m_id == ID_Main) {
+   if (m_sg->smp() || m_id == ID_Main) {
       so.node += m_node;
       so.leaf += m_leaf;
       so.ply_sum += m_ply_sum;
+
+      so.tt_probe += m_tt_probe;
+      so.tt_hit += m_tt_hit;
+      so.bb_probe += m_bb_probe;
+
+      so.eval_probe += m_eval_cache.hit() + m_eval_cache.miss();
+      so.eval_hit += m_eval_cache.hit();
    }
 }
 
@@ -883,6 +1244,34 @@ void Search_Local::give_work(Split_Point * sp) {
    }
 }
 
+void Search_Local::lazy_loop() {
+
+   // helper threads run their own iterative deepening on the shared TT, skipping some depths
+   // (as in Stockfish) and starting from a different root move to diversify the trees
+
+   static const int Skip_Size  [] { 1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3, 4, 4, 4, 4, 4, 4, 4, 4 };
+   static const int Skip_Phase [] { 0, 1, 0, 1, 2, 3, 0, 1, 2, 3, 4, 5, 0, 1, 2, 3, 4, 5, 6, 7 };
+
+   int i = (m_id - 1) % 20;
+
+   for (int d = 1; d <= m_sg->si().depth; d++) {
+
+      if (((d + Skip_Phase[i]) / Skip_Size[i]) % 2 != 0) continue;
+
+      m_sg->lock();
+      List list = m_sg->list();
+      m_sg->unlock();
+
+      list.move_to_front(m_id % list.size());
+
+      try {
+         m_last_score = search_root_try(m_sg->node(), list, Depth(d));
+      } catch (const Abort &) {
+         break;
+      }
+   }
+}
+
 bool Search_Local::idle(Split_Point * parent) const {
 
    lock();
@@ -896,7 +1285,7 @@ bool Search_Local::idle() const {
    return m_work.load() == nullptr;
 }
 
-void Search_Local::search_root_try(const Node & node, const List & list, Depth depth) {
+Score Search_Local::search_root_try(const Node & node, const List & list, Depth depth) {
 
    assert(list.size() != 0);
    assert(depth > 0 && depth <= Depth_Max);
@@ -904,8 +1293,10 @@ void Search_Local::search_root_try(const Node & node, const List & list, Depth d
    assert(m_stack.empty());
    push_sp(m_sg->root_sp());
 
+   Score sc;
+
    try {
-      search_asp(node, list, depth, Ply_Root, true);
+      sc = search_asp(node, list, depth, Ply_Root, true);
    } catch (const Abort &) {
       pop_sp(m_sg->root_sp());
       assert(m_stack.empty());
@@ -914,6 +1305,8 @@ void Search_Local::search_root_try(const Node & node, const List & list, Depth d
 
    pop_sp(m_sg->root_sp());
    assert(m_stack.empty());
+
+   return sc;
 }
 
 void Search_Local::join(Split_Point * sp) {
@@ -950,13 +1343,13 @@ void Search_Local::move_loop(Split_Point * sp) {
    }
 }
 
-void Search_Local::search_asp(const Node & node, const List & list, Depth depth, Ply ply, bool prune) {
+Score Search_Local::search_asp(const Node & node, const List & list, Depth depth, Ply ply, bool prune) {
 
    assert(list.size() != 0);
    assert(depth > 0 && depth <= Depth_Max);
    assert(ply == Ply_Root);
 
-   Score last_score = m_sg->last_score();
+   Score last_score = (m_id == ID_Main) ? m_sg->last_score() : m_last_score;
 
    // window loop
 
@@ -973,8 +1366,8 @@ void Search_Local::search_asp(const Node & node, const List & list, Depth depth,
          Score beta  = last_score + Score(beta_margin);
          assert(-score::Eval_Inf <= alpha && alpha < beta && beta <= +score::Eval_Inf);
 
-         search_root(node, list, alpha, beta, depth, ply, prune);
-         Score sc = m_sg->so().score;
+         Score sc = search_root(node, list, alpha, beta, depth, ply, prune);
+         if (m_id == ID_Main) sc = m_sg->line_score(); // reported score
 
          if (!score::is_eval(sc)) {
             break;
@@ -984,15 +1377,15 @@ void Search_Local::search_asp(const Node & node, const List & list, Depth depth,
             beta_margin *= 2;
          } else {
             assert(sc > alpha && sc < beta);
-            return;
+            return sc;
          }
       }
    }
 
-   search_root(node, list, -score::Inf, +score::Inf, depth, ply, prune);
+   return search_root(node, list, -score::Inf, +score::Inf, depth, ply, prune);
 }
 
-void Search_Local::search_root(const Node & node, const List & list, Score alpha, Score beta, Depth depth, Ply ply, bool prune) {
+Score Search_Local::search_root(const Node & node, const List & list, Score alpha, Score beta, Depth depth, Ply ply, bool prune) {
 
    assert(list.size() != 0);
    assert(-score::Inf <= alpha && alpha < beta && beta <= +score::Inf);
@@ -1021,8 +1414,13 @@ void Search_Local::search_root(const Node & node, const List & list, Score alpha
    // move loop
 
    local.list = list;
+   local.gen = true;
+   local.sorted = true; // by the previous iterations
+   local.single = list.size() == 1;
 
    move_loop(local);
+
+   return local.score;
 }
 
 Score Search_Local::search(const Node & node, Score alpha, Score beta, Depth depth, Ply ply, bool prune, Move skip_move, Line & pv) {
@@ -1075,7 +1473,11 @@ Score Search_Local::search(const Node & node, Score alpha, Score beta, Depth dep
       Flag tt_flag;
       Depth tt_depth;
 
-      if (G_TT.probe(key, tt_move, tt_score, tt_flag, tt_depth)) {
+      m_tt_probe += 1;
+
+      if (m_sg->tt().probe(key, tt_move, tt_score, tt_flag, tt_depth)) {
+
+         m_tt_hit += 1;
 
          tt_score = score::from_tt(tt_score, local.ply);
 
@@ -1096,8 +1498,7 @@ Score Search_Local::search(const Node & node, Score alpha, Score beta, Depth dep
          }
 
          if (tt_depth >= local.depth - 4 && is_lower(tt_flag) && score::is_eval(tt_score)) {
-            gen_moves(local.list, node); // HACK ###
-            local.sing_move  = list::find_index(local.list, tt_move, node);
+            local.sing_move  = find_move(node, tt_move);
             local.sing_score = tt_score;
          }
       }
@@ -1122,17 +1523,15 @@ Score Search_Local::search(const Node & node, Score alpha, Score beta, Depth dep
       }
    }
 
-   // gen moves
-
-   gen_moves(local.list, node);
+   // gen moves (lazily, see move_loop())
 
-   if (local.list.size() == 0) return end_score(node, local.ply); // no legal moves => end
+   if (!can_move(node, static_cast<const Pos &>(node).turn())) return end_score(node, local.ply); // no legal moves => end
 
    if (score::loss(local.ply + Ply(2)) >= local.beta) { // loss-distance pruning
       return leaf(score::loss(local.ply + Ply(2)), local.ply);
    }
 
-   if (local.ply >= Ply_Max) return leaf(eval(node), local.ply);
+   if (local.ply >= Ply_Max) return leaf(evaluate(node), local.ply);
 
    // pruning
 
@@ -1161,7 +1560,14 @@ Score Search_Local::search(const Node & node, Score alpha, Score beta, Depth dep
 
    // move loop
 
-   sort_moves(local.list, node, tt_move);
+   local.tt_index = tt_move;
+
+   if (!pos::is_capture(node)) {
+      local.tt_move = quiet_move(node, tt_move);
+      local.single = count_quiets(node) == 1;
+   }
+
+   if (local.tt_move == move::None) gen_moves(local);
    move_loop(local);
 
 cont : // epilogue
@@ -1176,24 +1582,24 @@ cont : // epilogue
       Flag tt_flag = flag(local.score, local.alpha, local.beta);
       Depth tt_depth = local.depth;
 
-      G_TT.store(key, tt_move, tt_score, tt_flag, tt_depth);
+      m_sg->tt().store(key, tt_move, tt_score, tt_flag, tt_depth);
    }
 
    // move-ordering statistics
 
    if (local.score > local.alpha
     && local.move != move::None
-    && local.list.size() > 1
+    && !local.single
     && local.skip_move == move::None
     ) {
 
-      good_move(local.move, node);
+      m_sg->hist().good_move(local.move, node);
 
       assert(list::has(local.list, local.move));
 
-      for (Move mv : local.list) {
+      for (Move mv : local.list) { // searched moves come first
          if (mv == local.move) break;
-         bad_move(mv, node);
+         m_sg->hist().bad_move(mv, node);
       }
    }
 
@@ -1206,37 +1612,80 @@ void Search_Local::move_loop(Local & local) {
    local.i = 0;
    local.j = 0;
 
+   // TT move, the other moves are only generated if it does not cut off
+
+   if (!local.gen) {
+
+      assert(local.tt_move != move::None);
+
+      local.list.clear();
+      local.list.add(local.tt_move);
+      local.i = 1;
+
+      if (local.tt_move != local.skip_move) {
+
+         Line pv;
+         Score sc = search_move(local.tt_move, local, pv);
+
+         local_update(local, local.tt_move, sc, pv, (m_id == ID_Main) ? m_sg : nullptr);
+         m_sg->report();
+      }
+
+      if (local.score >= local.beta) return;
+
+      gen_moves(local);
+   }
+
    while (local.score < local.beta && local.i < local.list.size()) {
 
       int searched_size = local.j;
 
       // SMP
 
-      if (var::SMP
+      if (m_sg->split()
        && local.depth >= 6
        && searched_size != 0
        && local.list.size() - searched_size >= 5
        && m_sg->has_worker()
        && m_pool_size < Pool_Size
        ) {
+         local.sort();
          split(local);
          return;
       }
 
       // search move
 
-      Move mv = local.list[local.i++];
+      Move mv = local.next_move();
 
       if (mv != local.skip_move) {
 
          Line pv;
          Score sc = search_move(mv, local, pv);
 
-         local_update(local, mv, sc, pv, *m_sg);
+         local_update(local, mv, sc, pv, (m_id == ID_Main) ? m_sg : nullptr); // Lazy SMP helpers do not report
+         m_sg->report();
       }
    }
 }
 
+void Search_Local::gen_moves(Local & local) {
+
+   const Node & node = local.node();
+
+   ::gen_moves(local.list, node);
+   assert(local.list.size() != 0);
+
+   if (local.tt_move != move::None) { // already searched
+      local.list.move_to_front(list::find(local.list, local.tt_move));
+   }
+
+   m_sg->hist().score_moves(local.list, node, local.tt_index);
+
+   local.gen = true;
+   local.single = local.list.size() == 1;
+}
+
 Score Search_Local::search_move(Move mv, const Local & local, Line & pv) {
 
    // init
@@ -1278,6 +1727,7 @@ Score Search_Local::search_move(Move mv, const Local & local, Line & pv) {
    inc_node();
 
    Node new_node = local.node().succ(mv);
+   m_sg->tt().prefetch(hash::key(new_node)); // the child probes this cluster first
 
    if ((local.pv_node && searched_size != 0) || red != 0) {
 
@@ -1312,7 +1762,7 @@ Score Search_Local::qs(const Node & node, Score alpha, Score beta, Depth depth,
       return leaf(score::loss(ply + Ply(2)), ply);
    }
 
-   if (ply >= Ply_Max) return leaf(eval(node), ply);
+   if (ply >= Ply_Max) return leaf(evaluate(node), ply);
 
    // move-loop init
 
@@ -1326,6 +1776,7 @@ Score Search_Local::qs(const Node & node, Score alpha, Score beta, Depth depth,
       // bitbases
 
       if (bb::pos_is_search(node, m_sg->bb_size())) {
+         m_bb_probe += 1;
          return leaf(bb_probe(node, ply), ply);
       }
 
@@ -1337,7 +1788,7 @@ Score Search_Local::qs(const Node & node, Score alpha, Score beta, Depth depth,
 
       // stand pat
 
-      bs = eval(node);
+      bs = evaluate(node);
       if (bs >= beta) return leaf(bs, ply);
 
       list.clear();
@@ -1374,10 +1825,12 @@ void Search_Local::split(Local & local) {
    m_sg->poll();
    poll();
 
-   G_SMP.lock(); // useful?
+   SMP & smp = m_sg->smp_lock();
+
+   smp.lock(); // useful?
 
-   assert(!G_SMP.busy);
-   G_SMP.busy = true;
+   assert(!smp.busy);
+   smp.busy = true;
 
    assert(m_pool_size < Pool_Size);
    Split_Point * sp = &m_pool[m_pool_size++];
@@ -1385,10 +1838,10 @@ void Search_Local::split(Local & local) {
 
    m_sg->broadcast(sp);
 
-   assert(G_SMP.busy);
-   G_SMP.busy = false;
+   assert(smp.busy);
+   smp.busy = false;
 
-   G_SMP.unlock();
+   smp.unlock();
 
    join(sp);
    idle_loop(sp);
@@ -1408,7 +1861,7 @@ Depth Search_Local::extend(Move mv, const Local & local) {
 
    const Node & node = local.node();
 
-   if (local.list.size() == 1) ext += 1;
+   if (local.single) ext += 1;
 
    if (var::Variant == var::Losing) {
 
@@ -1448,6 +1901,21 @@ void Search_Local::inc_node() {
    if ((m_node & ml::bit_mask( 4)) == 0) poll();
 }
 
+Score Search_Local::evaluate(const Pos & pos) {
+
+   Key key = hash::key(pos);
+
+   Score sc;
+   if (m_eval_cache.probe(key, sc)) return sc;
+
+   Evaluator * evaluator = m_sg->si().evaluator;
+   sc = (evaluator != nullptr) ? evaluator->eval(pos) : eval(pos);
+
+   m_eval_cache.store(key, sc);
+
+   return sc;
+}
+
 Score Search_Local::end_score(const Pos & pos, Ply ply) { // pos for debug
    assert(pos::is_end(pos));
    Score sc = (var::Variant == var::Losing) ? score::win(ply) : score::loss(ply);
@@ -1476,6 +1944,7 @@ Score Search_Local::bb_probe(const Pos & pos, Ply ply) {
 }
 
 void Search_Local::poll() {
+   if (m_sg->stop_requested()) m_sg->abort(); // external stop
    if (stop()) throw Abort();
 }
 
@@ -1555,7 +2024,7 @@ Move Split_Point::get_move(Local & local) {
 
    if (m_local.score < m_local.beta && m_local.i < m_local.list.size()) {
 
-      mv = m_local.list[m_local.i++];
+      mv = m_local.next_move();
 
       local.score = m_local.score;
       local.j = m_local.j;
@@ -1571,14 +2040,16 @@ void Split_Point::update(Move mv, Score sc, const Line & pv) {
    lock();
 
    if (m_local.score < m_local.beta) { // ignore superfluous moves after a fail high
-      local_update(m_local, mv, sc, pv, *m_sg);
+      local_update(m_local, mv, sc, pv, m_sg);
       if (m_local.score >= m_local.beta) m_stop = true;
    }
 
    unlock();
+
+   m_sg->report(); // a new root best move, outside of the lock
 }
 
-static void local_update(Local & local, Move mv, Score sc, const Line & pv, Search_Global & sg) {
+static void local_update(Local & local, Move mv, Score sc, const Line & pv, Search_Global * sg) {
 
    assert(score::is_ok(sc));
 
@@ -1591,8 +2062,8 @@ static void local_update(Local & local, Move mv, Score sc, const Line & pv, Sear
       local.score = sc;
       local.pv.concat(mv, pv);
 
-      if (local.ply == Ply_Root && (local.j == 1 || sc > local.alpha)) {
-         sg.new_best_move(local.move, local.score, flag(local.score, local.alpha, local.beta), local.depth, local.pv);
+      if (local.ply == Ply_Root && sg != nullptr && (local.j == 1 || sc > local.alpha)) {
+         sg->new_best_move(local.move, local.score, flag(local.score, local.alpha, local.beta), local.depth, local.pv);
       }
    }
 
@@ -291,7 +291,14 @@ void init_low() {
   if (var::BB) bb::init();
 
   eval_init();
-  G_TT.set_size(var::TT_Size);
+  if (var::TT_Shared.empty())
+  {
+    G_TT.set_size(var::TT_Size);
+  }
+  else
+  {
+    G_TT.open_shared(var::TT_Shared, var::TT_Size);
+  }
 }
 
 void run_terminal_game()
@@ -2,44 +2,421 @@
 // includes
 
 #include <algorithm>
+#include <atomic>
+#include <cerrno>
+#include <chrono>
 #include <cmath>
+#include <cstring>
+#include <fstream>
+#include <stdexcept>
+#include <string>
+#include <thread>
+
+#if defined(__unix__) || defined(__APPLE__)
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#define TT_MMAP
+#endif
 
 #include "scan/common.hpp"
 #include "scan/hash.hpp"
 #include "scan/libmy.hpp"
 #include "scan/score.hpp"
 #include "scan/tt.hpp"
+#include "scan/var.hpp"
 
 // constants
 
 const int Cluster_Size {4};
 
+const int Cluster_Bytes {64}; // one cache line
+
+const char   File_Magic[8] {"scan-tt"};
+const uint32 File_Version {2};
+
+const double Attach_Timeout {10.0}; // seconds to wait for the owner of a shared table
+
+const int64 TT::Size_Max {int64(Cluster_Size) << 32}; // see hash::scale()
+
 // variables
 
 TT G_TT;
 
 // functions
 
-void TT::set_size(int size) {
+TT::TT(const TT & tt) {
+   *this = tt;
+}
+
+TT::~TT() {
+   unmap();
+}
 
-   m_size = size;
-   m_mask = (size - 1) & -Cluster_Size;
+TT & TT::operator=(const TT & tt) {
+
+   if (&tt == this) return *this;
+
+   unmap();
 
-   m_table.resize(m_size);
+   allocate(tt.m_size);
+   std::copy(tt.m_table, tt.m_table + tt.m_size, m_table);
+
+   set_entries(tt.m_size);
+   set_date(tt.m_date);
+
+   return *this;
+}
+
+int64 TT::size_mb(int64 mb) {
+   return mb * (1 << 20) / int64(sizeof(Entry));
+}
+
+void TT::set_size(int64 size) {
+
+   size = std::max(size, int64(Cluster_Size));
+   size = std::min(size, Size_Max);
+   size -= size % Cluster_Size;
+
+   unmap();
+   allocate(size);
+   set_entries(size);
 
    clear();
 }
 
+void TT::set_size_mb(int64 mb) {
+   set_size(size_mb(mb));
+}
+
+void TT::allocate(int64 size) {
+
+   static_assert(sizeof(Entry) * Cluster_Size == Cluster_Bytes, "");
+
+   m_memory.clear();
+   m_memory.resize(std::size_t(size + Cluster_Size - 1)); // room for alignment
+
+   uintptr_t address = reinterpret_cast<uintptr_t>(m_memory.data());
+   address = (address + Cluster_Bytes - 1) & ~uintptr_t(Cluster_Bytes - 1);
+   m_table = reinterpret_cast<Entry *>(address);
+}
+
+void TT::set_entries(int64 size) {
+
+   assert(size % Cluster_Size == 0 && size <= Size_Max);
+
+   m_size = size;
+   m_clusters = size / Cluster_Size;
+}
+
+void TT::unmap() {
+
+   if (m_map == nullptr) return;
+
+#ifdef TT_MMAP
+   munmap(m_map, m_map_size);
+   close(m_map_fd);
+   if (m_owner) shm_unlink(m_shared_name.c_str()); // processes that are attached keep their mapping
+#endif
+
+   m_shared_name.clear();
+   m_owner = false;
+
+   m_map = nullptr;
+   m_map_size = 0;
+   m_table = nullptr;
+   m_size = 0;
+   m_clusters = 0;
+}
+
+TT::File_Header TT::header() const {
+
+   static_assert(sizeof(File_Header) == 64, "");
+
+   File_Header header {};
+   std::memcpy(header.magic, File_Magic, sizeof(File_Magic));
+   header.version = File_Version;
+   header.variant = uint32(var::Variant);
+   header.seed = hash::Seed;
+   header.size = uint64(m_size);
+   header.entry_size = sizeof(Entry);
+   header.date = uint32(m_date);
+
+   return header;
+}
+
+void TT::check_header(const File_Header & header, const std::string & file_name) const {
+
+   std::string error;
+
+   if (std::memcmp(header.magic, File_Magic, sizeof(File_Magic)) != 0) {
+      error = "not a transposition table file";
+   } else if (header.version != File_Version || header.entry_size != sizeof(Entry)) {
+      error = "unsupported file version";
+   } else if (header.variant != uint32(var::Variant)) {
+      error = "the file was saved for another variant";
+   } else if (header.seed != hash::Seed) {
+      error = "the file was saved with other hash keys";
+   } else if (header.size < uint64(Cluster_Size) || header.size > uint64(Size_Max) || header.size % Cluster_Size != 0) {
+      error = "invalid table size";
+   } else if (header.date >= uint32(Date_Size)) {
+      error = "invalid date";
+   }
+
+   if (!error.empty()) {
+      throw std::runtime_error("unable to load transposition table \"" + file_name + "\": " + error);
+   }
+}
+
+void TT::save(const std::string & file_name) {
+
+#ifdef TT_MMAP
+
+   if (m_map != nullptr) {
+
+      msync(m_map, m_map_size, MS_SYNC);
+
+      // saving to the mapped file itself only needs the sync
+
+      struct stat mapped, target;
+      if (fstat(m_map_fd, &mapped) == 0 && stat(file_name.c_str(), &target) == 0
+       && mapped.st_dev == target.st_dev && mapped.st_ino == target.st_ino) {
+         return;
+      }
+   }
+
+#endif
+
+   std::ofstream file(file_name, std::ios::binary | std::ios::trunc);
+
+   File_Header head = header();
+   file.write(reinterpret_cast<const char *>(&head), sizeof(File_Header));
+   file.write(reinterpret_cast<const char *>(m_table), std::streamsize(m_size) * sizeof(Entry));
+
+   if (!file) {
+      throw std::runtime_error("unable to save transposition table \"" + file_name + "\"");
+   }
+}
+
+void TT::load(const std::string & file_name, bool mapped) {
+
+   std::ifstream file(file_name, std::ios::binary);
+
+   File_Header head {};
+   if (!file.read(reinterpret_cast<char *>(&head), sizeof(File_Header))) {
+      throw std::runtime_error("unable to load transposition table \"" + file_name + "\": cannot read the header");
+   }
+
+   check_header(head, file_name);
+
+   std::size_t size = std::size_t(head.size);
+
+   if (!mapped) {
+
+      unmap();
+      allocate(int64(size));
+      set_entries(int64(size));
+
+      if (!file.read(reinterpret_cast<char *>(m_table), std::streamsize(size) * sizeof(Entry))) {
+         set_size(Cluster_Size);
+         throw std::runtime_error("unable to load transposition table \"" + file_name + "\": the file is truncated");
+      }
+
+   } else {
+
+#ifdef TT_MMAP
+
+      std::size_t map_size = sizeof(File_Header) + size * sizeof(Entry);
+
+      int fd = open(file_name.c_str(), O_RDWR);
+      struct stat st;
+
+      if (fd < 0 || fstat(fd, &st) != 0 || std::size_t(st.st_size) != map_size) {
+         if (fd >= 0) close(fd);
+         throw std::runtime_error("unable to map transposition table \"" + file_name + "\"");
+      }
+
+      map(fd, map_size, file_name);
+
+#else
+
+      throw std::runtime_error("memory-mapped transposition tables are not supported on this platform");
+
+#endif
+   }
+
+   set_entries(int64(size));
+   set_date(int(head.date));
+}
+
+void TT::map(int fd, std::size_t map_size, const std::string & name) {
+
+#ifdef TT_MMAP
+
+   void * map = mmap(nullptr, map_size, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+
+   if (map == MAP_FAILED) {
+      close(fd);
+      throw std::runtime_error("unable to map transposition table \"" + name + "\"");
+   }
+
+   unmap();
+
+   m_memory.clear();
+   m_memory.shrink_to_fit();
+
+   m_map = static_cast<File_Header *>(map);
+   m_map_size = map_size;
+   m_map_fd = fd;
+   m_table = reinterpret_cast<Entry *>(m_map + 1);
+
+#else
+
+   (void) fd;
+   (void) map_size;
+   (void) name;
+
+#endif
+}
+
+void TT::open_shared(const std::string & name, int64 size) {
+
+#ifdef TT_MMAP
+
+   size = std::max(size, int64(Cluster_Size));
+   size = std::min(size, Size_Max);
+   size -= size % Cluster_Size;
+
+   std::string error = "unable to open shared transposition table \"" + name + "\"";
+
+   // the process that creates the object owns it
+
+   bool owner = true;
+   int fd = shm_open(name.c_str(), O_RDWR | O_CREAT | O_EXCL, 0600);
+
+   if (fd < 0 && errno == EEXIST) {
+      owner = false;
+      fd = shm_open(name.c_str(), O_RDWR, 0600);
+   }
+
+   if (fd < 0) throw std::runtime_error(error);
+
+   auto start = std::chrono::steady_clock::now();
+
+   auto wait = [&](const char * what) { // for the owner to initialise the table
+      std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+      if (elapsed.count() > Attach_Timeout) throw std::runtime_error(error + ": " + what);
+      std::this_thread::sleep_for(std::chrono::milliseconds(1));
+   };
+
+   std::size_t map_size = sizeof(File_Header) + std::size_t(size) * sizeof(Entry);
+
+   if (owner) {
+
+      if (ftruncate(fd, off_t(map_size)) != 0) {
+         close(fd);
+         shm_unlink(name.c_str());
+         throw std::runtime_error(error);
+      }
+
+   } else {
+
+      struct stat st;
+
+      while (true) {
+
+         if (fstat(fd, &st) != 0) {
+            close(fd);
+            throw std::runtime_error(error);
+         }
+
+         if (st.st_size != 0) break;
+
+         try {
+            wait("the table was not created");
+         } catch (...) {
+            close(fd);
+            throw;
+         }
+      }
+
+      map_size = std::size_t(st.st_size);
+   }
+
+   map(fd, map_size, name); // closes fd on failure
+
+   m_shared_name = name;
+   m_owner = owner;
+
+   if (owner) {
+
+      set_entries(size);
+      clear();
+
+      // publish the header, the magic last
+
+      File_Header head = header();
+      std::memcpy(m_map, &head, sizeof(File_Header));
+      std::memset(m_map->magic, 0, sizeof(File_Magic));
+      std::atomic_thread_fence(std::memory_order_release);
+      std::memcpy(m_map->magic, File_Magic, sizeof(File_Magic));
+
+   } else {
+
+      const volatile char * magic = m_map->magic;
+
+      while (magic[0] == '\0') {
+         try {
+            wait("the table was not initialised");
+         } catch (...) {
+            unmap();
+            throw;
+         }
+      }
+
+      std::atomic_thread_fence(std::memory_order_acquire);
+
+      File_Header head = *m_map;
+
+      try {
+         check_header(head, name);
+         if (sizeof(File_Header) + head.size * sizeof(Entry) != map_size) throw std::runtime_error(error + ": invalid size");
+      } catch (...) {
+         unmap();
+         throw;
+      }
+
+      set_entries(int64(head.size));
+      set_date(int(head.date));
+   }
+
+#else
+
+   (void) name;
+   (void) size;
+   throw std::runtime_error("shared transposition tables are not supported on this platform");
+
+#endif
+}
+
 void TT::clear() {
 
+   if (!is_owner()) return; // only the owner resets a shared table
+
    static_assert(sizeof(Entry) == 16, "");
+   static_assert(sizeof(Data) == 8, "");
+
+   Data data {};
+   data.move = Move_Index_None;
+   data.score = score::None;
+   data.flag = int(Flag::None);
 
    Entry entry {};
-   entry.move = Move_Index_None;
-   entry.score = score::None;
-   entry.flag = int(Flag::None);
+   entry.data = pack(data);
+   entry.check = entry.data; // lock 0
 
-   std::fill(m_table.begin(), m_table.end(), entry);
+   std::fill(m_table, m_table + m_size, entry);
 
    set_date(0);
 }
@@ -61,6 +438,8 @@ void TT::set_date(int date) {
 
       m_age[date] = age;
    }
+
+   if (m_map != nullptr) m_map->date = uint32(m_date);
 }
 
 void TT::store(Key key, Move_Index move, Score score, Flag flag, Depth depth) {
@@ -72,41 +451,47 @@ void TT::store(Key key, Move_Index move, Score score, Flag flag, Depth depth) {
 
    // probe
 
-   int    index = hash::index(key, m_mask);
-   uint32 lock  = hash::lock(key);
+   Entry * cluster = &m_table[hash::scale(key, m_clusters) * Cluster_Size];
+   uint32  lock    = hash::lock(key);
 
    Entry * be = nullptr;
    int bs = -256;
 
    for (int i = 0; i < Cluster_Size; i++) {
 
-      assert(index + i < m_size);
-      Entry & entry = m_table[index + i];
+      Entry & entry = cluster[i];
+
+      uint64 word  = entry.data; // read once, other threads may write concurrently
+      uint64 check = entry.check;
+      Data data = unpack(word);
 
-      if (entry.lock == lock) { // hash hit
+      if ((check ^ word) == lock) { // hash hit
 
-         if (entry.depth <= depth) {
+         if (data.depth <= depth) {
 
-            assert(entry.lock == lock);
-            entry.date = m_date;
-            if (move != Move_Index_None) entry.move = move;
-            entry.score = score;
-            entry.flag = int(flag);
-            entry.depth = depth;
+            data.date = m_date;
+            if (move != Move_Index_None) data.move = move;
+            data.score = score;
+            data.flag = int(flag);
+            data.depth = depth;
 
          } else { // deeper entry
 
-            entry.date = m_date;
+            data.date = m_date;
          }
 
+         word = pack(data);
+         entry.data = word;
+         entry.check = lock ^ word;
+
          return;
       }
 
       // evaluate replacement score
 
       int sc = 0;
-      sc = sc * Date_Size + m_age[entry.date];
-      sc = sc * 256 - entry.depth;
+      sc = sc * Date_Size + m_age[data.date % Date_Size]; // a torn entry can have any date
+      sc = sc * 256 - data.depth;
       assert(sc > -256);
 
       if (sc > bs) {
@@ -119,38 +504,45 @@ void TT::store(Key key, Move_Index move, Score score, Flag flag, Depth depth) {
 
    assert(be != nullptr);
    Entry & entry = *be;
-   // assert(entry.lock != lock); // triggers in SMP
 
    // store
 
-   entry.lock = lock;
-   entry.date = m_date;
-   entry.move = move;
-   entry.score = score;
-   entry.flag = int(flag);
-   entry.depth = depth;
+   Data data {};
+   data.date = m_date;
+   data.move = move;
+   data.score = score;
+   data.flag = int(flag);
+   data.depth = depth;
+
+   uint64 word = pack(data);
+   entry.data = word;
+   entry.check = lock ^ word;
 }
 
 bool TT::probe(Key key, Move_Index & move, Score & score, Flag & flag, Depth & depth) {
 
    // probe
 
-   int    index = hash::index(key, m_mask);
-   uint32 lock  = hash::lock(key);
+   const Entry * cluster = &m_table[hash::scale(key, m_clusters) * Cluster_Size];
+   uint32        lock    = hash::lock(key);
 
    for (int i = 0; i < Cluster_Size; i++) {
 
-      assert(index + i < m_size);
-      const Entry & entry = m_table[index + i];
+      const Entry & entry = cluster[i];
+
+      uint64 word  = entry.data;
+      uint64 check = entry.check;
 
-      if (entry.lock == lock) {
+      if ((check ^ word) == lock) { // torn entries fail this test
 
          // found
 
-         move = Move_Index(entry.move);
-         score = Score(entry.score);
-         flag = Flag(entry.flag);
-         depth = Depth(entry.depth);
+         Data data = unpack(word);
+
+         move = Move_Index(data.move);
+         score = Score(data.score);
+         flag = Flag(data.flag);
+         depth = Depth(data.depth);
 
          return true;
       }
@@ -162,3 +554,26 @@ bool TT::probe(Key key, Move_Index & move, Score & score, Flag & flag, Depth & d
    return false;
 }
 
+void TT::prefetch(Key key) const {
+#if defined(__GNUC__) || defined(__clang__)
+   __builtin_prefetch(&m_table[hash::scale(key, m_clusters) * Cluster_Size]);
+#else
+   (void) key;
+#endif
+}
+
+uint64 TT::pack(const Data & data) {
+
+   uint64 word;
+   std::memcpy(&word, &data, sizeof(word));
+
+   return word;
+}
+
+TT::Data TT::unpack(uint64 word) {
+
+   Data data;
+   std::memcpy(&data, &word, sizeof(data));
+
+   return data;
+}
@@ -9,6 +9,7 @@
 
 #include "scan/common.hpp"
 #include "scan/libmy.hpp"
+#include "scan/tt.hpp"
 #include "scan/var.hpp"
 
 namespace var {
@@ -21,10 +22,14 @@ int  Book_Ply;
 int  Book_Margin;
 bool Ponder;
 bool SMP;
+SMP_Type SMP_Mode;
 int  Threads;
-int  TT_Size;
+int64 TT_Size;
+std::string TT_Shared;
 bool BB;
 int  BB_Size;
+int64 Eval_Cache_Size;
+std::string Data_Dir;
 
 bool DXP_Server;
 std::string DXP_Host;
@@ -52,8 +57,13 @@ void init() {
    set("book-margin", "4");
    set("ponder", "false");
    set("threads", "1");
+   set("smp-mode", "split");
    set("tt-size", "24");
+   set("tt-mb", "0"); // overrides tt-size if not 0
+   set("tt-shared", "none"); // name of a shared memory table, e.g. "/scan-tt"
    set("bb-size", "5");
+   set("eval-cache-size", "12"); // log2 of the entries per search thread, 0 to disable
+   set("data-dir", "data"); // evaluation weights, book and bitbases
 
    set("dxp-server", "true");
    set("dxp-host", "127.0.0.1");
@@ -136,15 +146,30 @@ void update() {
       std::exit(EXIT_FAILURE);
    }
 
+   std::string smp_mode = get("smp-mode");
+
+   if (false) {
+   } else if (smp_mode == "split") {
+      SMP_Mode = SMP_Split;
+   } else if (smp_mode == "lazy") {
+      SMP_Mode = SMP_Lazy;
+   } else {
+      std::cerr << "error: smp-mode = \"" << smp_mode << "\"" << std::endl;
+      std::exit(EXIT_FAILURE);
+   }
+
    Book        = get_bool("book");
    Book_Ply    = get_int("book-ply");
    Book_Margin = get_int("book-margin");
    Ponder      = get_bool("ponder");
    Threads     = get_int("threads");
    SMP         = Threads > 1;
-   TT_Size     = 1 << get_int("tt-size");
+   TT_Size     = (get_int("tt-mb") != 0) ? TT::size_mb(get_int("tt-mb")) : int64(1) << get_int("tt-size");
+   TT_Shared   = (get("tt-shared") != "none") ? get("tt-shared") : "";
    BB_Size     = get_int("bb-size");
    BB          = BB_Size > 0;
+   Eval_Cache_Size  = (get_int("eval-cache-size") != 0) ? int64(1) << get_int("eval-cache-size") : 0;
+   Data_Dir         = get("data-dir");
 
    DXP_Server    = get_bool("dxp-server");
    DXP_Host      = get("dxp-host");
@@ -201,5 +226,9 @@ std::string variant_name() {
    return ""; // to avoid a warning
 }
 
+std::string data_file(const std::string & name) {
+   return (Data_Dir.empty() || Data_Dir.back() == '/') ? Data_Dir + name : Data_Dir + "/" + name;
+}
+
 } // namespace var
 
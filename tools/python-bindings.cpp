@@ -13,16 +13,25 @@
 #include "scan/terminal.hpp"
 #include "scan/move.hpp"
 #include "scan/pos.hpp"
+#include "scan/bench.hpp"
 #include "scan/search.hpp"
 #include "scan/thread.hpp"
 #include "scan/tt.hpp"
+#include "draughts/batch.h"
+#include "draughts/codec.h"
 #include "draughts/egdb.h"
+#include "draughts/init.h"
 #include "draughts/pdn.h"
 #include "draughts/scan.h"
 #include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 #include <algorithm>
+#include <atomic>
+#include <condition_variable>
+#include <exception>
+#include <mutex>
+#include <thread>
 
 namespace py = pybind11;
 
@@ -136,18 +145,735 @@ py::array_t<int> pos_to_numpy2(const Pos& pos)
   return result;
 }
 
-// Takes care of initialization
+// A batch of positions that is stored in a 1-dimensional structured NumPy array with
+// the uint64 fields turn, wm, bm, wk and bk. The array may be a view on another array,
+// or on a memory-mapped file.
+struct pos_batch
+{
+  py::array array;
+
+  pos_batch() = default;
+
+  explicit pos_batch(std::size_t size)
+    : array(py::array_t<draughts::position_record>(size))
+  {
+    std::fill_n(static_cast<draughts::position_record*>(array.mutable_data()), size, draughts::position_record{0, 0, 0, 0, 0});
+  }
+
+  explicit pos_batch(const py::array& a, bool validate = true)
+    : array(a)
+  {
+    if (!array.dtype().equal(py::dtype::of<draughts::position_record>()) || array.ndim() != 1)
+    {
+      throw std::runtime_error("PosBatch: expected a 1-dimensional array with dtype PosBatch.dtype");
+    }
+    if (validate)
+    {
+      draughts::position_span positions = span();
+      bool valid = true;
+      {
+        py::gil_scoped_release release;
+        for (std::size_t i = 0; i < positions.size() && valid; i++)
+        {
+          valid = draughts::is_valid(positions.record(i));
+        }
+      }
+      if (!valid)
+      {
+        throw std::runtime_error("PosBatch: the array contains an invalid position");
+      }
+    }
+  }
+
+  std::size_t size() const
+  {
+    return array.shape(0);
+  }
+
+  draughts::position_span span() const
+  {
+    return draughts::position_span(array.data(), size(), array.strides(0));
+  }
+
+  draughts::position_record* mutable_data()
+  {
+    return static_cast<draughts::position_record*>(array.mutable_data());
+  }
+
+  static pos_batch from_positions(const std::vector<Pos>& positions)
+  {
+    pos_batch result(positions.size());
+    std::transform(positions.begin(), positions.end(), result.mutable_data(), draughts::make_position_record);
+    return result;
+  }
+
+  std::vector<Pos> to_positions() const
+  {
+    draughts::position_span positions = span();
+    std::vector<Pos> result;
+    result.reserve(positions.size());
+    for (std::size_t i = 0; i < positions.size(); i++)
+    {
+      result.push_back(positions[i]);
+    }
+    return result;
+  }
+
+  static pos_batch concatenate(const std::vector<pos_batch>& batches)
+  {
+    std::size_t size = 0;
+    for (const pos_batch& batch: batches)
+    {
+      size += batch.size();
+    }
+    pos_batch result(size);
+    draughts::position_record* out = result.mutable_data();
+    for (const pos_batch& batch: batches)
+    {
+      draughts::position_span positions = batch.span();
+      for (std::size_t i = 0; i < positions.size(); i++)
+      {
+        *out++ = positions.record(i);
+      }
+    }
+    return result;
+  }
+};
+
+// Returns positions as a PosBatch. Positions is either a PosBatch or a sequence of Pos.
+inline
+pos_batch as_pos_batch(const py::object& positions)
+{
+  if (py::isinstance<pos_batch>(positions))
+  {
+    return positions.cast<pos_batch>();
+  }
+  return pos_batch::from_positions(positions.cast<std::vector<Pos>>());
+}
+
+inline
+std::size_t pos_batch_index(const pos_batch& batch, py::ssize_t i)
+{
+  py::ssize_t n = batch.size();
+  if (i < 0)
+  {
+    i += n;
+  }
+  if (i < 0 || i >= n)
+  {
+    throw py::index_error("PosBatch index out of range");
+  }
+  return std::size_t(i);
+}
+
+// Encodes a batch of positions into an array of shape (N, 4, 10, 10) (layout "board")
+// or (N, 4, 50) (layout "squares"). If out is not None, the result is written into it.
+// The encoding itself runs without the GIL.
+template <typename T>
+py::array_t<T> encode_batch_as(const pos_batch& batch, draughts::board_layout layout, int threads, const py::object& out)
+{
+  std::vector<py::ssize_t> shape = { py::ssize_t(batch.size()), 4 };
+  if (layout == draughts::board_layout::board)
+  {
+    shape.insert(shape.end(), { 10, 10 });
+  }
+  else
+  {
+    shape.push_back(50);
+  }
+
+  py::array_t<T> result;
+  if (out.is_none())
+  {
+    result = py::array_t<T>(shape);
+  }
+  else
+  {
+    if (!py::isinstance<py::array_t<T>>(out))
+    {
+      throw std::runtime_error("encode_batch: out has the wrong dtype");
+    }
+    result = out.cast<py::array_t<T>>();
+    if (!(result.flags() & py::array::c_style) || std::vector<py::ssize_t>(result.shape(), result.shape() + result.ndim()) != shape)
+    {
+      throw std::runtime_error("encode_batch: out must be a C-contiguous array of the right shape");
+    }
+  }
+
+  T* ptr = result.mutable_data();
+  draughts::position_span positions = batch.span();
+  {
+    py::gil_scoped_release release;
+    draughts::encode_positions(positions, layout, ptr, threads);
+  }
+  return result;
+}
+
+inline
+py::array encode_batch(const py::object& positions, const std::string& layout, const py::object& dtype, int threads, const py::object& out)
+{
+  pos_batch batch = as_pos_batch(positions);
+  draughts::board_layout layout_ = draughts::parse_board_layout(layout);
+  py::dtype dtype_ = py::dtype::from_args(dtype);
+  if (dtype_.equal(py::dtype::of<std::uint8_t>()))
+  {
+    return encode_batch_as<std::uint8_t>(batch, layout_, threads, out);
+  }
+  else if (dtype_.equal(py::dtype::of<float>()))
+  {
+    return encode_batch_as<float>(batch, layout_, threads, out);
+  }
+  throw std::runtime_error("encode_batch: dtype must be uint8 or float32");
+}
+
+// Copies the elements of v into a new NumPy array.
+template <typename T>
+py::array_t<T> to_numpy(const std::vector<T>& v)
+{
+  py::array_t<T> result(v.size());
+  std::copy(v.begin(), v.end(), result.mutable_data());
+  return result;
+}
+
+// Generates the moves of a batch of positions in CSR format. The result is a dictionary
+// with the arrays 'moves' and 'offsets', such that the moves of position i are
+// moves[offsets[i]:offsets[i + 1]]. If details is true, it also contains the arrays
+// 'from' and 'to' (standard numbering), 'captured' (bitboards) and 'index' (move_index).
+inline
+py::dict generate_moves_batch(const py::object& positions, const std::string& kind, bool details, int threads)
+{
+  pos_batch batch = as_pos_batch(positions);
+  draughts::position_span span = batch.span();
+  draughts::move_kind kind_ = draughts::parse_move_kind(kind);
+
+  draughts::move_table moves;
+  {
+    py::gil_scoped_release release;
+    moves = draughts::generate_moves_csr(span, kind_, threads);
+  }
+
+  py::dict result;
+  result["moves"] = to_numpy(moves.moves);
+  result["offsets"] = to_numpy(moves.offsets);
+  if (details)
+  {
+    std::size_t m = moves.moves.size();
+    py::array_t<std::int32_t> from(m);
+    py::array_t<std::int32_t> to(m);
+    py::array_t<std::uint64_t> captured(m);
+    py::array_t<std::int32_t> index(m);
+    std::int32_t* from_ = from.mutable_data();
+    std::int32_t* to_ = to.mutable_data();
+    std::uint64_t* captured_ = captured.mutable_data();
+    std::int32_t* index_ = index.mutable_data();
+    {
+      py::gil_scoped_release release;
+      draughts::move_details(span, moves, from_, to_, captured_, index_, threads);
+    }
+    result["from"] = from;
+    result["to"] = to;
+    result["captured"] = captured;
+    result["index"] = index;
+  }
+  return result;
+}
+
+// Returns the positions that result from playing moves[i] in positions[i].
+inline
+pos_batch succ_batch(const py::object& positions, const py::array_t<Move, py::array::c_style | py::array::forcecast>& moves, int threads)
+{
+  pos_batch batch = as_pos_batch(positions);
+  if (moves.ndim() != 1 || std::size_t(moves.shape(0)) != batch.size())
+  {
+    throw std::runtime_error("succ_batch: the number of moves must be equal to the number of positions");
+  }
+  pos_batch result(batch.size());
+  draughts::position_span span = batch.span();
+  draughts::position_record* out = result.mutable_data();
+  const Move* moves_ = moves.data();
+  std::int64_t illegal;
+  {
+    py::gil_scoped_release release;
+    illegal = draughts::find_illegal_move(span, moves_, threads);
+    if (illegal == -1)
+    {
+      draughts::succ_positions(span, moves_, out, threads);
+    }
+  }
+  if (illegal != -1)
+  {
+    throw std::invalid_argument("succ_batch: moves[" + std::to_string(illegal) + "] is not legal in positions[" + std::to_string(illegal) + "]");
+  }
+  return result;
+}
+
+// Returns all children of a batch of positions, together with offsets such that the
+// children of position i are children[offsets[i]:offsets[i + 1]]. The children appear
+// in the order of generate_moves_batch.
+inline
+py::tuple expand_all(const py::object& positions, int threads)
+{
+  pos_batch batch = as_pos_batch(positions);
+  draughts::position_span span = batch.span();
+
+  draughts::move_table moves;
+  {
+    py::gil_scoped_release release;
+    moves = draughts::generate_moves_csr(span, draughts::move_kind::moves, threads);
+  }
+  pos_batch children(moves.moves.size());
+  draughts::position_record* out = children.mutable_data();
+  {
+    py::gil_scoped_release release;
+    draughts::expand_positions(span, moves, out, threads);
+  }
+  return py::make_tuple(children, to_numpy(moves.offsets));
+}
+
+// Evaluates a batch of positions with the Scan evaluation function. The scores are from
+// the perspective of the side to move (perspective "side") or of white (perspective
+// "white"). If components is true, a dictionary is returned with the arrays 'score',
+// 'mg', 'eg' and 'stage', where mg and eg use the same perspective as score.
+inline
+py::object eval_batch(const py::object& positions, const std::string& perspective, bool components, int threads)
+{
+  draughts::init_eval();
+  pos_batch batch = as_pos_batch(positions);
+  draughts::position_span span = batch.span();
+  draughts::eval_perspective perspective_ = draughts::parse_eval_perspective(perspective);
+  std::size_t n = batch.size();
+
+  py::array_t<std::int16_t> scores(n);
+  std::int16_t* scores_ = scores.mutable_data();
+  if (!components)
+  {
+    py::gil_scoped_release release;
+    draughts::eval_positions(span, perspective_, scores_, nullptr, nullptr, nullptr, threads);
+    return std::move(scores);
+  }
+
+  py::array_t<std::int32_t> mg(n);
+  py::array_t<std::int32_t> eg(n);
+  py::array_t<std::int32_t> stage(n);
+  std::int32_t* mg_ = mg.mutable_data();
+  std::int32_t* eg_ = eg.mutable_data();
+  std::int32_t* stage_ = stage.mutable_data();
+  {
+    py::gil_scoped_release release;
+    draughts::eval_positions(span, perspective_, scores_, mg_, eg_, stage_, threads);
+  }
+  py::dict result;
+  result["score"] = scores;
+  result["mg"] = mg;
+  result["eg"] = eg;
+  result["stage"] = stage;
+  return std::move(result);
+}
+
+// Returns the legal action masks of a batch of positions as an array of shape (N, action_size).
+inline
+py::array_t<bool> legal_action_mask_batch(const py::object& positions, int threads)
+{
+  pos_batch batch = as_pos_batch(positions);
+  draughts::position_span span = batch.span();
+  py::array_t<bool> result({ py::ssize_t(batch.size()), py::ssize_t(draughts::action_size) });
+  bool* out = result.mutable_data();
+  {
+    py::gil_scoped_release release;
+    draughts::legal_action_masks(span, out, threads);
+  }
+  return result;
+}
+
+// Returns the contents of a contiguous buffer (e.g. bytes, bytearray or memoryview) as a byte range.
+inline
+std::pair<const std::uint8_t*, const std::uint8_t*> buffer_range(const py::buffer& data)
+{
+  py::buffer_info info = data.request();
+  const std::uint8_t* first = static_cast<const std::uint8_t*>(info.ptr);
+  if (info.ndim > 1 || (info.ndim == 1 && info.strides[0] != info.itemsize))
+  {
+    throw std::runtime_error("expected a contiguous buffer");
+  }
+  return { first, first + info.size * info.itemsize };
+}
+
+inline
+py::bytes to_bytes(const std::vector<std::uint8_t>& data)
+{
+  return py::bytes(reinterpret_cast<const char*>(data.data()), data.size());
+}
+
+// Encodes a batch of positions in 26 bytes per position.
+inline
+py::bytes encode_positions(const py::object& positions, int threads)
+{
+  pos_batch batch = as_pos_batch(positions);
+  draughts::position_span span = batch.span();
+  std::vector<std::uint8_t> result(batch.size() * draughts::packed_position_size);
+  {
+    py::gil_scoped_release release;
+    draughts::pack_positions(span, result.data(), threads);
+  }
+  return to_bytes(result);
+}
+
+inline
+pos_batch decode_positions(const py::buffer& data)
+{
+  auto [first, last] = buffer_range(data);
+  std::size_t size = last - first;
+  if (size % draughts::packed_position_size != 0)
+  {
+    throw std::runtime_error("decode_positions: the size of the data is not a multiple of 26");
+  }
+  pos_batch result(size / draughts::packed_position_size);
+  draughts::position_record* out = result.mutable_data();
+  {
+    py::gil_scoped_release release;
+    draughts::unpack_positions(first, result.size(), out);
+  }
+  return result;
+}
+
+inline
+py::bytes encode_games(const std::vector<std::shared_ptr<Game>>& games)
+{
+  std::vector<std::uint8_t> result;
+  {
+    py::gil_scoped_release release;
+    for (const auto& game: games)
+    {
+      draughts::pack_game(*game, result);
+    }
+  }
+  return to_bytes(result);
+}
+
+inline
+std::vector<std::shared_ptr<Game>> decode_games(const py::buffer& data)
+{
+  auto [first, last] = buffer_range(data);
+  std::vector<std::shared_ptr<Game>> result;
+  py::gil_scoped_release release;
+  while (first != last)
+  {
+    result.push_back(std::make_shared<Game>(draughts::unpack_game(first, last)));
+  }
+  return result;
+}
+
+inline
+void check_threads(int threads)
+{
+  if (threads < 1)
+  {
+    throw std::runtime_error("the number of threads must be at least 1");
+  }
+}
+
+// Returns the number of entries of a transposition table with 2^tt_size entries, where
+// tt_size has the same range as the 'tt-size' setting.
+inline
+int64 tt_entries(int tt_size)
+{
+  if (tt_size < 16 || tt_size > 34)
+  {
+    throw std::invalid_argument("tt_size must be in [16, 34]");
+  }
+  return int64(1) << tt_size;
+}
+
+// Wraps a Python callable callback(event, output) as a search callback. The search stops
+// if it returns a true value.
+inline
+Search_Callback make_search_callback(const py::object& callback)
+{
+  if (callback.is_none())
+  {
+    return nullptr;
+  }
+  return [callback](Search_Event event, const Search_Output& so)
+  {
+    py::gil_scoped_acquire acquire;
+    py::object result = callback(event, so);
+    return py::bool_(result).cast<bool>();
+  };
+}
+
+// A search that runs in a background thread, see SearchEngine.start. It is stopped through
+// an atomic flag that the search checks every few nodes, and its result is also available
+// as a concurrent.futures.Future, which makes the handle awaitable.
+class search_handle
+{
+  private:
+    std::shared_ptr<Search_Engine> m_engine;
+    std::shared_ptr<Evaluator> m_evaluator;
+    Node m_node;
+    Search_Input m_si;
+    Search_Output m_so;
+    std::shared_ptr<std::atomic<bool>> m_stop = std::make_shared<std::atomic<bool>>(false);
+    std::exception_ptr m_error;
+    bool m_done = false;
+    std::mutex m_mutex;
+    std::condition_variable m_done_condition;
+    py::object m_future;
+    std::thread m_thread;
+
+    void run()
+    {
+      try
+      {
+        m_engine->search(m_so, m_node, m_si);
+      }
+      catch (...)
+      {
+        m_error = std::current_exception();
+      }
+      {
+        std::lock_guard<std::mutex> lock(m_mutex);
+        m_done = true;
+      }
+      m_done_condition.notify_all();
+
+      py::gil_scoped_acquire acquire;
+      try
+      {
+        if (m_error)
+        {
+          m_future.attr("set_exception")(exception_object());
+        }
+        else
+        {
+          m_future.attr("set_result")(py::cast(m_so, py::return_value_policy::copy));
+        }
+      }
+      catch (py::error_already_set&) // the future was cancelled
+      {
+      }
+    }
+
+    py::object exception_object() const
+    {
+      try
+      {
+        std::rethrow_exception(m_error);
+      }
+      catch (py::error_already_set& e)
+      {
+        return e.value();
+      }
+      catch (const std::exception& e)
+      {
+        return py::module_::import("builtins").attr("RuntimeError")(e.what());
+      }
+    }
+
+  public:
+    search_handle(std::shared_ptr<Search_Engine> engine, const Pos& pos, const Search_Input& si, std::shared_ptr<Evaluator> evaluator)
+      : m_engine(std::move(engine)), m_evaluator(std::move(evaluator)), m_node(pos), m_si(si)
+    {
+      m_si.input = false;
+      m_si.evaluator = m_evaluator.get();
+      m_si.stop = m_stop.get();
+      m_future = py::module_::import("concurrent.futures").attr("Future")();
+      std::shared_ptr<std::atomic<bool>> stop = m_stop; // the future may outlive the handle
+      m_future.attr("add_done_callback")(py::cpp_function([stop](const py::object& future)
+      {
+        if (future.attr("cancelled")().cast<bool>())
+        {
+          *stop = true;
+        }
+      }));
+      m_thread = std::thread([this]() { run(); });
+    }
+
+    ~search_handle()
+    {
+      stop();
+      py::gil_scoped_release release;
+      m_thread.join();
+    }
+
+    void stop()
+    {
+      *m_stop = true;
+    }
+
+    bool done()
+    {
+      std::lock_guard<std::mutex> lock(m_mutex);
+      return m_done;
+    }
+
+    // Waits until the search is done, or until timeout seconds have passed (if timeout >= 0).
+    // Returns true if the search is done.
+    bool wait(double timeout = -1.0)
+    {
+      py::gil_scoped_release release;
+      std::unique_lock<std::mutex> lock(m_mutex);
+      if (timeout < 0.0)
+      {
+        m_done_condition.wait(lock, [this]() { return m_done; });
+        return true;
+      }
+      return m_done_condition.wait_for(lock, std::chrono::duration<double>(timeout), [this]() { return m_done; });
+    }
+
+    Search_Output result()
+    {
+      wait();
+      if (m_error)
+      {
+        std::rethrow_exception(m_error);
+      }
+      return m_so;
+    }
+
+    py::object future() const
+    {
+      return m_future;
+    }
+};
+
+inline
+Search_Input make_search_input(int depth, double time, int64 nodes, int multipv, const py::object& callback, Evaluator* evaluator = nullptr)
+{
+  Search_Input si;
+  si.move = true;
+  si.book = false;
+  si.depth = std::min(depth, int(Depth_Max));
+  si.nodes = nodes;
+  si.time = time;
+  si.input = false;
+  si.output = Output_None;
+  si.multipv = std::max(multipv, 1);
+  si.callback = make_search_callback(callback);
+  si.evaluator = evaluator;
+  return si;
+}
+
+// Wraps fn(positions: PosBatch) -> scores for the side to move (as returned by eval_batch) for a
+// Batch_Evaluator. Errors of fn are reported as std::runtime_error, the evaluator then falls back
+// to the built-in evaluation.
+inline
+Batch_Eval make_batch_eval(const py::object& fn)
+{
+  if (fn.is_none())
+  {
+    return Batch_Eval();
+  }
+  return [fn](const std::vector<Pos>& positions, std::vector<Score>& scores)
+  {
+    py::gil_scoped_acquire acquire;
+    try
+    {
+      py::array_t<int, py::array::c_style | py::array::forcecast> result(fn(pos_batch::from_positions(positions)));
+      if (result.ndim() != 1 || std::size_t(result.shape(0)) != positions.size())
+      {
+        throw std::runtime_error("expected " + std::to_string(positions.size()) + " scores");
+      }
+      std::copy_n(result.data(), positions.size(), scores.begin());
+    }
+    catch (py::error_already_set& e)
+    {
+      throw std::runtime_error(e.what());
+    }
+  };
+}
+
+inline
+var::SMP_Type parse_smp_mode(const std::string& text)
+{
+  if (text == "split")
+  {
+    return var::SMP_Split;
+  }
+  else if (text == "lazy")
+  {
+    return var::SMP_Lazy;
+  }
+  throw std::runtime_error("unknown SMP mode '" + text + "'");
+}
+
+inline
+std::string smp_mode_name(var::SMP_Type mode)
+{
+  return mode == var::SMP_Lazy ? "lazy" : "split";
+}
+
+// Searches a batch of positions in parallel, see draughts::search_positions. The result is a
+// dictionary with the arrays 'score' (from the perspective of the side to move), 'move',
+// 'depth' and 'nodes', and the principal variations in CSR format ('pv' and 'pv_offsets').
+// If callback is not None, callback(i, output) is called as soon as position i is done.
+inline
+py::dict search_many(const py::object& positions, int depth, double time, int64 nodes, int workers, int tt_size, bool shared_tt, const py::object& callback,
+                     const std::shared_ptr<Evaluator>& evaluator)
+{
+  pos_batch batch = as_pos_batch(positions);
+  draughts::position_span span = batch.span();
+  std::size_t n = batch.size();
+  int64 tt_size_ = tt_entries(tt_size);
+
+  Search_Input si;
+  si.move = true;
+  si.book = false;
+  si.depth = std::min(depth, int(Depth_Max));
+  si.nodes = nodes;
+  si.time = time;
+  si.input = false;
+  si.output = Output_None;
+  si.evaluator = evaluator.get();
+
+  std::vector<std::int32_t> scores(n);
+  std::vector<Move> moves(n);
+  std::vector<std::int32_t> depths(n);
+  std::vector<std::int64_t> node_counts(n);
+  std::vector<Line> pvs(n);
+  {
+    py::gil_scoped_release release;
+    draughts::init_search();
+    draughts::search_positions(span, si, workers, tt_size_, shared_tt, [&](std::size_t i, const Search_Output& so)
+    {
+      scores[i] = so.score;
+      moves[i] = so.move;
+      depths[i] = so.depth;
+      node_counts[i] = so.node;
+      pvs[i] = so.pv;
+      if (!callback.is_none())
+      {
+        py::gil_scoped_acquire acquire;
+        callback(i, so);
+      }
+    });
+  }
+
+  std::vector<Move> pv;
+  std::vector<std::int64_t> pv_offsets = { 0 };
+  for (const Line& line: pvs)
+  {
+    pv.insert(pv.end(), line.begin(), line.end());
+    pv_offsets.push_back(pv.size());
+  }
+
+  py::dict result;
+  result["score"] = to_numpy(scores);
+  result["move"] = to_numpy(moves);
+  result["depth"] = to_numpy(depths);
+  result["nodes"] = to_numpy(node_counts);
+  result["pv"] = to_numpy(pv);
+  result["pv_offsets"] = to_numpy(pv_offsets);
+  return result;
+}
+
+// Takes care of initialization. Only the cheap phases are run on import, the other ones
+// are run when they are first needed (see draughts/init.h).
 struct ScanModule
 {
   ScanModule()
   {
-    bit::init();
-    hash::init();
-    pos::init();
-    var::init();
-    bb::index_init();
-    bb::comp_init();
-    ml::rand_init(); // after hash keys
+    draughts::init_core();
+    draughts::init_bb_index();
   }
 
   ~ScanModule() = default;
@@ -282,12 +1008,95 @@ PYBIND11_MODULE(draughts1, m)
       }))
     ;
 
+  PYBIND11_NUMPY_DTYPE(draughts::position_record, turn, wm, bm, wk, bk);
+
+  py::class_<pos_batch>(m, "PosBatch", py::buffer_protocol(), "A batch of positions stored in a structured NumPy array")
+    .def(py::init<std::size_t>(), py::arg("size") = 0)
+    .def(py::init<const py::array&, bool>(), py::arg("array"), py::arg("validate") = true, py::keep_alive<1, 2>())
+    .def_static("from_positions", pos_batch::from_positions)
+    .def_static("concatenate", pos_batch::concatenate)
+    .def_property_readonly_static("dtype", [](const py::object&) { return py::dtype::of<draughts::position_record>(); })
+    .def_readonly("array", &pos_batch::array)
+    .def("to_positions", &pos_batch::to_positions)
+    .def("hash_key", [](const pos_batch& batch, int threads)
+      {
+        draughts::init_hash();
+        py::array_t<std::uint64_t> result(batch.size());
+        std::uint64_t* out = result.mutable_data();
+        draughts::position_span positions = batch.span();
+        py::gil_scoped_release release;
+        draughts::hash_keys(positions, out, threads);
+        return result;
+      }, py::arg("threads") = 1)
+    .def("__len__", &pos_batch::size)
+    .def("__getitem__", [](const pos_batch& batch, py::ssize_t i) { return batch.span()[pos_batch_index(batch, i)]; })
+    .def("__getitem__", [](const pos_batch& batch, const py::slice& slice) { return pos_batch(batch.array[slice].cast<py::array>(), false); })
+    .def("__setitem__", [](pos_batch& batch, py::ssize_t i, const Pos& pos)
+      {
+        char* data = static_cast<char*>(batch.array.mutable_data());
+        std::size_t index = pos_batch_index(batch, i);
+        *reinterpret_cast<draughts::position_record*>(data + index * batch.array.strides(0)) = draughts::make_position_record(pos);
+      })
+    .def("__add__", [](const pos_batch& batch1, const pos_batch& batch2) { return pos_batch::concatenate({ batch1, batch2 }); })
+    .def_buffer([](pos_batch& batch) { return batch.array.request(); })
+    .def(py::pickle(
+      [](const pos_batch& batch)
+      {
+        return py::make_tuple(py::module_::import("numpy").attr("ascontiguousarray")(batch.array));
+      },
+      [](const py::tuple& t)
+      {
+        if (t.size() != 1)
+        {
+          throw std::runtime_error("Invalid state!");
+        }
+        return pos_batch(t[0].cast<py::array>());
+      }))
+    ;
+
   m.def("make_position", [](Side turn, Bit wm, Bit bm, Bit wk, Bit bk) { return Pos(turn, wm, bm, wk, bk); });
   m.def("start_position", draughts::start_position);
   m.def("print_position", draughts::print_position);
   m.def("parse_position", draughts::parse_position);
   m.def("display_position", pos::disp);
-  m.def("eval_position", [](const Pos& pos) { return int(eval(pos)); });
+  m.def("eval_position", [](const Pos& pos, Eval_Cache* cache)
+    {
+      draughts::init_eval();
+      if (cache == nullptr)
+      {
+        return int(eval(pos));
+      }
+      Key key = hash::key(pos);
+      Score sc;
+      if (!cache->probe(key, sc))
+      {
+        sc = eval(pos);
+        cache->store(key, sc);
+      }
+      return int(sc);
+    }, "Evaluates a position for the side to move, optionally through an EvalCache.", py::arg("pos"), py::arg("cache") = nullptr);
+  m.def("save_eval_weights", [](const std::string& filename) { draughts::init_eval(); eval_save(filename); },
+        "Saves the evaluation weights of the current variant as int16. Saved as eval<variant>.i16 in the data directory, "
+        "the file is memory-mapped at initialization and shared by all processes.", py::arg("filename"));
+  m.def("eval_weights_mapped", []() { draughts::init_eval(); return eval_is_mapped(); });
+  py::class_<Eval_Cache, std::shared_ptr<Eval_Cache>>(m, "EvalCache", "Cache of eval_position results keyed by position hash")
+    .def(py::init([](int64 size)
+      {
+        if (size < 0 || size > int64(1) << 30)
+        {
+          throw std::invalid_argument("EvalCache: size must be in [0, 2^30]");
+        }
+        auto cache = std::make_shared<Eval_Cache>();
+        cache->set_size(size);
+        return cache;
+      }), py::arg("size") = int64(1) << 16)
+    .def("size", &Eval_Cache::size, "Number of entries (a power of two)")
+    .def("clear", &Eval_Cache::clear, "Empties the cache and resets the counters")
+    .def_property_readonly("hits", &Eval_Cache::hit)
+    .def_property_readonly("misses", &Eval_Cache::miss)
+    ;
+  m.def("eval_batch", eval_batch, "Evaluates a batch of positions. It is thread-safe after Scan.init() has been called.",
+        py::arg("positions"), py::arg("perspective") = "side", py::arg("components") = false, py::arg("threads") = 1);
 
   py::class_<Node, std::shared_ptr<Node>>(m, "Node")
     .def(py::init<>(), py::return_value_policy::copy)
@@ -333,6 +1142,25 @@ PYBIND11_MODULE(draughts1, m)
     .def_readwrite("time", &Search_Input::time)
     .def_readwrite("inc", &Search_Input::inc)
     .def_readwrite("ponder", &Search_Input::ponder)
+    .def_readwrite("multipv", &Search_Input::multipv)
+    .def_property("callback", [](const Search_Input& si) { return bool(si.callback); },
+                  [](Search_Input& si, const py::object& callback) { si.callback = make_search_callback(callback); },
+                  "A callable callback(event, output) that is called for each new best move and each completed iteration. "
+                  "The search stops if it returns True. Reading this property tells if a callback is set.")
+    ;
+
+  py::enum_<Search_Event>(m, "SearchEvent", "The events that are reported to a search callback")
+    .value("BestMove", Event_Best_Move, "A new best move was found")
+    .value("Iteration", Event_Iteration, "An iteration of the iterative deepening was completed")
+    ;
+
+  py::class_<PV_Entry, std::shared_ptr<PV_Entry>>(m, "PVEntry", "A line of a multi-PV search")
+    .def(py::init<>(), py::return_value_policy::copy)
+    .def_readwrite("move", &PV_Entry::move)
+    .def_readwrite("score", &PV_Entry::score)
+    .def_readwrite("flag", &PV_Entry::flag)
+    .def_readwrite("depth", &PV_Entry::depth)
+    .def_readwrite("pv", &PV_Entry::pv)
     ;
 
   py::class_<Search_Output, std::shared_ptr<Search_Output>>(m, "SearchOutput")
@@ -354,6 +1182,13 @@ PYBIND11_MODULE(draughts1, m)
     .def_readwrite("node", &Search_Output::node)
     .def_readwrite("leaf", &Search_Output::leaf)
     .def_readwrite("ply_sum", &Search_Output::ply_sum)
+    .def_readwrite("multipv", &Search_Output::multipv)
+    .def_readwrite("tt_probe", &Search_Output::tt_probe)
+    .def_readwrite("tt_hit", &Search_Output::tt_hit)
+    .def_readwrite("bb_probe", &Search_Output::bb_probe)
+    .def_readwrite("eval_probe", &Search_Output::eval_probe)
+    .def_readwrite("eval_hit", &Search_Output::eval_hit)
+    .def("nps", &Search_Output::nps)
     ;
 
   // special values for the score of a search
@@ -362,9 +1197,123 @@ PYBIND11_MODULE(draughts1, m)
   m.def("score_eval_inf", []{ return score::Eval_Inf; });
   m.def("score_none", []{ return score::None; });
 
-  m.def("search", search);
-  m.def("quick_move", quick_move);
-  m.def("quick_score", quick_score);
+  // The functions below release the GIL while they run. Unless stated otherwise they use
+  // the global engine state (transposition table, history, time control), so at most one
+  // of them may run at the same time.
+  m.def("search", [](Search_Output& so, const Node& node, const Search_Input& si) { draughts::init_engine(); search(so, node, si); }, "Runs a Scan search. Uses the global engine state, so it is not thread-safe.", py::call_guard<py::gil_scoped_release>());
+  m.def("quick_move", [](const Pos& pos) { draughts::init_engine(); return quick_move(pos); }, py::call_guard<py::gil_scoped_release>());
+  m.def("quick_score", [](const Pos& pos) { draughts::init_engine(); return quick_score(pos); }, py::call_guard<py::gil_scoped_release>());
+
+  py::class_<Search_Engine, std::shared_ptr<Search_Engine>>(m, "SearchEngine",
+      "A Scan search with its own transposition table, history, time control and threads. Searches of different engines "
+      "can run at the same time, and an engine can be used by several threads at the same time (they then share its "
+      "transposition table).")
+    .def(py::init([](int tt_size, int threads, const std::string& smp_mode, int64 tt_mb)
+      {
+        check_threads(threads);
+        draughts::init_search();
+        int64 size = tt_mb != 0 ? TT::size_mb(tt_mb) : tt_entries(tt_size);
+        return std::make_shared<Search_Engine>(size, threads, parse_smp_mode(smp_mode));
+      }), "Creates an engine with a private transposition table of 2^tt_size entries, or of tt_mb megabytes if tt_mb is not 0. "
+          "The threads of a search work together using split points (smp_mode='split') or Lazy SMP (smp_mode='lazy').",
+          py::arg("tt_size") = 24, py::arg("threads") = 1, py::arg("smp_mode") = "split", py::arg("tt_mb") = 0)
+    .def(py::init([](TT& tt, int threads, const std::string& smp_mode)
+      {
+        check_threads(threads);
+        draughts::init_search();
+        return std::make_shared<Search_Engine>(tt, threads, parse_smp_mode(smp_mode));
+      }), "Creates an engine that uses the given transposition table",
+          py::arg("tt"), py::arg("threads") = 1, py::arg("smp_mode") = "split", py::keep_alive<1, 2>())
+    .def("search", [](Search_Engine& engine, Search_Output& so, const Node& node, const Search_Input& si) { engine.search(so, node, si); },
+         py::call_guard<py::gil_scoped_release>())
+    .def("search", [](Search_Engine& engine, const Pos& pos, int depth, double time, int64 nodes, int multipv, const py::object& callback,
+                      const std::shared_ptr<Evaluator>& evaluator)
+      {
+        Search_Input si = make_search_input(depth, time, nodes, multipv, callback, evaluator.get());
+        Search_Output so;
+        {
+          py::gil_scoped_release release;
+          engine.search(so, Node(pos), si);
+        }
+        return so;
+      }, "Searches pos until one of the limits is reached. With multipv > 1 the output also contains the best multipv lines. "
+         "The optional callback(event, output) is called for each new best move and each completed iteration, and stops the search "
+         "if it returns True. If evaluator is not None, it replaces the built-in evaluation.",
+         py::arg("pos"), py::arg("depth") = int(Depth_Max), py::arg("time") = 1E6, py::arg("nodes") = int64(1E12), py::arg("multipv") = 1,
+         py::arg("callback") = py::none(), py::arg("evaluator") = nullptr)
+    .def("start", [](const std::shared_ptr<Search_Engine>& engine, const Pos& pos, int depth, double time, int64 nodes, int multipv, const py::object& callback,
+                     const std::shared_ptr<Evaluator>& evaluator)
+      {
+        return std::make_shared<search_handle>(engine, pos, make_search_input(depth, time, nodes, multipv, callback), evaluator);
+      }, "Starts a search in a background thread and returns a SearchHandle. It has the same arguments as search.",
+         py::arg("pos"), py::arg("depth") = int(Depth_Max), py::arg("time") = 1E6, py::arg("nodes") = int64(1E12), py::arg("multipv") = 1,
+         py::arg("callback") = py::none(), py::arg("evaluator") = nullptr)
+    .def("quick_move", &Search_Engine::quick_move, py::call_guard<py::gil_scoped_release>())
+    .def("quick_score", &Search_Engine::quick_score, py::call_guard<py::gil_scoped_release>())
+    .def_property_readonly("tt", &Search_Engine::tt, py::return_value_policy::reference_internal)
+    .def_property("threads", &Search_Engine::threads, [](Search_Engine& engine, int threads) { check_threads(threads); engine.set_threads(threads); },
+                  "The number of search threads. Running searches are not affected, a change applies to the next search")
+    .def_property("smp_mode", [](const Search_Engine& engine) { return smp_mode_name(engine.smp_mode()); },
+                  [](Search_Engine& engine, const std::string& smp_mode) { engine.set_smp_mode(parse_smp_mode(smp_mode)); },
+                  "The SMP mode ('split' or 'lazy'). Running searches are not affected, a change applies to the next search")
+    ;
+  m.def("bench", [](int depth, bool verbose)
+    {
+      Bench_Result result;
+      {
+        py::gil_scoped_release release;
+        draughts::init_search();
+        result = bench(Depth(depth), verbose);
+      }
+      py::dict d;
+      d["positions"] = result.positions;
+      d["nodes"] = result.node;
+      d["time"] = result.time;
+      d["nps"] = result.nps();
+      return d;
+    }, "Searches a fixed suite of positions to a fixed depth with 1 thread. The total node count is a signature of the search.",
+    py::arg("depth") = int(Bench_Depth), py::arg("verbose") = false);
+  m.def("bench_positions", bench_positions, "Returns the positions of the bench suite in FEN format");
+  py::class_<search_handle, std::shared_ptr<search_handle>>(m, "SearchHandle",
+      "A search that runs in a background thread. It can be awaited in a coroutine, which returns the SearchOutput. "
+      "Dropping the handle stops the search and waits for it.")
+    .def("stop", &search_handle::stop, "Stops the search as soon as possible. The result contains the best move found so far.")
+    .def("done", &search_handle::done)
+    .def("wait", &search_handle::wait, "Waits until the search is done or timeout seconds have passed, and returns done()", py::arg("timeout") = -1.0)
+    .def("result", &search_handle::result, "Waits until the search is done and returns the SearchOutput")
+    .def("future", &search_handle::future, "Returns a concurrent.futures.Future with the SearchOutput. Cancelling it stops the search.")
+    .def("__await__", [](const std::shared_ptr<search_handle>& handle)
+      {
+        py::object future = py::module_::import("asyncio").attr("wrap_future")(handle->future());
+        future.attr("add_done_callback")(py::cpp_function([handle](const py::object&) {})); // keeps the search alive while it is awaited
+        return future.attr("__await__")();
+      })
+    ;
+  m.def("search_many", search_many, "Searches a batch of positions in parallel, with one search engine per worker. The callback(i, output) is called as soon as position i is done.",
+        py::arg("positions"), py::arg("depth") = int(Depth_Max), py::arg("time") = 1E6, py::arg("nodes") = int64(1E12), py::arg("workers") = 1,
+        py::arg("tt_size") = 20, py::arg("shared_tt") = false, py::arg("callback") = py::none(), py::arg("evaluator") = nullptr);
+
+  py::class_<Evaluator, std::shared_ptr<Evaluator>>(m, "Evaluator", "An evaluation that replaces the built-in one in the search");
+  py::class_<Batch_Evaluator, Evaluator, std::shared_ptr<Batch_Evaluator>>(m, "BatchEvaluator",
+      "Collects the leaf positions of all searches that use it and evaluates them together with fn(positions: PosBatch), "
+      "which returns the scores for the side to move like eval_batch. A batch is evaluated when it has max_batch positions, "
+      "when every search thread is waiting for it, or when its oldest position has waited max_wait seconds. "
+      "Without fn, or when fn raises, the built-in evaluation is used.")
+    .def(py::init([](const py::object& fn, int max_batch, double max_wait)
+      {
+        if (max_batch < 1 || max_wait < 0.0 || max_wait > 1E6)
+        {
+          throw std::invalid_argument("BatchEvaluator: max_batch must be at least 1 and max_wait in [0, 1E6]");
+        }
+        draughts::init_eval();
+        return std::make_shared<Batch_Evaluator>(make_batch_eval(fn), max_batch, max_wait);
+      }), py::arg("fn") = py::none(), py::arg("max_batch") = 64, py::arg("max_wait") = 0.001)
+    .def("eval", [](Batch_Evaluator& evaluator, const Pos& pos) { return int(evaluator.eval(pos)); }, py::call_guard<py::gil_scoped_release>())
+    .def_property_readonly("positions", &Batch_Evaluator::positions)
+    .def_property_readonly("batches", &Batch_Evaluator::batches)
+    .def_property_readonly("fallbacks", &Batch_Evaluator::fallbacks, "Positions that got the built-in evaluation because fn raised")
+    .def_property_readonly("error", &Batch_Evaluator::error, "The last error raised by fn, empty if none")
+    ;
 
   // move
   m.def("make_move", move::make);
@@ -374,7 +1323,7 @@ PYBIND11_MODULE(draughts1, m)
   m.def("move_from", move::from);
   m.def("move_to", move::to);
   m.def("move_captured", move::captured);
-  m.def("move_index", move::index);
+  m.def("move_index", [](Move mv, const Pos& pos) { return int(move::index(mv, pos)); });
   m.def("move_is_capture", move::is_capture);
   m.def("move_is_promotion", move::is_promotion);
   m.def("move_is_conversion", move::is_conversion);
@@ -387,6 +1336,14 @@ PYBIND11_MODULE(draughts1, m)
   m.def("generate_moves", [](const Pos& pos) { List list; gen_moves(list, pos); return list; });
   m.def("generate_captures", [](const Pos& pos) { List list; gen_captures(list, pos); return list; });
   m.def("generate_promotions", [](const Pos& pos) { List list; gen_promotions(list, pos); return list; });
+  m.def("generate_moves_batch", generate_moves_batch, "Generates the moves of a batch of positions in CSR format", py::arg("positions"), py::arg("kind") = "moves", py::arg("details") = false, py::arg("threads") = 1);
+  m.def("succ_batch", succ_batch, "Applies moves[i] to positions[i] for all i. Raises ValueError if a move is not legal", py::arg("positions"), py::arg("moves"), py::arg("threads") = 1);
+  m.def("expand_all", expand_all, "Returns the children of a batch of positions and their offsets", py::arg("positions"), py::arg("threads") = 1);
+  m.attr("action_size") = draughts::action_size;
+  m.attr("action_extra_captures") = draughts::action_extra_captures;
+  m.def("move_to_action", draughts::move_to_action, "Returns the action index of a legal move (50 * from + to with dense squares, or an extra capture index for captures that share their start and end square with another capture). Raises RuntimeError if the move is not legal");
+  m.def("action_to_move", draughts::action_to_move, "Returns the legal move of an action index, or move_none()");
+  m.def("legal_action_mask_batch", legal_action_mask_batch, "Returns the legal action masks of a batch of positions", py::arg("positions"), py::arg("threads") = 1);
   m.def("add_sacs", [](const Pos& pos) { List list; add_sacs(list, pos); return list; });
 
   // tt.h
@@ -399,11 +1356,25 @@ PYBIND11_MODULE(draughts1, m)
 
   py::class_<TT, std::shared_ptr<TT>>(m, "TranspositionTable", "Transposition table")
     .def(py::init<>(), py::return_value_policy::copy)
-    .def("set_size", &TT::set_size)
+    .def("set_size", &TT::set_size, "Sets the number of entries, rounded down to a multiple of 4 (any size up to 2^34 entries)")
+    .def("set_size_mb", &TT::set_size_mb, "Sets the size in megabytes")
+    .def("size", &TT::size)
     .def("clear", &TT::clear)
     .def("inc_date", &TT::inc_date)
     .def("store", &TT::store)
     .def("probe", &TT::probe)
+    .def("save", &TT::save, "Saves the table to a file. A mapped table is synced instead when it is saved to its own file.", py::arg("filename"))
+    .def("load", &TT::load, "Loads a table saved with save. Files saved for another variant or with other hash keys are rejected. "
+                            "If mapped is true, the file is memory-mapped and the table is stored in it.",
+         py::arg("filename"), py::arg("mapped") = false)
+    .def("is_mapped", &TT::is_mapped)
+    .def("open_shared", &TT::open_shared,
+         "Attaches the table to the POSIX shared memory object name (e.g. '/scan-tt'), such that several processes use the same "
+         "table. The first process creates the object with size entries and owns it: only the owner can clear the table, and "
+         "the object is removed when the owner releases it. Other processes get the size of the owner.",
+         py::arg("name"), py::arg("size") = int64(1) << 24)
+    .def("is_shared", &TT::is_shared)
+    .def("is_owner", &TT::is_owner)
     ;
 
   m.def("clear_global_transition_table", []() { G_TT.clear(); });
@@ -413,7 +1384,7 @@ PYBIND11_MODULE(draughts1, m)
 
   // game.hpp
   py::class_<Game, std::shared_ptr<Game>>(m, "Game", "A draughts game")
-    .def(py::init<>(), py::return_value_policy::copy)
+    .def(py::init([]() { draughts::init_pos(); return std::make_shared<Game>(); }))
     .def("clear", &Game::clear)
     .def("init", [](Game& game, const Pos& pos) { game.init(pos); })
     .def("init_full", [](Game& game, const Pos& pos, int moves, double time, double inc) { game.init(pos, moves, time, inc); })
@@ -439,7 +1410,7 @@ PYBIND11_MODULE(draughts1, m)
   m.def("result_to_string", result_to_string);
 
   // hash.hpp
-  m.def("hash_key", hash::key);
+  m.def("hash_key", [](const Pos& pos) { draughts::init_hash(); return hash::key(pos); });
   m.def("hash_index", hash::index);
   m.def("hash_lock", hash::lock);
 
@@ -501,7 +1472,7 @@ PYBIND11_MODULE(draughts1, m)
   // var.hpp
   py::class_<draughts::scan_settings, std::shared_ptr<draughts::scan_settings>>(m, "Scan")
     .def(py::init<>(), py::return_value_policy::copy)
-    .def("init", &draughts::scan_settings::init)
+    .def_static("init", &draughts::scan_settings::init, py::arg("lazy") = true)
     .def("load", &draughts::scan_settings::load)
     .def("update", &draughts::scan_settings::update)
     .def("get", &draughts::scan_settings::get)
@@ -509,6 +1480,20 @@ PYBIND11_MODULE(draughts1, m)
     .def("variant_name", &draughts::scan_settings::variant_name)
     ;
 
+  m.def("init_report", []()
+    {
+      py::list result;
+      for (const draughts::init_record& record: draughts::init_registry::instance().records())
+      {
+        py::dict d;
+        d["name"] = record.name;
+        d["seconds"] = record.seconds;
+        d["memory"] = record.memory;
+        result.append(d);
+      }
+      return result;
+    }, "Returns the initialization phases that have run, with the time and memory each of them used");
+
   // thread.hpp
   m.def("listen_input", listen_input);
 
@@ -524,9 +1509,9 @@ PYBIND11_MODULE(draughts1, m)
     ;
 
   // added
-  m.def("run_terminal_game", run_terminal_game);
-  m.def("playout_minimax", draughts::playout_minimax);
-  m.def("playout_random", draughts::playout_random);
+  m.def("run_terminal_game", run_terminal_game, "Plays a game in the terminal. Uses the global engine state, so it is not thread-safe.", py::call_guard<py::gil_scoped_release>());
+  m.def("playout_minimax", draughts::playout_minimax, "Plays a game using the Scan search. Uses the global engine state, so it is not thread-safe.", py::call_guard<py::gil_scoped_release>());
+  m.def("playout_random", draughts::playout_random, "Plays random moves. It is thread-safe after Scan.init() has been called.", py::call_guard<py::gil_scoped_release>());
   m.def("play_forced_moves", draughts::play_forced_moves);
   m.def("piece_count_eval", draughts::piece_count_eval);
   m.def("naive_rollout", draughts::naive_rollout);
@@ -542,11 +1527,49 @@ PYBIND11_MODULE(draughts1, m)
     .def_readwrite("moves", &draughts::pdn_game::moves)
     ;
 
-  m.def("parse_pdn_game", draughts::parse_pdn_game);
-  m.def("parse_pdn_file", draughts::parse_pdn_file);
-  m.def("scan_search", draughts::scan_search); // returns a score from the perspective of the current player!
+  m.def("parse_pdn_game", draughts::parse_pdn_game, "Parses a game in PDN format. It is thread-safe.", py::call_guard<py::gil_scoped_release>());
+  m.def("parse_pdn_file", draughts::parse_pdn_file, "Parses a file with games in PDN format. It is thread-safe.", py::call_guard<py::gil_scoped_release>());
+  m.def("scan_search", draughts::scan_search, "Runs a Scan search. Uses the global engine state, so it is not thread-safe.", py::call_guard<py::gil_scoped_release>()); // returns a score from the perspective of the current player!
   m.def("pos_to_numpy1", pos_to_numpy1, py::return_value_policy::move);
   m.def("pos_to_numpy2", pos_to_numpy2, py::return_value_policy::move);
+  // binary encoding
+  m.def("encode_position", [](const Pos& pos)
+    {
+      std::vector<std::uint8_t> result(draughts::packed_position_size);
+      draughts::pack_position(pos, result.data());
+      return to_bytes(result);
+    }, "Encodes a position in 26 bytes");
+  m.def("decode_position", [](const py::buffer& data)
+    {
+      auto [first, last] = buffer_range(data);
+      if (std::size_t(last - first) != draughts::packed_position_size)
+      {
+        throw std::runtime_error("decode_position: expected 26 bytes");
+      }
+      return draughts::unpack_position(first);
+    }, "Decodes a position that was encoded with encode_position");
+  m.def("encode_positions", encode_positions, "Encodes a batch of positions in 26 bytes per position", py::arg("positions"), py::arg("threads") = 1);
+  m.def("decode_positions", decode_positions, "Decodes positions that were encoded with encode_positions into a PosBatch");
+  m.def("encode_moves", [](const Pos& pos, const std::vector<Move>& moves)
+    {
+      std::vector<std::uint8_t> result;
+      draughts::pack_moves(pos, moves, result);
+      return to_bytes(result);
+    }, "Encodes a sequence of moves played from pos using move indices");
+  m.def("decode_moves", [](const Pos& pos, const py::buffer& data)
+    {
+      auto [first, last] = buffer_range(data);
+      std::vector<Move> result = draughts::unpack_moves(pos, first, last);
+      if (first != last)
+      {
+        throw std::runtime_error("decode_moves: unexpected data after the moves");
+      }
+      return result;
+    }, "Decodes a sequence of moves played from pos that was encoded with encode_moves");
+  m.def("encode_games", encode_games, "Encodes a sequence of games");
+  m.def("decode_games", decode_games, "Decodes games that were encoded with encode_games");
+  m.def("encode_batch", encode_batch, "Encodes a sequence of positions into one array of board planes",
+        py::arg("positions"), py::arg("layout") = "board", py::arg("dtype") = "uint8", py::arg("threads") = 1, py::arg("out") = py::none());
 
   // minimax with a piece count evaluation in the leaves
   // moves are not shuffled, causing an enormous bias into one direction
@@ -554,7 +1577,7 @@ PYBIND11_MODULE(draughts1, m)
     { 
       draughts::negamax<true, false, draughts::piece_count_evaluator> N;
       return N.minimax_best_move(pos, max_depth);
-    });
+    }, "Minimax search with a piece count evaluation. It is thread-safe.", py::call_guard<py::gil_scoped_release>());
 
   // minimax with a piece count evaluation in the leaves
   // moves are shuffled
@@ -562,16 +1585,16 @@ PYBIND11_MODULE(draughts1, m)
     { 
       draughts::negamax<true, true, draughts::piece_count_evaluator> N;
       return N.minimax_best_move(pos, max_depth);
-    });
+    }, "Minimax search with shuffled moves and a piece count evaluation. It is thread-safe.", py::call_guard<py::gil_scoped_release>());
 
   // minimax with a scan evaluation in the leaves
   // no need to shuffle the moves
   m.def("minimax_search_scan", [](const Pos& pos, int max_depth) 
     { 
+      draughts::init_eval();
       draughts::negamax<true, false, draughts::scan_evaluator> N;
       return N.minimax_best_move(pos, max_depth);
-    });
+    }, "Minimax search with a Scan evaluation. It is thread-safe after Scan.init() has been called.", py::call_guard<py::gil_scoped_release>());
 
-  m.def("parse_pdn_game", draughts::parse_pdn_game);
   m.def("compute_position_result", draughts::compute_position_result);
 }
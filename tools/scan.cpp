@@ -11,6 +11,7 @@
 
 #include "scan/bb_base.hpp"
 #include "scan/bb_comp.hpp"
+#include "scan/bench.hpp"
 #include "scan/bb_index.hpp"
 #include "scan/bit.hpp"
 #include "scan/book.hpp"
@@ -68,6 +69,33 @@ int main(int argc, char * argv[]) {
 
       dxp::loop();
 
+   } else if (arg == "bench") { // fixed-depth search of a position suite, the node count is a signature of the search
+
+      Depth depth = Bench_Depth;
+
+      if (argc > 2) {
+
+         std::istringstream ss(argv[2]);
+         int d;
+
+         if (!(ss >> d) || !(ss >> std::ws).eof() || d < 1 || d >= Depth_Max) {
+            std::cerr << "usage: " << argv[0] << " bench [depth], with 1 <= depth < " << int(Depth_Max) << std::endl;
+            std::exit(EXIT_FAILURE);
+         }
+
+         depth = Depth(d);
+      }
+
+      init_low();
+
+      Bench_Result result = bench(depth, true);
+
+      std::cout << std::endl;
+      std::cout << "positions " << result.positions << std::endl;
+      std::cout << "nodes     " << result.node << std::endl;
+      std::cout << "time      " << ml::ftos(result.time, 3) << std::endl;
+      std::cout << "nps       " << ml::ftos(result.nps() / 1E6, 2) << " M" << std::endl;
+
    } else if (arg == "hub") {
 
       listen_input();